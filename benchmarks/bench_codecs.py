@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Compare audio transports: bytes on the wire and framing latency per codec.
+PCM rows are exact. Opus rows encode the input with ffmpeg (if installed) in
+the same containers the browser produces; end-to-end latency per codec is
+measured by the load-testing harness.
+Usage: python benchmarks/bench_codecs.py [--input speech.wav] [--seconds 10]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+from audio import TARGET_SAMPLE_RATE, Resampler  # noqa: E402
+from vad import VoiceActivityDetector  # noqa: E402
+
+
+def load_pcm(path: str, seconds: float) -> np.ndarray:
+    """
+    Load mono 16-bit audio at 48 kHz, or synthesize a speech-like signal.
+    """
+    if path:
+        with wave.open(path) as wav:
+            if wav.getsampwidth() != 2:
+                sys.exit("Input must be 16-bit PCM WAV")
+            pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            pcm = pcm[:: wav.getnchannels()]
+            if wav.getframerate() != 48000:
+                pcm = np.frombuffer(
+                    Resampler(wav.getframerate(), out_rate=48000).process(
+                        pcm.tobytes()
+                    ),
+                    dtype=np.int16,
+                )
+            return pcm
+    rng = np.random.default_rng(0)
+    t = np.arange(int(48000 * seconds)) / 48000
+    # Voiced bursts of 1.5 s separated by 1 s pauses over light noise.
+    envelope = (np.sin(2 * np.pi * t / 2.5) > -0.3).astype(np.float32)
+    voice = 4000 * np.sin(2 * np.pi * 180 * t) * (1 + 0.5 * np.sin(2 * np.pi * 4 * t))
+    return (voice * envelope + rng.normal(0, 40, len(t))).astype(np.int16)
+
+
+def encode_opus(pcm: np.ndarray, container: str, bitrate: int) -> int:
+    """
+    Encode with ffmpeg and return the encoded size in bytes.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "in.raw")
+        dst = os.path.join(tmp, f"out.{container}")
+        pcm.tofile(src)
+        subprocess.run(
+            ["ffmpeg", "-loglevel", "error", "-f", "s16le", "-ar", "48000"]
+            + ["-ac", "1", "-i", src, "-c:a", "libopus", "-b:a", str(bitrate), dst],
+            check=True,
+        )
+        return os.path.getsize(dst)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default="", help="16-bit PCM WAV file")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    pcm = load_pcm(args.input, args.seconds)
+    seconds = len(pcm) / 48000
+    rows = []
+
+    def row(name: str, total_bytes: float, frame_ms: float, upstream: float) -> None:
+        rows.append(
+            (
+                name,
+                total_bytes * 8 / seconds / 1000,
+                frame_ms,
+                upstream * 8 / seconds / 1000,
+            )
+        )
+
+    # Raw PCM from a 48 kHz browser, 4096-sample ScriptProcessor frames.
+    resampled = Resampler(48000).process(pcm.tobytes())
+    vad = VoiceActivityDetector(TARGET_SAMPLE_RATE)
+    voiced, _ = vad.process(resampled)
+    row("pcm-48k", pcm.nbytes, 1024 / 48, len(voiced))
+    # Raw PCM from the Python client at 16 kHz.
+    row("pcm-16k", len(resampled), 1024 / 16, len(voiced))
+    if shutil.which("ffmpeg"):
+        for container, codec in (("webm", "webm-opus"), ("ogg", "ogg-opus")):
+            for bitrate in (24000, 32000):
+                size = encode_opus(pcm, container, bitrate)
+                # Opus is passed through unchanged, so upstream equals the wire.
+                row(f"{codec}-{bitrate // 1000}k", size, 100, size)
+    else:
+        print("# ffmpeg not found: Opus rows skipped", file=sys.stderr)
+
+    print("codec,wire_kbps,frame_latency_ms,upstream_kbps")
+    for name, wire, frame_ms, upstream in rows:
+        print(f"{name},{wire:.1f},{frame_ms:.0f},{upstream:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""
+Benchmark the shared OpenAI client against a local fake that injects latency
+spikes and 503 errors. Streams the same completions through a plain
+AsyncOpenAI client, through LLMClient, and through LLMClient with hedging,
+and prints latency percentiles, failures and how often retries and hedges
+were used.
+Usage: python benchmarks/bench_llm_client.py [--requests 400] [--spike-rate 0.02]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+import llm_client  # noqa: E402
+from fake_services import FakeOpenAI  # noqa: E402
+from openai import AsyncOpenAI  # noqa: E402
+
+
+async def run(client, create, requests: int, concurrency: int) -> dict:
+    latencies = []
+    failures = 0
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        nonlocal failures
+        async with slots:
+            start = time.perf_counter()
+            try:
+                stream = await create(
+                    model="gpt-4o",
+                    messages=[{"role": "user", "content": "What is the answer?"}],
+                    max_tokens=150,
+                    stream=True,
+                )
+                async for _ in stream:
+                    pass
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                failures += 1
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "failures": failures}
+
+
+async def main(args: argparse.Namespace) -> None:
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    print(
+        "client,requests,failures,p50_s,p95_s,p99_s,upstream_requests,retries,"
+        "hedges,hedge_wins"
+    )
+    for name in ("plain", "client", "client+hedge"):
+        fake = FakeOpenAI(
+            latency=args.latency,
+            spike_rate=args.spike_rate,
+            spike_latency=args.spike_latency,
+            error_rate=args.error_rate,
+        )
+        await fake.start(args.port)
+        counters = (
+            llm_client.retries,
+            llm_client.hedged_requests,
+            llm_client.hedge_wins,
+        )
+        if name == "plain":
+            # The SDK default: two retries, ten minute timeout, no hedging.
+            client = AsyncOpenAI(api_key="fake", base_url=base_url)
+            create = client.chat.completions.create
+        else:
+            # Leave slots free for hedged duplicates.
+            client = llm_client.LLMClient(
+                max_concurrency=2 * args.concurrency,
+                timeout=args.timeout,
+                hedge=name.endswith("hedge"),
+                api_key="fake",
+            )
+            create = client.create
+        # Warm up the connection pool and the latency estimate for hedging.
+        await run(client, create, llm_client.HEDGE_MIN_SAMPLES, args.concurrency)
+        upstream = fake.requests
+        before = [counter.value for counter in counters]
+        result = await run(client, create, args.requests, args.concurrency)
+        used = [counter.value - b for counter, b in zip(counters, before)]
+        print(
+            f"{name},{args.requests},{result['failures']},{result['p50']:.3f},"
+            f"{result['p95']:.3f},{result['p99']:.3f},{fake.requests - upstream},"
+            f"{used[0]},{used[1]},{used[2]}"
+        )
+        await fake.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--spike-rate", type=float, default=0.02)
+    parser.add_argument("--spike-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8868)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Simulate a chatty speaker in run.py's local mode: final transcripts arrive
+every --interval seconds, each LLM call blocks for a random time, and speech
+takes --speech-seconds per reply. Compares a thread per utterance feeding a
+plain queue (the old run.py) with LocalPipeline feeding a SpeechQueue, and
+prints the peak thread count, replies spoken out of order, replies dropped or
+merged, and the time from transcript to the start of speech.
+Usage: python benchmarks/bench_local_pipeline.py [--utterances 60] [--interval 0.3]
+"""
+
+import argparse
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+import local_pipeline  # noqa: E402
+
+
+def run(mode: str, args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    latencies = [rng.lognormvariate(np.log(args.llm_latency), 0.6) for _ in range(1000)]
+    transcribed_at = {}
+    spoken = []
+    waits = []
+    done = threading.Event()
+    base_threads = threading.active_count()
+
+    def job(number: int) -> str:
+        time.sleep(latencies[number % len(latencies)])
+        return str(number)
+
+    def speak(text: str) -> None:
+        now = time.perf_counter()
+        numbers = [int(n) for n in text.split()]
+        waits.extend(now - transcribed_at[n] for n in numbers)
+        spoken.extend(numbers)
+        time.sleep(args.speech_seconds)
+
+    if mode == "thread-per-utterance":
+        replies: queue.Queue = queue.Queue()
+
+        def submit(number: int) -> None:
+            threading.Thread(target=lambda: replies.put(job(number))).start()
+
+        def speaker() -> None:
+            while not done.is_set() or not replies.empty():
+                try:
+                    speak(replies.get(timeout=0.05))
+                except queue.Empty:
+                    pass
+
+        close = None
+    else:
+        speech = local_pipeline.SpeechQueue(max_age=args.max_age)
+        pipeline = local_pipeline.LocalPipeline(
+            speech.put, workers=args.workers, max_pending=args.max_pending
+        )
+        pipeline.start()
+
+        def submit(number: int) -> None:
+            pipeline.submit(lambda: job(number))
+
+        def speaker() -> None:
+            while True:
+                text = speech.get()
+                if text is None:
+                    return
+                speak(text)
+
+        def close() -> None:
+            pipeline.close()
+            speech.close()
+
+    speaker_thread = threading.Thread(target=speaker)
+    speaker_thread.start()
+    peak_threads = 0
+    start = time.perf_counter()
+    for number in range(args.utterances):
+        time.sleep(max(0.0, start + number * args.interval - time.perf_counter()))
+        transcribed_at[number] = time.perf_counter()
+        submit(number)
+        peak_threads = max(peak_threads, threading.active_count() - base_threads)
+    # Let the backlog play out.
+    deadline = time.perf_counter() + args.drain
+    while time.perf_counter() < deadline:
+        peak_threads = max(peak_threads, threading.active_count() - base_threads)
+        time.sleep(0.05)
+    if close:
+        close()
+    done.set()
+    speaker_thread.join()
+
+    out_of_order = sum(1 for a, b in zip(spoken, spoken[1:]) if b < a)
+    p50, p95 = np.percentile(waits, [50, 95]) if waits else (0.0, 0.0)
+    return {
+        "mode": mode,
+        "peak_extra_threads": peak_threads,
+        "spoken": len(spoken),
+        "out_of_order": out_of_order,
+        "wait_p50_s": round(float(p50), 3),
+        "wait_p95_s": round(float(p95), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--utterances", type=int, default=60)
+    parser.add_argument("--interval", type=float, default=0.3)
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--speech-seconds", type=float, default=0.8)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-pending", type=int, default=8)
+    parser.add_argument("--max-age", type=float, default=8.0)
+    parser.add_argument("--drain", type=float, default=15.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    # Dropped jobs are counted below rather than logged one by one.
+    logging.disable(logging.WARNING)
+    print(
+        "mode,peak_extra_threads,spoken,out_of_order,wait_p50_s,wait_p95_s,"
+        "dropped,stale,merged"
+    )
+    for mode in ("thread-per-utterance", "pipeline"):
+        counters = (
+            local_pipeline.dropped_utterances,
+            local_pipeline.stale_replies,
+            local_pipeline.merged_replies,
+        )
+        before = [counter.value for counter in counters]
+        result = run(mode, args)
+        used = [counter.value - b for counter, b in zip(counters, before)]
+        print(",".join(str(v) for v in [*result.values(), *used]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Compare question detectors on a labeled set of transcripts.
+For each detector, prints precision and recall of "this is a question", the
+answering-model calls it would trigger (wasted = calls for non-questions),
+the utterances it would send to the fallback model, and the time per call.
+With --fallback-model, ambiguous transcripts are resolved by that model
+(needs OPENAI_API_KEY). --fit prints weights fitted on the training set.
+The word lists in question.py and the weights are derived from the training
+set only; the eval set is held out, so do not tune on it. On the current eval
+set (134 transcripts, 60 questions) the model reaches P=1.00 R=1.00 with 4
+transcripts ambiguous, and the punctuation rule P=0.87 R=0.65. Both sets are
+hand-written in a similar style, so expect lower numbers on real traffic.
+Usage: python benchmarks/bench_question.py [--fallback-model gpt-4o-mini] [--fit]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+from question import (  # noqa: E402
+    DETECTORS,
+    QuestionDetector,
+    fallback_messages,
+    fit,
+    load_dataset,
+    parse_fallback,
+)
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+def score(name, predictions, labels, fallback_calls, us_per_call) -> str:
+    tp = sum(p and y for p, y in zip(predictions, labels))
+    fp = sum(p and not y for p, y in zip(predictions, labels))
+    fn = sum(not p and y for p, y in zip(predictions, labels))
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if tp else 0.0
+    return (
+        f"{name},{precision:.3f},{recall:.3f},{f1:.3f},{tp + fp},{fp},{fn},"
+        f"{fallback_calls},{us_per_call:.1f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--train", default=os.path.join(DATA, "questions_train.tsv"))
+    parser.add_argument("--eval", default=os.path.join(DATA, "questions_eval.tsv"))
+    parser.add_argument("--fallback-model", help="e.g. gpt-4o-mini")
+    parser.add_argument("--fit", action="store_true", help="Print fitted weights")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.fit:
+        for name, weight in fit(*load_dataset(args.train)).items():
+            print(f"{name},{weight}")
+        return
+
+    texts, labels = load_dataset(args.eval)
+    print(
+        f"# {len(texts)} transcripts, {sum(labels)} questions; answering every "
+        f"transcript would take {len(texts)} calls"
+    )
+    print(
+        "detector,precision,recall,f1,answer_calls,wasted_calls,missed,"
+        "fallback_calls,us_per_call"
+    )
+    for name, detector_class in DETECTORS.items():
+        detector = detector_class()
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            predictions = [detector(text) for text in texts]
+        us = (time.perf_counter() - start) / args.repeat / len(texts) * 1e6
+        ambiguous = [detector.is_ambiguous(text) for text in texts]
+        print(score(name, predictions, labels, sum(ambiguous), us))
+
+    if args.fallback_model:
+        from openai import OpenAI
+
+        client = OpenAI()
+        detector = QuestionDetector()
+        predictions = []
+        calls = 0
+        start = time.perf_counter()
+        for text in texts:
+            if detector.is_ambiguous(text):
+                calls += 1
+                response = client.chat.completions.create(
+                    model=args.fallback_model,
+                    messages=fallback_messages(text),
+                    max_tokens=1,
+                )
+                predictions.append(parse_fallback(response.choices[0].message.content))
+            else:
+                predictions.append(detector(text))
+        us = (time.perf_counter() - start) / len(texts) * 1e6
+        print(score(f"model+{args.fallback_model}", predictions, labels, calls, us))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""
+Benchmark the server-side resampler throughput in input samples per second.
+Usage: python benchmarks/bench_resample.py [--seconds 10] [--chunk-ms 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+from audio import Resampler  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=10.0, help="Audio per run")
+    parser.add_argument("--chunk-ms", type=int, default=20, help="Chunk duration")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print("in_rate,channels,chunk_ms,samples_per_sec,realtime_factor,bytes_ratio")
+    for in_rate, channels in ((48000, 1), (44100, 1), (48000, 2), (16000, 1)):
+        total = int(in_rate * args.seconds) * channels
+        pcm = rng.integers(-8000, 8000, total, dtype=np.int16)
+        chunk = in_rate * args.chunk_ms // 1000 * channels
+        chunks = [pcm[i : i + chunk].tobytes() for i in range(0, total, chunk)]
+        resampler = Resampler(in_rate, channels)
+        out_bytes = 0
+        start = time.perf_counter()
+        for data in chunks:
+            out_bytes += len(resampler.process(data))
+        elapsed = time.perf_counter() - start
+        samples_per_sec = total / channels / elapsed
+        print(
+            f"{in_rate},{channels},{args.chunk_ms},{samples_per_sec:.0f},"
+            f"{args.seconds / elapsed:.0f},{pcm.nbytes / out_bytes:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
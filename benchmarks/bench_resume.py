@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""
+Measure what a dropped WebSocket costs a Q&A session. One client streams
+speech to server.py (against the fakes, as in loadtest.py) and loses its
+connection without a close frame --drop-delay seconds after finishing a
+question (transcribed, but not answered yet), every --drop-every seconds. It
+keeps recording during the --gap and then reconnects:
+  - reconnect: opens a new session, as clients did before resumable sessions;
+  - resume: hands in its session token, on the "resume" path flag.
+In both modes the audio captured during the gap is sent first. Prints, per
+mode, the time from reconnecting to the first answer and how many questions
+were never answered.
+Usage: python benchmarks/bench_resume.py [--drops 5] [--gap 1.0]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import websockets
+
+from fake_services import FakeDeepgram, FakeOpenAI, add_arguments
+from loadtest import (
+    CHUNK_SIZE,
+    SAMPLE_RATE,
+    SERVER,
+    load_inputs,
+    speech_ends,
+    wait_for_server,
+)
+
+
+class Client:
+    """
+    Streams PCM in real time over a connection that can be dropped and
+    reopened, buffering audio while disconnected.
+    """
+
+    def __init__(self, uri: str, resume: bool) -> None:
+        self.uri = uri
+        self.resume = resume
+        self.token: Optional[str] = None
+        self.ws = None
+        self.receiver: Optional[asyncio.Task] = None
+        self.buffered: List[bytes] = []
+        self.questions = 0
+        self.answers = 0
+        self.resumed = 0
+        # When the client last reconnected, until the first answer after it.
+        self.reconnected_at: Optional[float] = None
+        self.first_answer: List[float] = []
+
+    async def connect(self) -> None:
+        config = {"type": "config", "sample_rate": SAMPLE_RATE, "channels": 1}
+        if self.resume and self.token:
+            config["resume"] = self.token
+        self.ws = await websockets.connect(self.uri)
+        await self.ws.send(json.dumps(config))
+        self.receiver = asyncio.create_task(self.receive(self.ws))
+        for chunk in self.buffered:
+            await self.ws.send(chunk)
+        self.buffered = []
+
+    async def receive(self, ws) -> None:
+        try:
+            async for message in ws:
+                reply = json.loads(message)
+                if "session" in reply:
+                    self.token = reply["session"]["token"]
+                    self.resumed += reply["session"]["resumed"]
+                elif "answer" in reply:
+                    self.answers += 1
+                    if self.reconnected_at is not None:
+                        self.first_answer.append(
+                            time.perf_counter() - self.reconnected_at
+                        )
+                        self.reconnected_at = None
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    def drop(self) -> None:
+        # Like a Wi-Fi handoff: no close frame reaches the server.
+        self.ws.transport.abort()
+        self.receiver.cancel()
+        self.ws = None
+
+    async def send(self, chunk: bytes) -> None:
+        if self.ws is None:
+            self.buffered.append(chunk)
+        else:
+            await self.ws.send(chunk)
+
+    async def close(self) -> None:
+        if self.ws:
+            await self.ws.close()
+            self.receiver.cancel()
+
+
+async def run_client(args: argparse.Namespace, uri: str, resume: bool) -> Dict:
+    pcm = load_inputs(args.input, args.drop_every * (args.drops + 1))[0]
+    ends = set(speech_ends(pcm))
+    count = len(pcm) // CHUNK_SIZE
+    chunk_seconds = CHUNK_SIZE / SAMPLE_RATE
+    gap_chunks = int(args.gap / chunk_seconds)
+    client = Client(uri, resume)
+    await client.connect()
+    start = time.perf_counter()
+    drops = 0
+    drop_at: Optional[int] = None
+    reconnect_at: Optional[int] = None
+    duration = args.drop_every * (args.drops + 1)
+    index = 0
+    while index * chunk_seconds < duration:
+        await asyncio.sleep(
+            max(0.0, start + (index + 1) * chunk_seconds - time.perf_counter())
+        )
+        position = index % count
+        await client.send(
+            pcm[position * CHUNK_SIZE : (position + 1) * CHUNK_SIZE].tobytes()
+        )
+        if position in ends:
+            client.questions += 1
+            if (
+                client.ws
+                and drop_at is None
+                and drops < args.drops
+                and index * chunk_seconds >= (drops + 1) * args.drop_every
+            ):
+                drop_at = index + int(args.drop_delay / chunk_seconds)
+        # Drop while the answer to the last question is on the way.
+        if drop_at is not None and index >= drop_at:
+            client.drop()
+            drops += 1
+            drop_at = None
+            reconnect_at = index + gap_chunks
+        if reconnect_at is not None and index >= reconnect_at:
+            client.reconnected_at = time.perf_counter()
+            await client.connect()
+            reconnect_at = None
+        index += 1
+    # Leave time for the last answers.
+    await asyncio.sleep(3.0)
+    await client.close()
+    first = client.first_answer or [float("nan")]
+    return {
+        "drops": drops,
+        "resumed": client.resumed,
+        "questions": client.questions,
+        "unanswered": client.questions - client.answers,
+        "first_answer_p50_s": round(float(np.median(first)), 3),
+        "first_answer_max_s": round(float(np.max(first)), 3),
+    }
+
+
+async def run(args: argparse.Namespace, mode: str) -> Dict:
+    deepgram = FakeDeepgram(latency=args.stt_latency, fragments=args.stt_fragments)
+    openai = FakeOpenAI(latency=args.llm_latency, token_rate=args.token_rate)
+    await deepgram.start(args.deepgram_port)
+    await openai.start(args.openai_port)
+    env = dict(
+        os.environ,
+        DEEPGRAM_HOST=f"http://127.0.0.1:{args.deepgram_port}",
+        DEEPGRAM_API_KEY="fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1",
+        OPENAI_API_KEY="fake",
+    )
+    command = [sys.executable, SERVER, "--ws-port", str(args.port)]
+    command += ["--http-port", str(args.port + 1), *args.server_args.split()]
+    server = subprocess.Popen(
+        command,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    path = "/klugscheiser/resume" if mode == "resume" else "/klugscheiser"
+    try:
+        await wait_for_server(args.port)
+        await asyncio.sleep(1.0)
+        result = await run_client(
+            args, f"ws://127.0.0.1:{args.port}{path}", mode == "resume"
+        )
+    finally:
+        server.terminate()
+        await asyncio.to_thread(server.wait)
+        await deepgram.close()
+        await openai.close()
+    return {"mode": mode, **result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--drops", type=int, default=5)
+    parser.add_argument(
+        "--drop-every", type=float, default=6.0, help="Seconds between drops"
+    )
+    parser.add_argument(
+        "--drop-delay",
+        type=float,
+        default=0.4,
+        help="Seconds from the end of a question to the drop",
+    )
+    parser.add_argument(
+        "--gap", type=float, default=1.0, help="Seconds the client is offline"
+    )
+    parser.add_argument("--input", nargs="*", default=[], help="16-bit PCM WAV files")
+    parser.add_argument("--server-args", default="", help="Extra server.py arguments")
+    parser.add_argument("--port", type=int, default=8875, help="Server WebSocket port")
+    parser.add_argument("--deepgram-port", type=int, default=8866)
+    parser.add_argument("--openai-port", type=int, default=8867)
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    add_arguments(parser)
+    args = parser.parse_args()
+    results = [asyncio.run(run(args, mode)) for mode in ("reconnect", "resume")]
+    print(",".join(results[0]))
+    for result in results:
+        print(",".join(str(v) for v in result.values()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Check the fairness of the LLM scheduler under a synthetic multi-client load.
+A few noisy translation sessions send requests much faster than the shared
+concurrency limit allows, while several Q&A sessions ask a question every few
+seconds. All go through one LLMClient against the fake OpenAI endpoint:
+  - fifo: every request in one queue, as before the scheduler;
+  - fair: per-session fair queuing, Q&A ranked above translations and a
+    token bucket per session.
+Prints, per mode and session kind, the requests completed and shed, the wait
+for a slot and the end-to-end latency.
+Usage: python benchmarks/bench_scheduler.py [--concurrency 4] [--duration 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+import llm_client  # noqa: E402
+import scheduler  # noqa: E402
+from fake_services import FakeOpenAI  # noqa: E402
+
+TRANSLATION_TEXT = "Das ist ein ziemlich langer Satz, der übersetzt werden soll. " * 4
+QUESTION_TEXT = "What is the capital of France?"
+
+
+async def client_session(
+    client: llm_client.LLMClient,
+    session,
+    interval: float,
+    text: str,
+    duration: float,
+    stats: Dict[str, List[float]],
+) -> None:
+    if session:
+        scheduler.current_session.set(session)
+    pending = set()
+
+    async def one() -> None:
+        start = time.perf_counter()
+        try:
+            await client.create(
+                deadline=time.monotonic() + 10.0,
+                model="gpt-4o",
+                messages=[{"role": "user", "content": text}],
+                max_tokens=150,
+            )
+            stats["latency"].append(time.perf_counter() - start)
+        except llm_client.DeadlineExceeded:
+            stats["shed"].append(1)
+
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        task = asyncio.create_task(one())
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        await asyncio.sleep(interval)
+    await asyncio.gather(*pending)
+
+
+async def run(args: argparse.Namespace, mode: str) -> Dict[str, dict]:
+    fake = FakeOpenAI(latency=args.latency, token_rate=args.token_rate)
+    await fake.start(args.port)
+    client = llm_client.LLMClient(
+        max_concurrency=args.concurrency,
+        max_retries=0,
+        api_key="fake",
+        session_tokens_per_second=(
+            args.session_tokens_per_minute / 60 if mode == "fair" else None
+        ),
+    )
+    kinds = {"qa": [], "translation": []}
+    stats = {kind: {"latency": [], "shed": []} for kind in ("qa", "translation")}
+    tasks = []
+    for kind, count, interval, text, priority in (
+        (
+            "translation",
+            args.noisy,
+            args.noisy_interval,
+            TRANSLATION_TEXT,
+            scheduler.BULK,
+        ),
+        ("qa", args.qa, args.qa_interval, QUESTION_TEXT, scheduler.INTERACTIVE),
+    ):
+        for i in range(count):
+            session = None
+            if mode == "fair":
+                session = client.scheduler.open_session(f"{kind}-{i}", priority)
+                kinds[kind].append(session)
+            tasks.append(
+                client_session(
+                    client, session, interval, text, args.duration, stats[kind]
+                )
+            )
+    await asyncio.gather(*tasks)
+    await fake.close()
+
+    result = {}
+    for kind, kind_stats in stats.items():
+        latencies = kind_stats["latency"]
+        p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (0, 0)
+        # Without the scheduler, all requests share one queue.
+        sessions = kinds[kind] or [client.scheduler.default_session]
+        result[kind] = {
+            "done": len(latencies),
+            "shed": len(kind_stats["shed"]),
+            "latency_p50_s": round(float(p50), 3),
+            "latency_p95_s": round(float(p95), 3),
+            "max_session_wait_s": round(
+                max((s.wait_max for s in sessions), default=0), 3
+            ),
+        }
+    return result
+
+
+async def main(args: argparse.Namespace) -> None:
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    print("mode,kind,done,shed,latency_p50_s,latency_p95_s,max_session_wait_s")
+    for mode in ("fifo", "fair"):
+        for kind, stats in (await run(args, mode)).items():
+            print(",".join(str(v) for v in (mode, kind, *stats.values())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument(
+        "--noisy", type=int, default=2, help="Noisy translation sessions"
+    )
+    parser.add_argument("--noisy-interval", type=float, default=0.1)
+    parser.add_argument("--qa", type=int, default=4, help="Q&A sessions")
+    parser.add_argument("--qa-interval", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-rate", type=float, default=100.0)
+    parser.add_argument("--session-tokens-per-minute", type=float, default=60000)
+    parser.add_argument("--port", type=int, default=8869)
+    asyncio.run(main(parser.parse_args()))
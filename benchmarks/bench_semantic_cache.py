@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""
+Tune the semantic cache threshold on labeled question pairs.
+Each pair is a cached question and a new one, labeled 1 if the cached answer
+is right for the new question (a paraphrase) and 0 if it is a near miss
+(another pronoun, number or subject). As in a live session, the new question
+is asked one utterance later than the cached one, so the conversation context
+has grown in between. For each threshold, prints how many paraphrases hit the
+cache and how many near misses got a wrong answer.
+Usage: python benchmarks/bench_semantic_cache.py [--pairs benchmarks/data/semantic_pairs.tsv]
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+from semantic_cache import SemanticCache  # noqa: E402
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+CONTEXT = "Q: Let's talk about history and science.\nA: Sure, go ahead."
+NEXT_UTTERANCE = "\nQ: I have a few questions.\nA: Ask away."
+
+
+def load_pairs(path: str):
+    pairs = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            label, cached, question = line.rstrip("\n").split("\t")
+            pairs.append((int(label), cached, question))
+    return pairs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pairs", default=os.path.join(DATA, "semantic_pairs.tsv"))
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.pairs)
+    scores = []
+    for label, cached, question in pairs:
+        # A fresh cache per pair, with the threshold just above the score of
+        # rows of another scope (-1), returns the cached answer whenever the
+        # scopes match; the score decides the rest.
+        cache = SemanticCache(threshold=-0.999)
+        cache.add(cached, "answer", CONTEXT)
+        hit = cache.lookup(question, CONTEXT + NEXT_UTTERANCE) is not None
+        vectors = cache.embedder([cached, question])
+        scores.append((label, float(vectors[0] @ vectors[1]) if hit else -1.0))
+    labels = np.array([label for label, _ in scores])
+    similarity = np.array([score for _, score in scores])
+    print(f"# {len(pairs)} pairs, {labels.sum()} paraphrases")
+    print("threshold,paraphrase_hits,recall,wrong_answers")
+    for threshold in np.arange(0.70, 1.0, 0.02):
+        hits = similarity >= threshold
+        tp = int((hits & (labels == 1)).sum())
+        fp = int((hits & (labels == 0)).sum())
+        print(f"{threshold:.2f},{tp},{tp / labels.sum():.3f},{fp}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""
+Benchmark semantic cache lookup latency against index size.
+Usage: python benchmarks/bench_semantic_index.py [--dim 512] [--batch 1]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+from semantic_cache import HashingEmbedder, VectorIndex  # noqa: E402
+
+
+def random_unit_vectors(rng: np.random.Generator, n: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--batch", type=int, default=1, help="Queries per lookup")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print("index_size,batch,lookup_us,per_query_us")
+    for size in (256, 1024, 4096, 16384, 65536):
+        index = VectorIndex(args.dim, capacity=size)
+        for vector in random_unit_vectors(rng, size, args.dim):
+            index.add(vector, "answer")
+        queries = random_unit_vectors(rng, args.batch, args.dim)
+        index.search(queries)  # warm up
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            index.search(queries)
+        elapsed_us = (time.perf_counter() - start) / args.repeat * 1e6
+        print(f"{size},{args.batch},{elapsed_us:.1f},{elapsed_us / args.batch:.1f}")
+
+    embedder = HashingEmbedder(args.dim)
+    question = "What is the capital of France?"
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        embedder([question])
+    elapsed_us = (time.perf_counter() - start) / args.repeat * 1e6
+    print(f"# embedding one question: {elapsed_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
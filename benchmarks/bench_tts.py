@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Measure the time from a final reply to its first synthesized clip, with and
+without the speech clip cache. Several sessions produce replies drawn from a
+Zipf-like mix: a few stock phrases ("I don't know.", "Beats me.") come up
+again and again, the rest are unique. By default the engine is simulated
+(synthesis time grows with the text length); --engine uses a real one.
+Prints, per mode, the p50/p95 time to first audio, the cache hit rate and the
+number of clips synthesized.
+Usage: python benchmarks/bench_tts.py [--replies 200] [--sessions 4] [--engine espeak]
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+import wave
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+import tts  # noqa: E402
+from textnorm import split_sentences  # noqa: E402
+
+STOCK_PHRASES = [
+    "I don't know.",
+    "Beats me.",
+    "Good question.",
+    "Let me think about that.",
+    "Yes.",
+    "No.",
+    "It depends.",
+    "Could you repeat that?",
+]
+SAMPLE_RATE = 22050
+
+
+class FakeEngine:
+    """
+    Sleeps like a local engine would, then returns a silent WAV of about
+    the length of the spoken text.
+    """
+
+    name = "fake"
+    settings = "fake"
+
+    def __init__(self, base: float, per_char: float) -> None:
+        self.base = base
+        self.per_char = per_char
+        self.calls = 0
+
+    async def synthesize(self, text: str) -> bytes:
+        self.calls += 1
+        await asyncio.sleep(self.base + self.per_char * len(text))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(SAMPLE_RATE)
+            wav.writeframes(bytes(2 * int(SAMPLE_RATE * 0.06 * len(text))))
+        return buffer.getvalue()
+
+
+def make_replies(count: int, unique_share: float, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(STOCK_PHRASES))]
+    replies = []
+    for number in range(count):
+        if rng.random() < unique_share:
+            replies.append(
+                f"The answer to question {number} is {rng.randint(2, 10**6)}. "
+                "That is all I know about it."
+            )
+        else:
+            replies.append(rng.choices(STOCK_PHRASES, weights)[0])
+    return replies
+
+
+async def session(
+    speech: tts.Speech, replies: List[str], interval: float, waits: List[float]
+) -> None:
+    for reply in replies:
+        start = time.perf_counter()
+        for i, sentence in enumerate(split_sentences(reply)):
+            await speech.clip(sentence)
+            if i == 0:
+                waits.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+
+async def run(args: argparse.Namespace, cached: bool) -> dict:
+    if args.engine:
+        engine = tts.make_engine(args.engine)
+        if engine is None:
+            sys.exit(1)
+    else:
+        engine = FakeEngine(args.base_latency, args.per_char_latency)
+    cache = tts.ClipCache(int(args.cache_mb * 1024 * 1024)) if cached else None
+    speech = tts.Speech(engine, cache)
+    replies = make_replies(args.replies, args.unique_share, args.seed)
+    synthesized = tts.synthesis_seconds.count
+    waits: List[float] = []
+    await asyncio.gather(
+        *(
+            session(speech, replies[i :: args.sessions], args.interval, waits)
+            for i in range(args.sessions)
+        )
+    )
+    p50, p95 = np.percentile(waits, [50, 95])
+    lookups = cache.hits.value + cache.misses.value if cache else 0
+    return {
+        "mode": "cache" if cached else "no-cache",
+        "replies": len(waits),
+        "first_audio_p50_s": round(float(p50), 4),
+        "first_audio_p95_s": round(float(p95), 4),
+        "hit_rate": round(cache.hits.value / lookups, 3) if lookups else 0.0,
+        "synthesized": tts.synthesis_seconds.count - synthesized,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    print("mode,replies,first_audio_p50_s,first_audio_p95_s,hit_rate,synthesized")
+    for cached in (False, True):
+        result = await run(args, cached)
+        print(",".join(str(v) for v in result.values()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--replies", type=int, default=200)
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument(
+        "--unique-share", type=float, default=0.3, help="Share of one-off replies"
+    )
+    parser.add_argument(
+        "--engine", choices=sorted(tts.ENGINES), help="Real engine (default: fake)"
+    )
+    parser.add_argument("--base-latency", type=float, default=0.15)
+    parser.add_argument("--per-char-latency", type=float, default=0.004)
+    parser.add_argument("--cache-mb", type=float, default=32.0)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+"""
+Load test of the multi-process server mode.
+For each worker count, starts the server with that many workers, streams
+48 kHz PCM from many concurrent sessions as fast as the server accepts it,
+and reports how many seconds of audio per second the server ingested, i.e.
+how many real-time sessions it could sustain. Deepgram is replaced by a sink
+so only the server's own work is measured.
+Usage: python benchmarks/bench_workers.py [--workers 1,2,4] [--sessions 32]
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import types
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+import server  # noqa: E402
+import websockets  # noqa: E402
+
+
+class SinkConnection:
+    """
+    Stands in for a Deepgram live connection and drops all audio.
+    """
+
+    def on(self, event, handler) -> None:
+        pass
+
+    def start(self, options, addons=None) -> bool:
+        return True
+
+    def send(self, data: bytes) -> None:
+        pass
+
+    def finalize(self) -> bool:
+        return True
+
+    def keep_alive(self) -> bool:
+        return True
+
+    def finish(self) -> bool:
+        return True
+
+    def is_connected(self) -> bool:
+        return True
+
+
+class SinkClient:
+    def __init__(self, **kwargs) -> None:
+        websocket = types.SimpleNamespace(v=lambda version: SinkConnection())
+        self.listen = types.SimpleNamespace(websocket=websocket)
+
+
+async def wait_for_server(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/klugscheiser"):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def speech_like_chunks() -> list:
+    """
+    20 ms chunks of one second of a 200 Hz tone followed by half a second of
+    quiet noise, so voice activity detection sees speech and pauses.
+    """
+    rng = np.random.default_rng(0)
+    t = np.arange(48000) / 48000
+    tone = 3000 * np.sin(2 * np.pi * 200 * t)
+    quiet = rng.normal(0, 30, 24000)
+    pcm = np.concatenate((tone, quiet)).astype(np.int16)
+    return [pcm[i : i + 960].tobytes() for i in range(0, len(pcm), 960)]
+
+
+async def stream_sessions(port: int, sessions: int, seconds: float, sent) -> None:
+    chunks = speech_like_chunks()
+    deadline = time.monotonic() + seconds
+
+    async def session() -> None:
+        count = 0
+        async with websockets.connect(f"ws://127.0.0.1:{port}/klugscheiser") as ws:
+            while time.monotonic() < deadline:
+                await ws.send(chunks[count % len(chunks)])
+                count += 1
+        # Closing completes after the server has read every chunk.
+        with sent.get_lock():
+            sent.value += count * 960
+
+    await asyncio.gather(*(session() for _ in range(sessions)))
+
+
+def drive(port: int, sessions: int, seconds: float, sent) -> None:
+    asyncio.run(stream_sessions(port, sessions, seconds, sent))
+
+
+def run(workers: int, sessions: int, drivers: int, seconds: float, port: int) -> float:
+    """
+    Return the seconds of audio ingested per wall-clock second.
+    """
+    metrics_dir = tempfile.mkdtemp(prefix="bench-workers-")
+    server.METRICS_DIR = metrics_dir
+    context = multiprocessing.get_context("fork")
+    sent = context.Value("q", 0)
+
+    def serve() -> None:
+        asyncio.run(server.main(port, port + 1, reuse_port=True))
+
+    supervisor = context.Process(
+        target=server.run_workers, args=(workers, serve, metrics_dir, 1.0)
+    )
+    supervisor.start()
+    asyncio.run(wait_for_server(port))
+    # The pool opens its warm connections in the background.
+    time.sleep(0.5)
+    per_driver = [
+        sessions // drivers + (i < sessions % drivers) for i in range(drivers)
+    ]
+    processes = [
+        context.Process(target=drive, args=(port, count, seconds, sent))
+        for count in per_driver
+        if count
+    ]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+    os.kill(supervisor.pid, signal.SIGTERM)
+    supervisor.join()
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    return sent.value / 48000 / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default="1,2,4", help="Worker counts to test")
+    parser.add_argument("--sessions", type=int, default=32, help="Concurrent sessions")
+    parser.add_argument(
+        "--drivers",
+        type=int,
+        default=max(1, (os.cpu_count() or 1) // 2),
+        help="Load generator processes",
+    )
+    parser.add_argument("--seconds", type=float, default=10.0, help="Run duration")
+    parser.add_argument("--port", type=int, default=8865, help="WebSocket port")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    server.DeepgramClient = SinkClient
+    print("workers,sessions,cpus,audio_seconds_per_second,per_worker")
+    for workers in (int(w) for w in args.workers.split(",")):
+        rate = run(workers, args.sessions, args.drivers, args.seconds, args.port)
+        print(
+            f"{workers},{args.sessions},{os.cpu_count()},{rate:.1f},"
+            f"{rate / workers:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
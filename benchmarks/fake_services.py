@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+"""
+Local stand-ins for the Deepgram live API and the OpenAI chat completions API.
+The fake Deepgram endpoints utterances in the 16-bit PCM it receives (on a
+Finalize message or after a stretch of silence) and returns a numbered
+question as the final transcript, optionally split into several finals as
+Deepgram does with short endpointing. The fake OpenAI streams a fixed answer at a
+configurable time to first token and token rate.
+Point the server at them with DEEPGRAM_HOST=http://127.0.0.1:<deepgram port>
+and OPENAI_BASE_URL=http://127.0.0.1:<openai port>/v1.
+Usage: python benchmarks/fake_services.py [--deepgram-port 8866] [--openai-port 8867]
+"""
+
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import websockets
+from aiohttp import web
+
+DEFAULT_ANSWER = "Paris is the capital of France, and it has been for centuries."
+
+
+def results_message(
+    transcript: str,
+    start: float,
+    duration: float,
+    is_final: bool = True,
+    speech_final: bool = False,
+    from_finalize: bool = False,
+) -> str:
+    """
+    A Deepgram live "Results" message.
+    """
+    return json.dumps(
+        {
+            "type": "Results",
+            "channel_index": [0, 1],
+            "duration": duration,
+            "start": start,
+            "is_final": is_final,
+            "speech_final": speech_final,
+            "from_finalize": from_finalize,
+            "channel": {
+                "alternatives": [
+                    {"transcript": transcript, "confidence": 0.99, "words": []}
+                ]
+            },
+            "metadata": {
+                "request_id": str(uuid.uuid4()),
+                "model_uuid": str(uuid.uuid4()),
+                "model_info": {"name": "fake", "version": "0", "arch": "fake"},
+            },
+        }
+    )
+
+
+class FakeDeepgram:
+    """
+    Minimal Deepgram live transcription server for linear16 16 kHz audio.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.15,
+        endpointing_ms: int = 300,
+        sample_rate: int = 16000,
+        speech_rms: float = 300.0,
+        fragments: int = 1,
+        fragment_gap: float = 0.1,
+    ) -> None:
+        self.latency = latency
+        self.fragments = fragments
+        self.fragment_gap = fragment_gap
+        self.endpointing_bytes = sample_rate * 2 * endpointing_ms // 1000
+        self.sample_rate = sample_rate
+        self.speech_rms = speech_rms
+        self._questions = itertools.count(1)
+        self._server = None
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> None:
+        self._server = await websockets.serve(self._handle, host, port)
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _results(self, start: float, duration: float, from_finalize: bool) -> list:
+        number = next(self._questions)
+        count = max(1, self.fragments)
+        if count == 1:
+            texts = [f"What is the answer to question number {number}?"]
+        else:
+            # Every fragment is unique, so none is served from a reply cache.
+            texts = [f"Part {i + 1} of question {number}" for i in range(count)]
+            texts[-1] += "?"
+        results = []
+        for i, text in enumerate(texts):
+            last = i == count - 1
+            results.append(
+                results_message(
+                    text,
+                    start + duration * i / count,
+                    duration / count,
+                    speech_final=last and not from_finalize,
+                    from_finalize=last and from_finalize,
+                )
+            )
+        return results
+
+    async def _handle(self, ws) -> None:
+        received = 0
+        speech_start = None
+        silent_bytes = 0
+        pending = set()
+
+        def endpoint(from_finalize: bool) -> None:
+            nonlocal speech_start
+            start = speech_start / (2 * self.sample_rate)
+            duration = received / (2 * self.sample_rate) - start
+            speech_start = None
+            task = asyncio.create_task(
+                self._send_later(ws, self._results(start, duration, from_finalize))
+            )
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+
+        try:
+            async for message in ws:
+                if isinstance(message, str):
+                    kind = json.loads(message).get("type")
+                    if kind == "Finalize" and speech_start is not None:
+                        endpoint(True)
+                    elif kind == "CloseStream":
+                        await ws.close()
+                        return
+                    continue
+                samples = np.frombuffer(message, dtype=np.int16).astype(np.float32)
+                received += len(message)
+                voiced = samples.size and np.sqrt(np.mean(samples**2)) > self.speech_rms
+                if voiced:
+                    if speech_start is None:
+                        speech_start = received - len(message)
+                    silent_bytes = 0
+                elif speech_start is not None:
+                    silent_bytes += len(message)
+                    if silent_bytes >= self.endpointing_bytes:
+                        endpoint(False)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        if pending:
+            await asyncio.wait(pending)
+
+    async def _send_later(self, ws, messages: List[str]) -> None:
+        await asyncio.sleep(self.latency)
+        try:
+            for index, message in enumerate(messages):
+                if index:
+                    await asyncio.sleep(self.fragment_gap)
+                await ws.send(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+
+class FakeOpenAI:
+    """
+    Chat completions endpoint that answers every request with the same text.
+    Words are streamed as tokens after `latency` seconds at `token_rate` per second.
+    Small models ("mini" or "nano" in the name) use `small_latency` and
+    `small_token_rate` instead, if given. A fraction `spike_rate` of requests
+    waits `spike_latency` seconds longer, and a fraction `error_rate` fails
+    with a 503, to exercise timeouts, retries and hedging.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.3,
+        token_rate: float = 50.0,
+        answer: str = DEFAULT_ANSWER,
+        small_latency: Optional[float] = None,
+        small_token_rate: Optional[float] = None,
+        spike_rate: float = 0.0,
+        spike_latency: float = 2.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.token_rate = token_rate
+        self.small_latency = latency if small_latency is None else small_latency
+        self.small_token_rate = small_token_rate or token_rate
+        self.tokens = [w + " " for w in answer.split()]
+        self.tokens[-1] = self.tokens[-1].rstrip()
+        self.requests = 0
+        self.spikes = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.requests_by_model: Dict[str, int] = collections.Counter()
+        self._runner = None
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> None:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _answer(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """
+        The answer as tokens. A request whose last message is a JSON list
+        (a batch of fragments) is answered with a list of the same length.
+        """
+        try:
+            batch = json.loads(messages[-1]["content"])
+        except (IndexError, KeyError, TypeError, ValueError):
+            batch = None
+        if not isinstance(batch, list):
+            return self.tokens
+        answer = json.dumps(["".join(self.tokens)] * len(batch))
+        tokens = [w + " " for w in answer.split(" ")]
+        tokens[-1] = tokens[-1].rstrip()
+        return tokens
+
+    def _usage(
+        self, messages: List[Dict[str, Any]], tokens: List[str]
+    ) -> Dict[str, int]:
+        prompt = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        completion = len(tokens)
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+        }
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        body = await request.json()
+        model = body.get("model", "fake")
+        self.requests_by_model[model] += 1
+        small = "mini" in model or "nano" in model
+        latency = self.small_latency if small else self.latency
+        token_rate = self.small_token_rate if small else self.token_rate
+        created = int(time.time())
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": created}
+        base["model"] = model
+        messages = body.get("messages", [])
+        tokens = self._answer(messages)
+        usage = self._usage(messages, tokens)
+        self.prompt_tokens += usage["prompt_tokens"]
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            await asyncio.sleep(latency)
+            return web.json_response(
+                {"error": {"message": "Overloaded", "type": "server_error"}},
+                status=503,
+            )
+        if self._random.random() < self.spike_rate:
+            self.spikes += 1
+            latency += self.spike_latency
+        await asyncio.sleep(latency)
+        if not body.get("stream"):
+            await asyncio.sleep(len(tokens) / token_rate)
+            message = {"role": "assistant", "content": "".join(tokens)}
+            choice = {"index": 0, "message": message, "finish_reason": "stop"}
+            return web.json_response(
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [choice],
+                    "usage": usage,
+                }
+            )
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+
+        async def event(choices: List[Dict[str, Any]], **extra: Any) -> None:
+            chunk = {**base, "object": "chat.completion.chunk", "choices": choices}
+            chunk.update(extra)
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+
+        try:
+            await response.prepare(request)
+            for index, token in enumerate(tokens):
+                if index:
+                    await asyncio.sleep(1 / token_rate)
+                delta = {"content": token}
+                if index == 0:
+                    delta["role"] = "assistant"
+                await event([{"index": 0, "delta": delta, "finish_reason": None}])
+            await event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if body.get("stream_options", {}).get("include_usage"):
+                await event([], usage=usage)
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client abandoned the stream (cancelled or escalated).
+            pass
+        return response
+
+
+async def serve(args: argparse.Namespace) -> None:
+    deepgram = FakeDeepgram(latency=args.stt_latency, fragments=args.stt_fragments)
+    openai = FakeOpenAI(
+        latency=args.llm_latency,
+        token_rate=args.token_rate,
+        small_latency=args.small_llm_latency,
+        small_token_rate=args.small_token_rate,
+        spike_rate=args.llm_spike_rate,
+        spike_latency=args.llm_spike_latency,
+        error_rate=args.llm_error_rate,
+    )
+    await deepgram.start(args.deepgram_port)
+    await openai.start(args.openai_port)
+    print(f"DEEPGRAM_HOST=http://127.0.0.1:{args.deepgram_port}")
+    print(f"OPENAI_BASE_URL=http://127.0.0.1:{args.openai_port}/v1")
+    await asyncio.Event().wait()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--stt-latency",
+        type=float,
+        default=0.15,
+        help="Seconds from endpoint to final transcript",
+    )
+    parser.add_argument(
+        "--stt-fragments",
+        type=int,
+        default=1,
+        help="Final transcripts each utterance is split into, 100 ms apart",
+    )
+    parser.add_argument(
+        "--llm-latency", type=float, default=0.3, help="Seconds to the first token"
+    )
+    parser.add_argument(
+        "--token-rate", type=float, default=50.0, help="Completion tokens per second"
+    )
+    parser.add_argument(
+        "--llm-spike-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of LLM requests delayed by --llm-spike-latency",
+    )
+    parser.add_argument(
+        "--llm-spike-latency",
+        type=float,
+        default=2.0,
+        help="Extra seconds to the first token of a delayed LLM request",
+    )
+    parser.add_argument(
+        "--llm-error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of LLM requests that fail with HTTP 503",
+    )
+    parser.add_argument(
+        "--small-llm-latency",
+        type=float,
+        default=0.15,
+        help="Seconds to the first token for small models (e.g. gpt-4o-mini)",
+    )
+    parser.add_argument(
+        "--small-token-rate",
+        type=float,
+        default=100.0,
+        help="Completion tokens per second for small models",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--deepgram-port", type=int, default=8866)
+    parser.add_argument("--openai-port", type=int, default=8867)
+    add_arguments(parser)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+"""
+End-to-end load test of server.py against local Deepgram and OpenAI stand-ins.
+For each session count, starts the server, replays PCM through that many
+concurrent client sessions in real time (like client.py: 16 kHz mono, 1024
+samples per chunk), and measures the time from the end of each spoken
+utterance to the first answer or translation. Results are printed as JSON, so
+runs on different commits can be compared:
+  - latency_p50_s / latency_p95_s / latency_p99_s: audio-to-answer latency;
+  - sessions_per_core: sessions one fully used core would sustain;
+  - memory_per_session_bytes: server RSS growth per open session (Linux).
+Usage: python benchmarks/loadtest.py [--sessions 1,8,32] [--input speech.wav ...]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+from audio import Resampler  # noqa: E402
+from bench_codecs import load_pcm  # noqa: E402
+from fake_services import FakeDeepgram, FakeOpenAI, add_arguments  # noqa: E402
+
+SERVER = os.path.join(os.path.dirname(__file__), "..", "klugscheiser", "server.py")
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 1024
+# Chunks with a higher RMS count as speech when locating utterance ends.
+SPEECH_RMS = 300.0
+
+
+def load_inputs(paths: List[str], seconds: float) -> List[np.ndarray]:
+    """
+    Load each input as 16 kHz mono PCM, or synthesize speech-like audio.
+    """
+    inputs = []
+    for path in paths or [""]:
+        pcm = load_pcm(path, seconds)
+        pcm16 = Resampler(48000).process(pcm.tobytes())
+        inputs.append(np.frombuffer(pcm16, dtype=np.int16))
+    return inputs
+
+
+def speech_ends(pcm: np.ndarray) -> List[int]:
+    """
+    Indices of the chunks that end an utterance (voiced, followed by unvoiced).
+    """
+    count = len(pcm) // CHUNK_SIZE
+    chunks = pcm[: count * CHUNK_SIZE].reshape(count, CHUNK_SIZE).astype(np.float32)
+    voiced = np.sqrt(np.mean(chunks**2, axis=1)) > SPEECH_RMS
+    return [i for i in range(count - 1) if voiced[i] and not voiced[i + 1]]
+
+
+async def run_session(
+    uri: str, pcm: np.ndarray, duration: float, delay: float, latencies: List[float]
+) -> Dict[str, int]:
+    """
+    Stream PCM in real time for `duration` seconds and record, for every
+    answer, the time since the end of the utterance it answers.
+    """
+    await asyncio.sleep(delay)
+    ends = set(speech_ends(pcm))
+    count = len(pcm) // CHUNK_SIZE
+    chunk_seconds = CHUNK_SIZE / SAMPLE_RATE
+    # Send times of utterance ends that have not been answered yet.
+    unanswered: List[float] = []
+    stats = {"utterances": 0, "answers": 0}
+
+    async def receive(ws) -> None:
+        async for message in ws:
+            reply = json.loads(message)
+            if ("answer" in reply or "translation" in reply) and unanswered:
+                latencies.append(time.perf_counter() - unanswered.pop(0))
+                stats["answers"] += 1
+
+    async with websockets.connect(uri) as ws:
+        await ws.send(
+            json.dumps({"type": "config", "sample_rate": SAMPLE_RATE, "channels": 1})
+        )
+        receiver = asyncio.create_task(receive(ws))
+        start = time.perf_counter()
+        index = 0
+        while index * chunk_seconds < duration:
+            # A chunk is sent once it has been "recorded", as a microphone would.
+            await asyncio.sleep(
+                max(0.0, start + (index + 1) * chunk_seconds - time.perf_counter())
+            )
+            position = index % count
+            await ws.send(
+                pcm[position * CHUNK_SIZE : (position + 1) * CHUNK_SIZE].tobytes()
+            )
+            if position in ends:
+                unanswered.append(time.perf_counter())
+                stats["utterances"] += 1
+            index += 1
+        # Leave time for the last answers before hanging up.
+        deadline = time.perf_counter() + 5.0
+        while unanswered and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        receiver.cancel()
+    return stats
+
+
+def process_tree(pid: int) -> List[int]:
+    """
+    The pid and all its descendants (Linux only).
+    """
+    pids = [pid]
+    for current in pids:
+        try:
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    total = 0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            return None
+    return total
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    total = 0.0
+    ticks = os.sysconf("SC_CLK_TCK")
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            return None
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat.
+        total += (int(fields[11]) + int(fields[12])) / ticks
+    return total
+
+
+async def wait_for_server(port: int, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with websockets.connect(f"ws://127.0.0.1:{port}/klugscheiser"):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def run(
+    args: argparse.Namespace, sessions: int, inputs: List[np.ndarray]
+) -> Dict:
+    deepgram = FakeDeepgram(latency=args.stt_latency, fragments=args.stt_fragments)
+    openai = FakeOpenAI(
+        latency=args.llm_latency,
+        token_rate=args.token_rate,
+        small_latency=args.small_llm_latency,
+        small_token_rate=args.small_token_rate,
+        spike_rate=args.llm_spike_rate,
+        spike_latency=args.llm_spike_latency,
+        error_rate=args.llm_error_rate,
+    )
+    await deepgram.start(args.deepgram_port)
+    await openai.start(args.openai_port)
+    env = dict(
+        os.environ,
+        DEEPGRAM_HOST=f"http://127.0.0.1:{args.deepgram_port}",
+        DEEPGRAM_API_KEY="fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1",
+        OPENAI_API_KEY="fake",
+    )
+    command = [sys.executable, SERVER, "--ws-port", str(args.port)]
+    command += ["--http-port", str(args.port + 1), *args.server_args.split()]
+    server = subprocess.Popen(
+        command,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    try:
+        await wait_for_server(args.port)
+        await asyncio.sleep(1.0)
+        rss_idle = rss_bytes(server.pid)
+        cpu_start = cpu_seconds(server.pid)
+        wall_start = time.perf_counter()
+
+        latencies: List[float] = []
+        rss_peak = rss_idle
+        uri = f"ws://127.0.0.1:{args.port}/{args.path.strip('/')}"
+        tasks = [
+            asyncio.create_task(
+                run_session(
+                    uri,
+                    inputs[i % len(inputs)],
+                    args.duration,
+                    args.ramp * i / sessions,
+                    latencies,
+                )
+            )
+            for i in range(sessions)
+        ]
+        while not all(task.done() for task in tasks):
+            await asyncio.wait(tasks, timeout=0.5)
+            rss = rss_bytes(server.pid)
+            if rss is not None and rss_peak is not None:
+                rss_peak = max(rss_peak, rss)
+        stats = [task.result() for task in tasks]
+        wall = time.perf_counter() - wall_start
+        cpu_end = cpu_seconds(server.pid)
+    finally:
+        server.terminate()
+        # The fakes run on this loop and must keep serving while the server drains.
+        await asyncio.to_thread(server.wait)
+        await deepgram.close()
+        await openai.close()
+
+    result: Dict = {
+        "sessions": sessions,
+        "utterances": sum(s["utterances"] for s in stats),
+        "answers": sum(s["answers"] for s in stats),
+        "llm_requests": openai.requests,
+        "llm_requests_by_model": dict(openai.requests_by_model),
+        "llm_prompt_tokens": openai.prompt_tokens,
+        "wall_seconds": round(wall, 3),
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        result.update(
+            latency_mean_s=round(float(np.mean(latencies)), 4),
+            latency_p50_s=round(float(p50), 4),
+            latency_p95_s=round(float(p95), 4),
+            latency_p99_s=round(float(p99), 4),
+        )
+    if cpu_start is not None and cpu_end is not None:
+        cores = (cpu_end - cpu_start) / wall
+        result["server_cpu_seconds"] = round(cpu_end - cpu_start, 3)
+        result["sessions_per_core"] = round(sessions / cores, 1) if cores else None
+    if rss_idle is not None and rss_peak is not None:
+        result["rss_idle_bytes"] = rss_idle
+        result["rss_peak_bytes"] = rss_peak
+        result["memory_per_session_bytes"] = (rss_peak - rss_idle) // sessions
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sessions", default="1,8,32", help="Session counts to test")
+    parser.add_argument("--input", nargs="*", default=[], help="16-bit PCM WAV files")
+    parser.add_argument(
+        "--duration", type=float, default=20.0, help="Seconds each session streams"
+    )
+    parser.add_argument(
+        "--ramp", type=float, default=2.0, help="Seconds over which sessions start"
+    )
+    parser.add_argument("--path", default="/klugscheiser", help="WebSocket path")
+    parser.add_argument(
+        "--server-args",
+        default="",
+        help="Extra server.py arguments, e.g. '--workers 2'",
+    )
+    parser.add_argument("--port", type=int, default=8875, help="Server WebSocket port")
+    parser.add_argument("--deepgram-port", type=int, default=8866)
+    parser.add_argument("--openai-port", type=int, default=8867)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    inputs = load_inputs(args.input, args.duration)
+    results = [
+        asyncio.run(run(args, int(sessions), inputs))
+        for sessions in args.sessions.split(",")
+    ]
+    report = {
+        "commit": git_commit(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "duration": args.duration,
+            "path": args.path,
+            "server_args": args.server_args,
+            "stt_latency": args.stt_latency,
+            "stt_fragments": args.stt_fragments,
+            "llm_latency": args.llm_latency,
+            "token_rate": args.token_rate,
+            "small_llm_latency": args.small_llm_latency,
+            "small_token_rate": args.small_token_rate,
+            "llm_spike_rate": args.llm_spike_rate,
+            "llm_spike_latency": args.llm_spike_latency,
+            "llm_error_rate": args.llm_error_rate,
+            "inputs": args.input,
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+"""
+Replay sessions recorded with server.py --record-dir.
+Streams each recording's handshakes and audio frames to a server, either with
+the recorded timing (--speed 1, or faster/slower) or as fast as possible
+(--speed 0), and reports when the replies arrived compared to the recording.
+Replaying the same recording on different commits gives comparable latencies
+from identical inputs; --speed 0 is meant for profiling hot paths.
+Without --uri, server.py is started against local stand-ins as in loadtest.py.
+With --transcripts, the Deepgram stand-in sends the recorded transcripts at
+their recorded point in the session instead of recognizing the audio, so the
+LLM side sees exactly the recorded utterances.
+Usage: python benchmarks/replay.py RECORDING [...] [--speed 1] [--copies 1]
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "klugscheiser"))
+
+from fake_services import (  # noqa: E402
+    FakeDeepgram,
+    FakeOpenAI,
+    add_arguments,
+    results_message,
+)
+from loadtest import SERVER, git_commit, wait_for_server  # noqa: E402
+from recording import Recording  # noqa: E402
+
+FINAL_KEYS = ("answer", "translation")
+
+
+class ReplayDeepgram:
+    """
+    Deepgram stand-in that sends the transcripts it is given instead of
+    recognizing speech. A connection is paired with the next waiting session
+    when its first audio arrives; transcripts sent earlier are queued.
+    """
+
+    def __init__(self) -> None:
+        self._waiting: Deque[asyncio.Queue] = deque()
+        self._server = None
+
+    async def start(self, port: int, host: str = "127.0.0.1") -> None:
+        self._server = await websockets.serve(self._handle, host, port)
+
+    async def close(self) -> None:
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def session(self) -> asyncio.Queue:
+        """
+        Queue for the transcripts of a session that is about to start.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._waiting.append(queue)
+        return queue
+
+    def discard(self, queue: asyncio.Queue) -> None:
+        """
+        Stop waiting for a connection for a session that has ended.
+        """
+        if queue in self._waiting:
+            self._waiting.remove(queue)
+
+    async def _handle(self, ws) -> None:
+        sender = None
+        try:
+            async for message in ws:
+                if isinstance(message, bytes):
+                    if sender is None and self._waiting:
+                        queue = self._waiting.popleft()
+                        sender = asyncio.create_task(self._send(ws, queue))
+                elif json.loads(message).get("type") == "CloseStream":
+                    await ws.close()
+                    break
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if sender:
+                sender.cancel()
+
+    async def _send(self, ws, queue: asyncio.Queue) -> None:
+        while True:
+            event = await queue.get()
+            await ws.send(
+                results_message(
+                    event["text"],
+                    event["start"],
+                    event["duration"],
+                    is_final=event["is_final"],
+                    speech_final=event["speech_final"],
+                )
+            )
+
+
+def timeline(recording: Recording) -> Iterator[Tuple[float, str, Any]]:
+    """
+    The recording's audio frames, handshakes and transcripts in time order.
+    """
+    frames = ((t, "audio", frame) for t, frame in recording.frames())
+    events = (
+        (e["time"], e["kind"], e)
+        for e in recording.events
+        if e["kind"] in ("config", "transcript")
+    )
+    return heapq.merge(frames, events, key=lambda item: item[0])
+
+
+def final_replies(replies: List[Tuple[float, dict]]) -> List[float]:
+    return [t for t, reply in replies if any(k in reply for k in FINAL_KEYS)]
+
+
+async def replay_session(
+    uri: str,
+    recording: Recording,
+    speed: float,
+    deepgram: Optional[ReplayDeepgram],
+    wait: float,
+) -> Dict[str, Any]:
+    """
+    Replay one recording and return the times of its final replies, in
+    seconds since the session started.
+    """
+    expected = len(
+        final_replies(
+            [(e["time"], json.loads(e["data"])) for e in recording.of_kind("reply")]
+        )
+    )
+    transcripts = deepgram.session() if deepgram else None
+    replies: List[Tuple[float, dict]] = []
+
+    async with websockets.connect(uri) as ws:
+        start = time.perf_counter()
+
+        async def receive() -> None:
+            async for message in ws:
+                replies.append((time.perf_counter() - start, json.loads(message)))
+
+        receiver = asyncio.create_task(receive())
+        for t, kind, item in timeline(recording):
+            if speed > 0:
+                await asyncio.sleep(max(0.0, start + t / speed - time.perf_counter()))
+            if kind == "audio":
+                await ws.send(item)
+            elif kind == "config":
+                await ws.send(item["data"])
+            elif transcripts:
+                transcripts.put_nowait(item)
+        sent = time.perf_counter() - start
+        # Leave time for the last replies before hanging up.
+        deadline = time.perf_counter() + wait
+        while len(final_replies(replies)) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.02)
+        receiver.cancel()
+    if transcripts:
+        deepgram.discard(transcripts)
+    return {"expected": expected, "sent": sent, "finals": final_replies(replies)}
+
+
+async def replay(
+    args: argparse.Namespace, recording: Recording, uri: str, deepgram
+) -> Dict[str, Any]:
+    wall_start = time.perf_counter()
+    sessions = await asyncio.gather(
+        *(
+            replay_session(uri, recording, args.speed, deepgram, args.wait)
+            for _ in range(args.copies)
+        )
+    )
+    wall = time.perf_counter() - wall_start
+    recorded = final_replies(
+        [(e["time"], json.loads(e["data"])) for e in recording.of_kind("reply")]
+    )
+    # How much later (or earlier) each reply arrived than in the recording,
+    # pairing replies by their order.
+    deltas = [
+        t - r / args.speed
+        for session in sessions
+        for t, r in zip(session["finals"], recorded)
+        if args.speed > 0
+    ]
+    result: Dict[str, Any] = {
+        "recording": recording.base,
+        "path": recording.path,
+        "audio_frames": len(recording.index),
+        "recorded_seconds": round(recording.duration, 3),
+        "recorded_replies": len(recorded),
+        "replies": sum(len(s["finals"]) for s in sessions),
+        "wall_seconds": round(wall, 3),
+        "send_seconds": round(max(s["sent"] for s in sessions), 3),
+    }
+    if deltas:
+        p50, p95 = np.percentile(deltas, [50, 95])
+        result.update(
+            reply_delta_p50_s=round(float(p50), 4),
+            reply_delta_p95_s=round(float(p95), 4),
+            reply_delta_max_s=round(float(max(deltas)), 4),
+        )
+    # Time from the last frame to the last reply, mainly for --speed 0.
+    tails = [s["finals"][-1] - s["sent"] for s in sessions if s["finals"]]
+    if tails:
+        result["drain_seconds"] = round(max(tails), 4)
+    return result
+
+
+async def run(args: argparse.Namespace, recordings: List[Recording]) -> List[Dict]:
+    if args.uri:
+        uri = args.uri.rstrip("/")
+        return [await replay(args, r, uri + r.path, None) for r in recordings]
+
+    if args.transcripts:
+        deepgram = ReplayDeepgram()
+    else:
+        deepgram = FakeDeepgram(latency=args.stt_latency, fragments=args.stt_fragments)
+    openai = FakeOpenAI(
+        latency=args.llm_latency,
+        token_rate=args.token_rate,
+        small_latency=args.small_llm_latency,
+        small_token_rate=args.small_token_rate,
+        spike_rate=args.llm_spike_rate,
+        spike_latency=args.llm_spike_latency,
+        error_rate=args.llm_error_rate,
+        seed=0,
+    )
+    await deepgram.start(args.deepgram_port)
+    await openai.start(args.openai_port)
+    env = dict(
+        os.environ,
+        DEEPGRAM_HOST=f"http://127.0.0.1:{args.deepgram_port}",
+        DEEPGRAM_API_KEY="fake",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1",
+        OPENAI_API_KEY="fake",
+    )
+    command = [sys.executable, SERVER, "--ws-port", str(args.port)]
+    command += ["--http-port", str(args.port + 1), *args.server_args.split()]
+    server = subprocess.Popen(
+        command,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=None if args.verbose else subprocess.DEVNULL,
+    )
+    try:
+        await wait_for_server(args.port)
+        await asyncio.sleep(1.0)
+        uri = f"ws://127.0.0.1:{args.port}"
+        replayer = deepgram if args.transcripts else None
+        return [await replay(args, r, uri + r.path, replayer) for r in recordings]
+    finally:
+        server.terminate()
+        await asyncio.to_thread(server.wait)
+        await deepgram.close()
+        await openai.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("recordings", nargs="+", help="Recording base names")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Playback speed, 1 for the recorded timing, 0 for as fast as possible",
+    )
+    parser.add_argument(
+        "--copies", type=int, default=1, help="Concurrent replays of each recording"
+    )
+    parser.add_argument(
+        "--wait", type=float, default=5.0, help="Seconds to wait for the last replies"
+    )
+    parser.add_argument(
+        "--transcripts",
+        action="store_true",
+        help="Send the recorded transcripts instead of recognizing the audio",
+    )
+    parser.add_argument(
+        "--uri", help="Replay against this running server, e.g. ws://127.0.0.1:8765"
+    )
+    parser.add_argument(
+        "--server-args",
+        default="",
+        help="Extra server.py arguments, e.g. '--coalesce-ms 0'",
+    )
+    parser.add_argument("--port", type=int, default=8875, help="Server WebSocket port")
+    parser.add_argument("--deepgram-port", type=int, default=8866)
+    parser.add_argument("--openai-port", type=int, default=8867)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.transcripts and args.uri:
+        parser.error("--transcripts needs the local stand-ins, not --uri")
+
+    recordings = [Recording(path) for path in args.recordings]
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "speed": args.speed,
+            "copies": args.copies,
+            "transcripts": args.transcripts,
+            "uri": args.uri,
+            "server_args": args.server_args,
+        },
+        "results": asyncio.run(run(args, recordings)),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
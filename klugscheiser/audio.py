@@ -0,0 +1,205 @@
+"""
+Server-side audio handling.
+Clients send 16-bit PCM at whatever rate their device uses, or containerized
+Opus. PCM is downmixed to mono and resampled to 16 kHz before it is forwarded
+to Deepgram; Opus is passed through for Deepgram to decode.
+"""
+
+import json
+import logging
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+from vad import VoiceActivityDetector
+
+TARGET_SAMPLE_RATE = 16000
+# Assumed client format when no handshake frame is sent (browser default).
+DEFAULT_SAMPLE_RATE = 48000
+
+
+def lowpass_taps(cutoff: float, taps: int) -> np.ndarray:
+    """
+    Windowed-sinc low-pass FIR. `cutoff` is relative to the sample rate (0..0.5).
+    """
+    n = np.arange(taps) - (taps - 1) / 2
+    h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (h / h.sum()).astype(np.float32)
+
+
+class Resampler:
+    """
+    Streaming converter from interleaved int16 PCM to 16 kHz mono int16 PCM.
+    When downsampling, a low-pass FIR removes content above the new Nyquist
+    frequency, then output samples are linearly interpolated at fractional
+    input positions. Filter history and the interpolation phase are carried
+    across chunks, so chunk boundaries do not produce clicks. Chunks need not
+    hold whole frames: a trailing partial frame is kept for the next chunk.
+    """
+
+    def __init__(
+        self,
+        in_rate: int,
+        channels: int = 1,
+        out_rate: int = TARGET_SAMPLE_RATE,
+        taps: int = 31,
+    ) -> None:
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.channels = channels
+        self.step = in_rate / out_rate
+        self._taps: Optional[np.ndarray] = None
+        if in_rate > out_rate:
+            # Cut off slightly below the output Nyquist frequency.
+            self._taps = lowpass_taps(0.45 / self.step, taps)
+            self._history = np.zeros(taps - 1, dtype=np.float32)
+        self._pos = 0.0
+        self._last = np.float32(0.0)
+        self._frame_bytes = 2 * channels
+        self._partial = b""
+
+    def process(self, pcm: bytes) -> bytes:
+        if self._partial:
+            pcm = self._partial + pcm
+        usable = len(pcm) - len(pcm) % self._frame_bytes
+        self._partial = pcm[usable:]
+        if not usable:
+            return b""
+        samples = np.frombuffer(pcm, dtype=np.int16, count=usable // 2)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        if self.in_rate == self.out_rate:
+            return samples.astype(np.int16).tobytes()
+
+        x = samples.astype(np.float32)
+        if self._taps is not None:
+            buffered = np.concatenate((self._history, x))
+            x = np.convolve(buffered, self._taps, mode="valid")
+            self._history = buffered[len(buffered) - len(self._history) :]
+
+        # Index 0 is the last sample of the previous chunk.
+        y = np.concatenate(([self._last], x))
+        span = len(y) - 1
+        count = max(0, int(np.ceil((span - self._pos) / self.step)))
+        positions = self._pos + self.step * np.arange(count)
+        index = positions.astype(np.int64)
+        frac = (positions - index).astype(np.float32)
+        out = y[index] * (1 - frac) + y[np.minimum(index + 1, span)] * frac
+        self._pos += count * self.step - span
+        self._last = y[-1]
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16).tobytes()
+
+
+class AudioFormat(NamedTuple):
+    codec: str
+    sample_rate: int
+    channels: int
+
+
+# Raw 16-bit PCM, converted on the server.
+PCM = "pcm"
+# Containerized Opus that Deepgram decodes itself, forwarded unchanged.
+PASSTHROUGH_CODECS = {"webm-opus", "ogg-opus"}
+DEFAULT_FORMAT = AudioFormat(PCM, DEFAULT_SAMPLE_RATE, 1)
+
+
+def parse_config(message: str) -> Optional[AudioFormat]:
+    """
+    Parse a client handshake frame, e.g.
+    {"type": "config", "codec": "pcm", "sample_rate": 44100, "channels": 1}.
+    The codec defaults to "pcm". Returns None if the message is not a valid handshake.
+    """
+    try:
+        config = json.loads(message)
+        if config.get("type") != "config":
+            return None
+        codec = str(config.get("codec", PCM))
+        sample_rate = int(config.get("sample_rate", DEFAULT_SAMPLE_RATE))
+        channels = int(config.get("channels", 1))
+    except (ValueError, TypeError, AttributeError) as e:
+        logging.warning("Invalid handshake frame %r: %s", message, e)
+        return None
+    if codec != PCM and codec not in PASSTHROUGH_CODECS:
+        logging.warning("Unsupported codec in handshake: %s", codec)
+        return None
+    if not 8000 <= sample_rate <= 192000 or not 1 <= channels <= 8:
+        logging.warning("Unsupported audio format in handshake: %s", config)
+        return None
+    return AudioFormat(codec, sample_rate, channels)
+
+
+class AudioUplink:
+    """
+    Forwards one client's audio to its Deepgram connection.
+    PCM is resampled to 16 kHz mono and, optionally, gated by voice activity
+    detection: silence is replaced by KeepAlive messages, and a Finalize
+    message flushes the transcript when speech ends. Passthrough codecs are
+    forwarded unchanged.
+    """
+
+    def __init__(
+        self,
+        connection,
+        audio_format: AudioFormat = DEFAULT_FORMAT,
+        vad_enabled: bool = True,
+        keepalive_seconds: float = 5.0,
+    ) -> None:
+        self.connection = connection
+        self.keepalive_seconds = keepalive_seconds
+        self.vad = VoiceActivityDetector(TARGET_SAMPLE_RATE) if vad_enabled else None
+        self.wire_bytes = 0
+        self.received_bytes = 0
+        self.forwarded_bytes = 0
+        self._last_sent = time.monotonic()
+        # When the first audio of the current utterance was forwarded.
+        self._utterance_start: Optional[float] = None
+        self.configure(audio_format)
+
+    def configure(self, audio_format: AudioFormat) -> None:
+        self.format = audio_format
+        self.resampler = None
+        if audio_format.codec == PCM:
+            self.resampler = Resampler(audio_format.sample_rate, audio_format.channels)
+
+    def send(self, chunk: bytes) -> None:
+        self.wire_bytes += len(chunk)
+        if self.resampler is None:
+            self._mark_start()
+            self.connection.send(chunk)
+            return
+        audio = self.resampler.process(chunk)
+        self.received_bytes += len(audio)
+        speech_ended = False
+        if self.vad:
+            audio, speech_ended = self.vad.process(audio)
+        if audio:
+            self._mark_start()
+            self.connection.send(audio)
+            self.forwarded_bytes += len(audio)
+            self._last_sent = time.monotonic()
+        if speech_ended:
+            # Without trailing silence Deepgram would not endpoint.
+            self.connection.finalize()
+        elif time.monotonic() - self._last_sent > self.keepalive_seconds:
+            self.connection.keep_alive()
+            self._last_sent = time.monotonic()
+
+    def take_utterance_start(self) -> Optional[float]:
+        """
+        Return the perf_counter() time the current utterance's audio started to
+        be forwarded, and start a new utterance.
+        """
+        start, self._utterance_start = self._utterance_start, None
+        return start
+
+    def _mark_start(self) -> None:
+        if self._utterance_start is None:
+            self._utterance_start = time.perf_counter()
+
+    def summary(self) -> str:
+        text = "audio: codec=%s wire_bytes=%d" % (self.format.codec, self.wire_bytes)
+        if self.received_bytes:
+            text += " forwarded=%.1f%%" % (
+                100 * self.forwarded_bytes / self.received_bytes
+            )
+        return text
@@ -0,0 +1,152 @@
+"""
+Process-wide cache for answers and translations.
+Entries are keyed by normalized text plus task and language (and a context
+fingerprint for Q&A), expire after a TTL, and are evicted least recently used
+first once the cache exceeds its size limit in bytes. Optionally, entries are
+persisted to a local SQLite file so warm entries survive restarts.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from metrics import Counter
+from textnorm import normalize
+
+
+def context_fingerprint(context: str) -> str:
+    """
+    A short hash of the conversation context, empty for no context.
+    """
+    if not context:
+        return ""
+    return hashlib.sha1(normalize(context).encode()).hexdigest()[:16]
+
+
+def make_key(task: str, language: str, text: str, context: str = "") -> str:
+    """
+    Build a cache key. The context only contributes a short fingerprint.
+    """
+    key = f"{task}|{language}|{normalize(text)}"
+    if context:
+        key += "|" + context_fingerprint(context)
+    return key
+
+
+def _entry_size(key: str, value: str) -> int:
+    return len(key.encode()) + len(value.encode())
+
+
+class ReplyCache:
+    """
+    LRU cache with TTL and a byte budget. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 8 * 1024 * 1024,
+        ttl: float = 24 * 3600,
+        path: Optional[str] = None,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = Counter("reply_cache_hits_total", "Reply cache hits.")
+        self.misses = Counter("reply_cache_misses_total", "Reply cache misses.")
+        self.evictions = Counter(
+            "reply_cache_evictions_total", "Reply cache entries evicted for size."
+        )
+        # key -> (value, expires_at)
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open_db(path)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses.inc()
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                self._remove(key)
+                self.misses.inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits.inc()
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, value, expires_at)
+            if self._db:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO replies VALUES (?, ?, ?)",
+                        (key, value, expires_at),
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logging.error("Error persisting cache entry: %s", e)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def summary(self) -> str:
+        with self._lock:
+            entries = len(self._entries)
+        return "reply_cache: entries=%d bytes=%d hits=%d misses=%d evictions=%d" % (
+            entries,
+            self.size,
+            self.hits.value,
+            self.misses.value,
+            self.evictions.value,
+        )
+
+    def _insert(self, key: str, value: str, expires_at: float) -> None:
+        self._entries[key] = (value, expires_at)
+        self.size += _entry_size(key, value)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions.inc()
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self.size -= _entry_size(key, value)
+        if self._db:
+            try:
+                self._db.execute("DELETE FROM replies WHERE key = ?", (key,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error("Error deleting cache entry: %s", e)
+
+    def _open_db(self, path: str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # Losing the last few writes of a cache on a crash is acceptable.
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS replies "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        now = time.time()
+        self._db.execute("DELETE FROM replies WHERE expires_at < ?", (now,))
+        self._db.commit()
+        # Load oldest first so the most recently written entries are kept.
+        rows = self._db.execute(
+            "SELECT key, value, expires_at FROM replies ORDER BY expires_at"
+        ).fetchall()
+        with self._lock:
+            for key, value, expires_at in rows:
+                self._insert(key, value, expires_at)
+        logging.info("Loaded %d cached replies from %s", len(self._entries), path)
@@ -3,18 +3,31 @@
 Client for capturing microphone audio, sending it to the server, and performing TTS on responses.
 It reads audio data from the microphone, sends audio chunks over a WebSocket,
 and uses pyttsx3 to vocalize the server’s answer or translation.
-Configuration (task and language) is provided in the connection URL.
+Configuration (task, language and streaming) is provided in the connection URL.
+In streaming mode, replies are spoken sentence by sentence as deltas arrive.
+With --server-tts, the server synthesizes the speech and this client only plays
+the WAV clips it receives.
+With --resume, a dropped connection is reopened and the server session resumed;
+audio recorded in the meantime is sent once the connection is back.
+Sending, receiving and speech run independently, so audio keeps flowing to
+the server while a reply is being spoken.
 """
 
 import argparse
 import asyncio
+import io
 import json
 import logging
 import queue
+import threading
+import wave
+from typing import Dict, Optional
 
+import numpy as np
 import pyttsx3
 import sounddevice as sd
 import websockets
+from textnorm import split_complete_sentences
 
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
@@ -23,76 +36,256 @@ logging.basicConfig(
 # Audio configuration.
 CHUNK_SIZE = 1024
 SAMPLE_RATE = 16000
+# Captured chunks waiting to be sent (about 3 seconds of audio). If the
+# connection stalls for longer, the oldest audio is dropped.
+MAX_PENDING_CHUNKS = 48
+# With --resume, up to about 10 seconds of audio are kept while reconnecting.
+RESUME_PENDING_CHUNKS = 160
+RECONNECT_SECONDS = 1.0
 
-# Queue to hold captured audio chunks.
-audio_queue: queue.Queue = queue.Queue()
 
-
-def audio_callback(indata, frames, time_info, status) -> None:
+class Speaker:
     """
-    Callback for sounddevice InputStream.
-    Converts the incoming audio data to bytes and puts it on a thread-safe queue.
+    Speaks queued text on one long-lived pyttsx3 engine in a worker thread,
+    and plays queued WAV clips (bytes) synthesized by the server.
+    interrupt() drops queued items and cuts off the one being played.
     """
-    if status:
-        logging.warning("Audio input status: %s", status)
-    audio_queue.put(indata.copy().tobytes())
 
+    def __init__(self) -> None:
+        self.queue: queue.Queue = queue.Queue()
+        self._interrupted = threading.Event()
+        self._engine = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def say(self, text: str) -> None:
+        self.queue.put(text)
+
+    def interrupt(self) -> None:
+        try:
+            while True:
+                self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._interrupted.set()
+        sd.stop()
+
+    def close(self) -> None:
+        self.interrupt()
+        self.queue.put(None)
+        self._thread.join(timeout=2)
+
+    def _on_word(self, name, location, length) -> None:
+        # The engine may only be stopped from its own callbacks.
+        if self._interrupted.is_set():
+            self._engine.stop()
 
-def tts_play(text: str) -> None:
+    def _run(self) -> None:
+        self._engine = pyttsx3.init()
+        self._engine.connect("started-word", self._on_word)
+        while True:
+            text = self.queue.get()
+            if text is None:
+                break
+            # Anything queued after an interrupt is a new reply.
+            self._interrupted.clear()
+            if isinstance(text, bytes):
+                self._play(text)
+                continue
+            self._engine.say(text)
+            self._engine.runAndWait()
+        self._engine.stop()
+
+    def _play(self, clip: bytes) -> None:
+        with wave.open(io.BytesIO(clip)) as wav:
+            rate = wav.getframerate()
+            channels = wav.getnchannels()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+        sd.play(samples.reshape(-1, channels), rate)
+        sd.wait()
+
+
+def make_audio_callback(loop: asyncio.AbstractEventLoop, chunks: asyncio.Queue):
     """
-    Play the provided text using pyttsx3 text-to-speech.
+    Build the sounddevice InputStream callback.
+    It runs on the audio thread and hands each chunk to the event loop, which
+    wakes the sender only when audio is available.
     """
-    engine = pyttsx3.init()
-    engine.say(text)
-    engine.runAndWait()
-    engine.stop()
 
+    def enqueue(chunk: bytes) -> None:
+        if chunks.full():
+            chunks.get_nowait()
+            logging.warning("Send queue full, dropping oldest audio chunk")
+        chunks.put_nowait(chunk)
+
+    def audio_callback(indata, frames, time_info, status) -> None:
+        if status:
+            logging.warning("Audio input status: %s", status)
+        loop.call_soon_threadsafe(enqueue, indata.copy().tobytes())
+
+    return audio_callback
+
+
+async def send_chunks(ws, chunks: asyncio.Queue) -> None:
+    while True:
+        chunk = await chunks.get()
+        await ws.send(chunk)
 
-async def send_audio(task: str, language: str) -> None:
+
+async def receive_replies(
+    ws,
+    speaker: Speaker,
+    interrupt_stale: bool,
+    server_tts: bool = False,
+    session: Optional[Dict[str, str]] = None,
+) -> None:
+    # Streamed text that has not been spoken yet, and whether the current
+    # reply arrived as deltas.
+    pending_text = ""
+    streamed = False
+    # The clip announced by the last audio header, filled by binary frames.
+    clip = bytearray()
+    clip_size = 0
+    async for reply in ws:
+        if isinstance(reply, bytes):
+            clip += reply
+            if clip_size and len(clip) >= clip_size:
+                speaker.say(bytes(clip))
+                clip, clip_size = bytearray(), 0
+            continue
+        data = json.loads(reply)
+        if "session" in data:
+            if session is not None:
+                if session.get("token") and not data["session"]["resumed"]:
+                    logging.warning("Session expired, started a new one")
+                session["token"] = data["session"]["token"]
+            continue
+        if "audio" in data:
+            clip, clip_size = bytearray(), data["audio"]["bytes"]
+            continue
+        if server_tts:
+            # The server speaks final replies; text is only logged.
+            if "answer" in data or "translation" in data:
+                logging.info("Received reply: %s", data)
+            continue
+        delta = data.get("answer_delta", data.get("translation_delta"))
+        if delta is not None:
+            if not streamed and interrupt_stale:
+                # A new answer makes the one still being spoken obsolete.
+                speaker.interrupt()
+            # Speak each sentence as soon as it is complete.
+            streamed = True
+            sentences, pending_text = split_complete_sentences(pending_text + delta)
+            for sentence in sentences:
+                speaker.say(sentence)
+            continue
+        if "answer" in data:
+            logging.info("Received answer: %s", data["answer"])
+            final_text = data["answer"]
+        elif "translation" in data:
+            logging.info("Received translation: %s", data["translation"])
+            final_text = data["translation"]
+        else:
+            continue
+        # After a streamed reply, only the unspoken tail remains.
+        if streamed:
+            final_text = pending_text
+        elif interrupt_stale:
+            speaker.interrupt()
+        pending_text, streamed = "", False
+        if final_text.strip():
+            speaker.say(final_text)
+
+
+async def send_audio(
+    task: str,
+    language: str,
+    stream: bool = False,
+    server_tts: bool = False,
+    resume: bool = False,
+) -> None:
     # Construct the WebSocket URI based on configuration.
     # For example, ws://localhost:8765/klugscheiser or ws://localhost:8765/translation/ru
     if task == "translation":
         uri = f"ws://localhost:8765/{task}/{language}"
     else:
         uri = f"ws://localhost:8765/{task}"
-    async with websockets.connect(uri) as ws:
-        logging.info("Connected to %s", uri)
-        # Start the microphone input stream.
-        stream = sd.InputStream(
-            callback=audio_callback,
-            channels=1,
-            samplerate=SAMPLE_RATE,
-            dtype="int16",
-            blocksize=CHUNK_SIZE,
-        )
-        stream.start()
-        logging.info("Microphone stream started")
-        try:
-            while True:
-                # Send available audio chunks.
-                try:
-                    chunk = audio_queue.get_nowait()
-                    await ws.send(chunk)
-                except queue.Empty:
-                    await asyncio.sleep(0.01)
-
-                # Non-blocking check for a server reply.
-                try:
-                    reply = await asyncio.wait_for(ws.recv(), timeout=0.01)
-                    data = json.loads(reply)
-                    if "answer" in data:
-                        logging.info("Received answer: %s", data["answer"])
-                        tts_play(data["answer"])
-                    elif "translation" in data:
-                        logging.info("Received translation: %s", data["translation"])
-                        tts_play(data["translation"])
-                except asyncio.TimeoutError:
-                    continue
-        except websockets.exceptions.ConnectionClosed:
-            logging.info("Server disconnected")
-        finally:
-            stream.stop()
+    if stream:
+        uri += "/stream"
+    if server_tts:
+        uri += "/tts"
+    if resume:
+        uri += "/resume"
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue(
+        maxsize=RESUME_PENDING_CHUNKS if resume else MAX_PENDING_CHUNKS
+    )
+    speaker = Speaker()
+    # The token of the server session, once the server has sent it.
+    session: Dict[str, str] = {}
+    mic = None
+    try:
+        while True:
+            try:
+                async with websockets.connect(uri) as ws:
+                    logging.info("Connected to %s", uri)
+                    # Tell the server what audio format follows.
+                    config = {
+                        "type": "config",
+                        "sample_rate": SAMPLE_RATE,
+                        "channels": 1,
+                    }
+                    if session:
+                        config["resume"] = session["token"]
+                    await ws.send(json.dumps(config))
+                    if mic is None:
+                        # Start the microphone input stream. It keeps recording
+                        # while a dropped connection is reopened.
+                        mic = sd.InputStream(
+                            callback=make_audio_callback(loop, chunks),
+                            channels=1,
+                            samplerate=SAMPLE_RATE,
+                            dtype="int16",
+                            blocksize=CHUNK_SIZE,
+                        )
+                        mic.start()
+                        logging.info("Microphone stream started")
+                    # Translations are spoken in order; only answers supersede
+                    # each other.
+                    tasks = [
+                        asyncio.create_task(send_chunks(ws, chunks)),
+                        asyncio.create_task(
+                            receive_replies(
+                                ws, speaker, task == "klugscheiser", server_tts, session
+                            )
+                        ),
+                    ]
+                    try:
+                        done, _ = await asyncio.wait(
+                            tasks, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for finished in done:
+                            finished.result()
+                        logging.info("Server disconnected")
+                    except websockets.exceptions.ConnectionClosed:
+                        logging.info("Server disconnected")
+                    finally:
+                        for pending in tasks:
+                            pending.cancel()
+            except (OSError, websockets.exceptions.InvalidHandshake) as e:
+                # While the server restarts, a proxy in front of it may answer
+                # the handshake with an error status such as 502.
+                if not resume:
+                    raise
+                logging.warning("Could not connect to %s: %s", uri, e)
+            if not resume:
+                break
+            await asyncio.sleep(RECONNECT_SECONDS)
+    finally:
+        if mic:
+            mic.stop()
             logging.info("Microphone stream stopped")
+        speaker.close()
 
 
 def main() -> None:
@@ -110,9 +303,26 @@ def main() -> None:
         default="ru",
         help="Language code for translation mode (ignored for klugscheiser mode).",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Receive replies as streamed deltas and start speaking at the first sentence.",
+    )
+    parser.add_argument(
+        "--server-tts",
+        action="store_true",
+        help="Play speech synthesized by the server instead of speaking locally.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reconnect after a dropped connection and resume the server session.",
+    )
     args = parser.parse_args()
 
-    asyncio.run(send_audio(args.task, args.language))
+    asyncio.run(
+        send_audio(args.task, args.language, args.stream, args.server_tts, args.resume)
+    )
     input("")
 
 
@@ -0,0 +1,84 @@
+"""
+Coalescing of final transcript fragments.
+With short endpointing, Deepgram finalizes a sentence in several small
+fragments, and translating each one separately costs a round trip and a full
+system prompt per fragment. The coalescer collects consecutive fragments and
+releases them together once the first one has waited `max_wait` seconds or
+their combined length reaches `max_chars`, so the added delay is bounded.
+"""
+
+import asyncio
+import time
+from typing import Callable, List, Optional
+
+from metrics import Histogram
+from tracing import UtteranceTrace
+
+FlushHandler = Callable[[List[str], List[Optional[UtteranceTrace]]], None]
+
+fragments_per_request = Histogram(
+    "translation_fragments_per_request",
+    "Final transcript fragments combined into one translation request.",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16),
+    unit=" fragments",
+)
+coalesce_wait = Histogram(
+    "translation_coalesce_wait_seconds",
+    "Time the first fragment of a translation request waited for more fragments.",
+)
+
+
+class Coalescer:
+    """
+    Buffers fragments and passes them to `on_flush` in batches.
+    Must be used from the event loop thread.
+    """
+
+    def __init__(
+        self, on_flush: FlushHandler, max_wait: float = 0.3, max_chars: int = 400
+    ) -> None:
+        self.on_flush = on_flush
+        self.max_wait = max_wait
+        self.max_chars = max_chars
+        self._texts: List[str] = []
+        self._traces: List[Optional[UtteranceTrace]] = []
+        self._chars = 0
+        self._first_at = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, text: str, trace: Optional[UtteranceTrace] = None) -> None:
+        if not self._texts:
+            self._first_at = time.perf_counter()
+        self._texts.append(text)
+        self._traces.append(trace)
+        self._chars += len(text)
+        if self._chars >= self.max_chars or self.max_wait <= 0:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_wait, self.flush
+            )
+
+    def flush(self) -> None:
+        """
+        Release the buffered fragments now.
+        """
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if not self._texts:
+            return
+        texts, traces = self._texts, self._traces
+        self._texts, self._traces, self._chars = [], [], 0
+        fragments_per_request.observe(len(texts))
+        coalesce_wait.observe(time.perf_counter() - self._first_at)
+        self.on_flush(texts, traces)
+
+    def close(self) -> None:
+        """
+        Drop buffered fragments without releasing them.
+        """
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._texts, self._traces, self._chars = [], [], 0
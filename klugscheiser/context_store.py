@@ -0,0 +1,110 @@
+"""
+Bounded conversation context.
+Keeps the most recent utterances within a token budget. Utterances that fall
+out of the budget can optionally be folded into a rolling summary, which is
+computed in the background so it never delays an answer.
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional, Tuple
+
+Summarizer = Callable[[str, str], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for English-like text (about four characters per token).
+    """
+    return (len(text) + 3) // 4
+
+
+class ContextStore:
+    """
+    Ring buffer of utterances with a token budget.
+    Appending and reading are thread-safe. Summarization requires a running
+    event loop in the thread that calls append().
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 1500,
+        summarizer: Optional[Summarizer] = None,
+        summarize_after_tokens: int = 500,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.summarizer = summarizer
+        self.summarize_after_tokens = summarize_after_tokens
+        self.summary = ""
+        self._utterances: Deque[Tuple[str, int]] = deque()
+        self._tokens = 0
+        self._evicted: List[str] = []
+        self._evicted_tokens = 0
+        self._summary_task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def append(self, utterance: str) -> None:
+        """
+        Add an utterance, evicting the oldest ones that exceed the budget.
+        """
+        utterance = utterance.strip()
+        if not utterance:
+            return
+        tokens = estimate_tokens(utterance)
+        with self._lock:
+            self._utterances.append((utterance, tokens))
+            self._tokens += tokens
+            while self._tokens > self.max_tokens and len(self._utterances) > 1:
+                old, old_tokens = self._utterances.popleft()
+                self._tokens -= old_tokens
+                if self.summarizer:
+                    self._evicted.append(old)
+                    self._evicted_tokens += old_tokens
+            should_summarize = (
+                self._evicted_tokens >= self.summarize_after_tokens
+                and self._summary_task is None
+            )
+        if should_summarize:
+            self._summary_task = asyncio.create_task(self._summarize())
+
+    def text(self) -> str:
+        """
+        The context as it should be put into a prompt.
+        """
+        with self._lock:
+            recent = " ".join(utterance for utterance, _ in self._utterances)
+            if self.summary:
+                return f"Summary of earlier conversation: {self.summary}\n{recent}"
+            return recent
+
+    def tokens(self) -> int:
+        """
+        Estimated number of tokens text() currently produces.
+        """
+        with self._lock:
+            return self._tokens + estimate_tokens(self.summary)
+
+    async def close(self) -> None:
+        """
+        Cancel a summarization that is still in flight.
+        """
+        if self._summary_task:
+            self._summary_task.cancel()
+            await asyncio.gather(self._summary_task, return_exceptions=True)
+
+    async def _summarize(self) -> None:
+        with self._lock:
+            evicted = " ".join(self._evicted)
+            self._evicted.clear()
+            self._evicted_tokens = 0
+            summary = self.summary
+        try:
+            new_summary = await self.summarizer(summary, evicted)
+            with self._lock:
+                self.summary = new_summary.strip()
+        except Exception as e:
+            logging.error("Error summarizing context: %s", e)
+        finally:
+            self._summary_task = None
@@ -0,0 +1,166 @@
+"""
+Pool of pre-opened Deepgram live connections.
+Opening a live connection costs a full WebSocket handshake before any audio
+can be transcribed. The pool keeps warm connections per (model, language,
+sample_rate), hands one out when a client connects, keeps idle ones alive with
+KeepAlive messages, and opens a replacement in the background after each use.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from deepgram import DeepgramClient, LiveOptions
+from metrics import Histogram
+
+PoolKey = Tuple[str, str, int]
+
+connect_latency = Histogram(
+    "deepgram_connect_seconds", "Time to open a Deepgram live connection."
+)
+
+
+def pool_key(options: LiveOptions) -> PoolKey:
+    return (options.model, options.language, options.sample_rate)
+
+
+class DeepgramPool:
+    """
+    Warm Deepgram connections keyed by (model, language, sample_rate).
+    Connections are single use: a session finishes its connection and the pool
+    opens a fresh one. Keys that are not requested for `idle_ttl` seconds are
+    closed. All methods must be called from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        client: DeepgramClient,
+        size: int = 1,
+        keepalive_interval: float = 5.0,
+        idle_ttl: float = 600.0,
+        addons: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.client = client
+        self.size = size
+        self.keepalive_interval = keepalive_interval
+        self.idle_ttl = idle_ttl
+        self.addons = addons
+        self._idle: Dict[PoolKey, List[Any]] = defaultdict(list)
+        self._options: Dict[PoolKey, LiveOptions] = {}
+        self._last_used: Dict[PoolKey, float] = {}
+        self._refilling: Dict[PoolKey, asyncio.Task] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start the background health-check loop.
+        """
+        self._task = asyncio.create_task(self._maintain())
+
+    def prewarm(self, options: LiveOptions) -> None:
+        """
+        Open warm connections for these options in the background.
+        """
+        key = pool_key(options)
+        self._options[key] = options
+        self._last_used[key] = time.monotonic()
+        self._refill(key)
+
+    async def acquire(self, options: LiveOptions) -> Optional[Any]:
+        """
+        Return a started connection, warm if one is available.
+        """
+        key = pool_key(options)
+        self._options[key] = options
+        self._last_used[key] = time.monotonic()
+        idle = self._idle[key]
+        connection = None
+        while idle:
+            candidate = idle.pop()
+            if candidate.is_connected():
+                connection = candidate
+                break
+            self._discard(candidate)
+        if connection is None:
+            logging.info("No warm Deepgram connection for %s, opening one", key)
+            connection = await self._open(options)
+        self._refill(key)
+        return connection
+
+    async def release(self, connection: Any) -> None:
+        """
+        Finish a connection returned by acquire(). Connections are not reused.
+        """
+        await asyncio.to_thread(connection.finish)
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+        for task in self._refilling.values():
+            task.cancel()
+        connections = [c for idle in self._idle.values() for c in idle]
+        self._idle.clear()
+        await asyncio.gather(
+            *(asyncio.to_thread(c.finish) for c in connections),
+            return_exceptions=True,
+        )
+
+    def idle_count(self) -> int:
+        return sum(len(idle) for idle in self._idle.values())
+
+    async def _open(self, options: LiveOptions) -> Optional[Any]:
+        connection = self.client.listen.websocket.v("1")
+        start = time.perf_counter()
+        ok = await asyncio.to_thread(connection.start, options, addons=self.addons)
+        if not ok:
+            logging.error(
+                "Failed to open Deepgram connection for %s", pool_key(options)
+            )
+            return None
+        connect_latency.observe(time.perf_counter() - start)
+        return connection
+
+    def _discard(self, connection: Any) -> None:
+        task = asyncio.create_task(asyncio.to_thread(connection.finish))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _refill(self, key: PoolKey) -> None:
+        if key in self._refilling:
+            return
+        self._refilling[key] = asyncio.create_task(self._fill(key))
+
+    async def _fill(self, key: PoolKey) -> None:
+        try:
+            while len(self._idle[key]) < self.size:
+                connection = await self._open(self._options[key])
+                if connection is None:
+                    break
+                self._idle[key].append(connection)
+        finally:
+            self._refilling.pop(key, None)
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            now = time.monotonic()
+            for key in list(self._idle):
+                if now - self._last_used.get(key, now) > self.idle_ttl:
+                    logging.info("Closing idle Deepgram connections for %s", key)
+                    for connection in self._idle.pop(key):
+                        self._discard(connection)
+                    continue
+                # Connections may be acquired while a keepalive is in flight,
+                # so only remove the unhealthy ones from the live list.
+                for connection in list(self._idle[key]):
+                    healthy = connection.is_connected() and await asyncio.to_thread(
+                        connection.keep_alive
+                    )
+                    if not healthy and connection in self._idle[key]:
+                        self._idle[key].remove(connection)
+                        self._discard(connection)
+                if len(self._idle[key]) < self.size:
+                    self._refill(key)
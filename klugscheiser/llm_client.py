@@ -0,0 +1,310 @@
+"""
+Shared OpenAI client for all sessions.
+Wraps AsyncOpenAI with:
+  - one tuned HTTP connection pool, optionally HTTP/2 (needs the h2 package);
+  - a global limit on concurrent requests, shared out between sessions by
+    the fair scheduler (see scheduler.py);
+  - a deadline per call that covers queueing, retries and the whole stream;
+  - retries of transient errors with exponential backoff and full jitter;
+  - optional hedging: when the response (the first chunk, for streams) has
+    not arrived after the recent p95 latency, a duplicate request is sent
+    and whichever answers first is used; the other one is cancelled.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+import httpx
+import openai
+from context_store import estimate_tokens
+from metrics import Counter, Gauge, Histogram
+from openai import AsyncOpenAI
+from scheduler import FairScheduler
+
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+# Hedging starts once this many latencies have been observed.
+HEDGE_MIN_SAMPLES = 20
+
+retries = Counter("llm_retries_total", "LLM requests retried after an error.")
+hedged_requests = Counter(
+    "llm_hedged_requests_total", "Duplicate LLM requests sent by hedging."
+)
+hedge_wins = Counter(
+    "llm_hedge_wins_total", "Hedged duplicates that answered before the original."
+)
+deadline_exceeded = Counter(
+    "llm_deadline_exceeded_total", "LLM calls abandoned at their deadline."
+)
+limiter_wait = Histogram(
+    "llm_limiter_wait_seconds", "Time LLM requests waited for a concurrency slot."
+)
+
+
+def estimate_request_tokens(kwargs: Dict[str, Any]) -> int:
+    """
+    Rough prompt plus completion tokens of a chat completion request.
+    """
+    prompt = sum(
+        estimate_tokens(str(m.get("content") or "")) for m in kwargs["messages"]
+    )
+    return prompt + (kwargs.get("max_tokens") or 0)
+
+
+# Stands for "no chunk" in a stream that ended before its first chunk.
+_EMPTY = object()
+
+
+class DeadlineExceeded(Exception):
+    """
+    An LLM call did not complete before its deadline.
+    """
+
+
+class ChatStream:
+    """
+    Streamed completion returned by LLMClient.create(stream=True).
+    Reading it is bounded by the call's deadline. It holds a concurrency slot
+    until it is exhausted or closed.
+    """
+
+    def __init__(
+        self, stream, first: Any, deadline: float, release: Callable[[], None]
+    ) -> None:
+        self._stream = stream
+        self._first = first
+        self._deadline = deadline
+        self._release = release
+        self._closed = False
+
+    def __aiter__(self) -> "ChatStream":
+        return self
+
+    async def __anext__(self):
+        if self._first is not None:
+            chunk, self._first = self._first, None
+            if chunk is not _EMPTY:
+                return chunk
+            await self.close()
+            raise StopAsyncIteration
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            return await asyncio.wait_for(
+                self._stream.__anext__(), max(0.0, self._deadline - time.monotonic())
+            )
+        except StopAsyncIteration:
+            await self.close()
+            raise
+        except asyncio.TimeoutError:
+            deadline_exceeded.inc()
+            await self.close()
+            raise DeadlineExceeded("stream did not finish before its deadline")
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._release()
+        await self._stream.close()
+
+
+class LLMClient:
+    """
+    Chat completions with a connection pool, concurrency limit, deadlines,
+    retries and hedging. Create one per process and share it.
+    `session_tokens_per_second` limits the estimated tokens each session may
+    send; None for no limit.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        max_connections: int = 64,
+        timeout: float = 20.0,
+        max_retries: int = 2,
+        backoff: float = 0.25,
+        hedge: bool = False,
+        hedge_min_delay: float = 0.25,
+        http2: bool = False,
+        api_key: Optional[str] = None,
+        session_tokens_per_second: Optional[float] = None,
+    ) -> None:
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError as e:
+                logging.error("HTTP/2 is not available, using HTTP/1.1: %s", e)
+                http2 = False
+        http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+        )
+        # Retries and timeouts are handled here, around the whole call.
+        self.openai = AsyncOpenAI(
+            api_key=api_key, http_client=http_client, max_retries=0, timeout=timeout
+        )
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.scheduler = FairScheduler(max_concurrency, session_tokens_per_second)
+        # Seconds to the response or first chunk of recent requests.
+        self._latencies: Deque[float] = deque(maxlen=256)
+        Gauge(
+            "llm_inflight_requests",
+            "LLM requests holding a concurrency slot.",
+            lambda: self.scheduler.inflight,
+        )
+        Gauge(
+            "llm_queued_requests",
+            "LLM requests waiting for the scheduler.",
+            lambda: self.scheduler.queued(),
+        )
+
+    @property
+    def inflight(self) -> int:
+        return self.scheduler.inflight
+
+    async def create(
+        self,
+        deadline: Optional[float] = None,
+        priority: Optional[int] = None,
+        **kwargs: Any,
+    ):
+        """
+        Like chat.completions.create(). `deadline` is a time.monotonic() value;
+        by default a call may take `timeout` seconds. `priority` overrides the
+        scheduling priority of the current session. With stream=True a
+        ChatStream is returned once the first chunk has arrived.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(kwargs, deadline, priority)
+            except asyncio.TimeoutError:
+                deadline_exceeded.inc()
+                raise DeadlineExceeded("no response before the deadline") from None
+            except RETRYABLE_ERRORS as e:
+                delay = random.uniform(0, self.backoff * 2**attempt)
+                if attempt >= self.max_retries or time.monotonic() + delay > deadline:
+                    raise
+                attempt += 1
+                retries.inc()
+                logging.warning(
+                    "LLM request failed (%s), retry %d in %.2f s", e, attempt, delay
+                )
+                await asyncio.sleep(delay)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        How long to wait before hedging: the p95 of recent latencies.
+        """
+        if not self.hedge or len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        return max(self.hedge_min_delay, p95)
+
+    async def _attempt(
+        self, kwargs: Dict[str, Any], deadline: float, priority: Optional[int]
+    ):
+        primary = asyncio.ensure_future(self._request(kwargs, deadline, priority))
+        delay = self.hedge_delay()
+        if delay is None:
+            return await primary
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        # Without a free slot, a duplicate would only queue behind others.
+        if done or self.scheduler.saturated():
+            return await primary
+        hedged_requests.inc()
+        backup = asyncio.ensure_future(self._request(kwargs, deadline, priority))
+        tasks = {primary, backup}
+        winner = None
+        try:
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if winner is None and task.exception() is None:
+                        winner = task
+                if winner:
+                    if winner is backup:
+                        hedge_wins.inc()
+                    return winner.result()
+            # Both failed; report the original's error.
+            return primary.result()
+        finally:
+            for task in (primary, backup):
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    result = task.result()
+                    if isinstance(result, ChatStream):
+                        await result.close()
+
+    async def _request(
+        self, kwargs: Dict[str, Any], deadline: float, priority: Optional[int]
+    ):
+        def remaining() -> float:
+            return max(0.0, deadline - time.monotonic())
+
+        queued_at = time.monotonic()
+        await self.scheduler.acquire(
+            estimate_request_tokens(kwargs), deadline, priority
+        )
+        limiter_wait.observe(time.monotonic() - queued_at)
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.scheduler.release()
+
+        start = time.monotonic()
+        stream = None
+        try:
+            if not kwargs.get("stream"):
+                response = await asyncio.wait_for(
+                    self.openai.chat.completions.create(**kwargs), remaining()
+                )
+                self._latencies.append(time.monotonic() - start)
+                release()
+                return response
+            stream = await asyncio.wait_for(
+                self.openai.chat.completions.create(**kwargs), remaining()
+            )
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), remaining())
+            except StopAsyncIteration:
+                first = _EMPTY
+            self._latencies.append(time.monotonic() - start)
+            return ChatStream(stream, first, deadline, release)
+        except BaseException:
+            release()
+            if stream is not None:
+                await stream.close()
+            raise
@@ -0,0 +1,231 @@
+"""
+Thread-based utterance pipeline for run.py's local mode.
+Like pipeline.UtterancePipeline, but for blocking jobs: a fixed number of
+worker threads take jobs from a bounded queue, and their results are handed
+on in submission order. When the queue is full, the oldest pending job is
+dropped. Between the pipeline and the single text-to-speech thread sits a
+SpeechQueue: when speech falls behind, replies that waited too long are
+dropped and the remaining ones are spoken together.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+
+from metrics import Counter, Gauge, Histogram
+
+Job = Callable[[], Optional[str]]
+
+utterance_latency = Histogram(
+    "local_utterance_latency_seconds",
+    "Time from a final transcript to its reply being handed to speech.",
+)
+dropped_utterances = Counter(
+    "local_dropped_utterances_total",
+    "Final transcripts dropped because the LLM queue was full.",
+)
+speech_wait = Histogram(
+    "tts_queue_wait_seconds", "Time replies waited for text-to-speech."
+)
+stale_replies = Counter(
+    "tts_stale_replies_total", "Replies dropped because speech fell behind."
+)
+merged_replies = Counter(
+    "tts_merged_replies_total", "Replies spoken together with an earlier one."
+)
+
+
+class _Item:
+    __slots__ = ("job", "submitted_at", "done", "dropped", "result")
+
+    def __init__(self, job: Job) -> None:
+        self.job = job
+        self.submitted_at = time.perf_counter()
+        self.done = False
+        self.dropped = False
+        self.result: Optional[str] = None
+
+
+class LocalPipeline:
+    """
+    Bounded, ordered pool of worker threads.
+    `submit` never blocks, so it can be called from the Deepgram receive
+    thread. `on_result` is called with every non-empty result, in submission
+    order, on one of the worker threads.
+    """
+
+    def __init__(
+        self,
+        on_result: Callable[[str], None],
+        workers: int = 4,
+        max_pending: int = 8,
+        name: str = "pipeline",
+    ) -> None:
+        self.on_result = on_result
+        self.workers = workers
+        self.max_pending = max_pending
+        self.name = name
+        self.dropped = 0
+        self.peak_depth = 0
+        self._pending: Deque[_Item] = deque()
+        # Submitted jobs whose results have not been handed on yet.
+        self._order: Deque[_Item] = deque()
+        self._cond = threading.Condition()
+        self._deliver_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        Gauge(
+            "local_pending_utterances",
+            "Final transcripts waiting for an LLM worker.",
+            self.depth,
+        )
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"{self.name}-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job: Job) -> None:
+        """
+        Queue a job. If the queue is full, the oldest pending job is dropped.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._pending) >= self.max_pending:
+                dropped = self._pending.popleft()
+                dropped.done = dropped.dropped = True
+                self.dropped += 1
+                dropped_utterances.inc()
+                logging.warning(
+                    "%s: queue full, dropped oldest job (%d dropped so far)",
+                    self.name,
+                    self.dropped,
+                )
+            item = _Item(job)
+            self._pending.append(item)
+            self._order.append(item)
+            self.peak_depth = max(self.peak_depth, len(self._pending))
+            self._cond.notify()
+        self._deliver()
+
+    def depth(self) -> int:
+        """
+        Number of jobs waiting for a worker.
+        """
+        return len(self._pending)
+
+    def close(self, timeout: float = 1.0) -> None:
+        """
+        Drop pending jobs and stop the workers. Jobs that are already running
+        are not interrupted; their results are discarded.
+        """
+        with self._cond:
+            self._closed = True
+            self._pending.clear()
+            self._order.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                item = self._pending.popleft()
+            try:
+                result = item.job()
+            except Exception as e:
+                logging.error("%s: job failed: %s", self.name, e)
+                result = None
+            with self._cond:
+                item.result = result
+                item.done = True
+            self._deliver()
+
+    def _deliver(self) -> None:
+        # One thread at a time hands on finished results, oldest first; a
+        # result waits here until every earlier job has finished.
+        with self._deliver_lock:
+            while True:
+                with self._cond:
+                    if not self._order or not self._order[0].done:
+                        return
+                    item = self._order.popleft()
+                if item.dropped:
+                    continue
+                utterance_latency.observe(time.perf_counter() - item.submitted_at)
+                if item.result:
+                    try:
+                        self.on_result(item.result)
+                    except Exception as e:
+                        logging.error("%s: result handler failed: %s", self.name, e)
+
+
+class SpeechQueue:
+    """
+    Replies waiting for text-to-speech. get() returns everything that has
+    queued up as one text, without the replies older than `max_age` seconds;
+    at most `max_pending` replies are kept.
+    """
+
+    def __init__(self, max_age: float = 8.0, max_pending: int = 4) -> None:
+        self.max_age = max_age
+        self.max_pending = max_pending
+        self.peak_depth = 0
+        self._items: Deque[Tuple[float, str]] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        Gauge("tts_pending_replies", "Replies waiting for text-to-speech.", self.depth)
+
+    def depth(self) -> int:
+        return len(self._items)
+
+    def put(self, text: str) -> None:
+        with self._cond:
+            self._items.append((time.perf_counter(), text))
+            if len(self._items) > self.max_pending:
+                self._items.popleft()
+                stale_replies.inc()
+            self.peak_depth = max(self.peak_depth, len(self._items))
+            self._cond.notify()
+
+    def get(self) -> Optional[str]:
+        """
+        Block until there is something to say. Returns None once closed.
+        """
+        with self._cond:
+            while True:
+                while not self._items and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return None
+                now = time.perf_counter()
+                texts = []
+                for queued_at, text in self._items:
+                    if now - queued_at > self.max_age:
+                        stale_replies.inc()
+                        continue
+                    speech_wait.observe(now - queued_at)
+                    texts.append(text)
+                self._items.clear()
+                if texts:
+                    break
+        if len(texts) > 1:
+            merged_replies.inc(len(texts) - 1)
+            logging.info("Speech is behind, merging %d replies", len(texts))
+        return " ".join(texts)
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,280 @@
+"""
+Lightweight in-process metrics used by the server.
+Metrics register themselves by name and can be rendered in the Prometheus
+text format. With several worker processes, each worker periodically writes a
+JSON snapshot of its registry to a shared directory, and the snapshots are
+merged for reporting.
+"""
+
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+# Default latency buckets (seconds), from 1 ms to 10 s.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Every metric created with register=True, by name. A metric created later
+# under the same name replaces the earlier one.
+REGISTRY: Dict[str, Union["Histogram", "Counter", "Gauge"]] = {}
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Thread-safe, so it can be observed from
+    SDK callback threads as well as from the event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        unit: str = "s",
+        register: bool = True,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.unit = unit
+        self.buckets: List[float] = sorted(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY[name] = self
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile as the upper bound of the bucket containing it.
+        Returns None if nothing was observed; values above the last bucket
+        are reported as infinity.
+        """
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = q * self.count
+            seen = 0
+            for bound, bucket_count in zip(self.buckets, self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return bound
+        return float("inf")
+
+    def summary(self) -> str:
+        if self.count == 0:
+            return f"{self.name}: no observations"
+        u = self.unit
+        return f"%s: count=%d mean=%.4g{u} p50<=%.4g{u} p95<=%.4g{u} p99<=%.4g{u}" % (
+            self.name,
+            self.count,
+            self.sum / self.count,
+            self.quantile(0.5),
+            self.quantile(0.95),
+            self.quantile(0.99),
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "type": "histogram",
+                "help": self.help,
+                "unit": self.unit,
+                "buckets": self.buckets,
+                "counts": list(self.counts),
+                "sum": self.sum,
+            }
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Add the observations of a snapshot with the same buckets.
+        """
+        with self._lock:
+            for index, bucket_count in enumerate(snapshot["counts"]):
+                self.counts[index] += bucket_count
+            self.count += sum(snapshot["counts"])
+            self.sum += snapshot["sum"]
+
+
+class Counter:
+    """
+    Monotonic counter. Thread-safe.
+    """
+
+    def __init__(self, name: str, help: str, register: bool = True) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY[name] = self
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def summary(self) -> str:
+        return f"{self.name}: {self.value}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "counter", "help": self.help, "value": self.value}
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        self.inc(snapshot["value"])
+
+
+class Gauge:
+    """
+    Value that can go up and down. If `fn` is given, the value is read from
+    it whenever the gauge is reported. Merging gauges adds them up.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Optional[Callable[[], float]] = None,
+        register: bool = True,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._value = 0.0
+        self._lock = threading.Lock()
+        if register:
+            REGISTRY[name] = self
+
+    @property
+    def value(self) -> float:
+        if self.fn:
+            return self.fn()
+        return self._value
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def summary(self) -> str:
+        return f"{self.name}: {self.value:g}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "gauge", "help": self.help, "value": self.value}
+
+    def merge(self, snapshot: Dict[str, Any]) -> None:
+        self.inc(snapshot["value"])
+
+
+Metric = Union[Histogram, Counter, Gauge]
+
+
+def snapshot_all() -> Dict[str, Dict[str, Any]]:
+    return {name: metric.snapshot() for name, metric in list(REGISTRY.items())}
+
+
+def merge_snapshots(merged: Dict[str, Metric], data: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Add snapshots to `merged`, creating unregistered metrics as needed.
+    """
+    for name, snapshot in data.items():
+        if name not in merged:
+            if snapshot["type"] == "histogram":
+                merged[name] = Histogram(
+                    name,
+                    snapshot["help"],
+                    buckets=snapshot["buckets"],
+                    unit=snapshot["unit"],
+                    register=False,
+                )
+            elif snapshot["type"] == "gauge":
+                merged[name] = Gauge(name, snapshot["help"], register=False)
+            else:
+                merged[name] = Counter(name, snapshot["help"], register=False)
+        merged[name].merge(snapshot)
+
+
+def write_snapshot(path: str) -> None:
+    """
+    Write the snapshot of every registered metric to a JSON file.
+    The file is replaced atomically, so readers never see a partial snapshot.
+    """
+    data = snapshot_all()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_snapshots(directory: str, exclude: Optional[str] = None) -> Dict[str, Metric]:
+    """
+    Merge all snapshot files in a directory, except `exclude`, into
+    unregistered metrics.
+    """
+    merged: Dict[str, Metric] = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        if exclude and os.path.abspath(path) == os.path.abspath(exclude):
+            continue
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning("Skipping metrics snapshot %s: %s", path, e)
+            continue
+        merge_snapshots(merged, data)
+    return merged
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(metrics: Iterable[Metric]) -> str:
+    """
+    Render metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in sorted(metrics, key=lambda m: m.name):
+        data = metric.snapshot()
+        name = metric.name
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        if data["type"] != "histogram":
+            lines.append(f"{name} {_number(data['value'])}")
+            continue
+        cumulative = 0
+        bounds = list(data["buckets"]) + [float("inf")]
+        for bound, bucket_count in zip(bounds, data["counts"]):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{le="{_number(bound)}"}} {cumulative}')
+        lines.append(f"{name}_sum {_number(data['sum'])}")
+        lines.append(f"{name}_count {cumulative}")
+    return "\n".join(lines) + "\n"
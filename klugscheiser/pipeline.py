@@ -0,0 +1,176 @@
+"""
+Per-session asynchronous processing pipeline.
+Jobs (usually LLM calls for a final transcript) are queued in a bounded queue,
+executed by a fixed pool of worker tasks, and their results are delivered in
+submission order. When the queue is full, the oldest pending job is dropped.
+Workers run at most `max_undelivered` jobs ahead of delivery, so a client that
+reads slowly holds up new LLM calls instead of piling up finished results.
+Jobs may also emit incremental deltas, which are forwarded in order as soon as
+every earlier job has been delivered. A job's utterance trace, if any, is the
+current trace while the job runs and while its output is delivered.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional
+
+from tracing import UtteranceTrace, current_trace
+
+DeltaSink = Callable[[str], None]
+Job = Callable[[Optional[DeltaSink]], Awaitable[Optional[str]]]
+ResultHandler = Callable[[str], Awaitable[None]]
+
+# Marks the end of a job's delta stream.
+_DONE = object()
+
+
+class _Item:
+    __slots__ = ("job", "chunks", "result", "trace", "started")
+
+    def __init__(self, job: Job, trace: Optional[UtteranceTrace]) -> None:
+        self.job = job
+        self.trace = trace
+        self.chunks: asyncio.Queue = asyncio.Queue()
+        self.result: Optional[str] = None
+        self.started = False
+
+
+class UtterancePipeline:
+    """
+    Bounded, ordered worker pool for a single client session.
+    All methods must be called from the event loop thread.
+    Jobs are called with a delta sink when `on_delta` is set, otherwise with None.
+    """
+
+    def __init__(
+        self,
+        on_result: ResultHandler,
+        workers: int = 4,
+        max_pending: int = 8,
+        name: str = "pipeline",
+        on_delta: Optional[ResultHandler] = None,
+        max_undelivered: Optional[int] = None,
+    ) -> None:
+        self.on_result = on_result
+        self.on_delta = on_delta
+        self.workers = workers
+        self.name = name
+        self.dropped = 0
+        self._pending: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        # Pending and started jobs, in submission order, until delivered.
+        self._order: Deque[_Item] = deque()
+        self._ordered = asyncio.Event()
+        # Started jobs whose output has not been delivered yet.
+        self._slots = asyncio.Semaphore(max_undelivered or 2 * workers)
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """
+        Spawn the worker tasks and the in-order result emitter.
+        """
+        for i in range(self.workers):
+            self._tasks.append(
+                asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            )
+        self._tasks.append(
+            asyncio.create_task(self._emitter(), name=f"{self.name}-emitter")
+        )
+
+    def submit(self, job: Job, trace: Optional[UtteranceTrace] = None) -> None:
+        """
+        Queue a job. If the queue is full, the oldest pending job is dropped.
+        """
+        if self._pending.full():
+            dropped: _Item = self._pending.get_nowait()
+            if dropped is self._order[0]:
+                # The emitter may be waiting for it; it delivers nothing.
+                dropped.chunks.put_nowait(_DONE)
+            else:
+                self._order.remove(dropped)
+                if dropped.trace:
+                    dropped.trace.finish()
+            self.dropped += 1
+            logging.warning(
+                "%s: queue full, dropped oldest job (%d dropped so far)",
+                self.name,
+                self.dropped,
+            )
+        item = _Item(job, trace)
+        self._pending.put_nowait(item)
+        self._order.append(item)
+        self._ordered.set()
+
+    def depth(self) -> int:
+        """
+        Number of jobs waiting for a worker.
+        """
+        return self._pending.qsize()
+
+    def undelivered(self) -> int:
+        """
+        Number of jobs, pending or started, whose output has not been delivered.
+        """
+        return len(self._order)
+
+    async def close(self) -> None:
+        """
+        Cancel all workers and pending jobs.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        while not self._pending.empty():
+            self._pending.get_nowait()
+        self._order.clear()
+
+    async def _worker(self) -> None:
+        while True:
+            # Released by the emitter once the job's output is delivered.
+            await self._slots.acquire()
+            try:
+                item: _Item = await self._pending.get()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            item.started = True
+            sink = item.chunks.put_nowait if self.on_delta else None
+            token = current_trace.set(item.trace)
+            try:
+                item.result = await item.job(sink)
+            except asyncio.CancelledError:
+                item.chunks.put_nowait(_DONE)
+                raise
+            except Exception as e:
+                logging.error("%s: job failed: %s", self.name, e)
+            finally:
+                current_trace.reset(token)
+            item.chunks.put_nowait(_DONE)
+
+    async def _emitter(self) -> None:
+        while True:
+            while not self._order:
+                self._ordered.clear()
+                await self._ordered.wait()
+            # The item stays first in the order until delivered.
+            item = self._order[0]
+            token = current_trace.set(item.trace)
+            try:
+                while True:
+                    chunk = await item.chunks.get()
+                    if chunk is _DONE:
+                        break
+                    await self.on_delta(chunk)
+                if item.result:
+                    await self.on_result(item.result)
+                elif item.trace:
+                    # Nothing will be sent for this utterance.
+                    item.trace.finish()
+            except Exception as e:
+                logging.error("%s: result handler failed: %s", self.name, e)
+            finally:
+                current_trace.reset(token)
+            self._order.popleft()
+            if item.started:
+                self._slots.release()
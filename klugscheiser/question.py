@@ -0,0 +1,254 @@
+"""
+Local question detection.
+A final transcript is only sent to the answering model when it looks like a
+question, so a detector that misses fewer unpunctuated questions and rejects
+quoted or reported ones saves GPT-4o calls as well as answering more of what
+was asked. The default detector is a small logistic model over interrogative
+and syntactic features of the last sentence; it runs in microseconds. Texts
+it is unsure about can be passed to a cheap LLM (see FALLBACK_PROMPT).
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+WH_WORDS = frozenset(
+    "what who whom whose where when why how which what's whats who's where's "
+    "when's why's how's".split()
+)
+AUX_WORDS = frozenset(
+    "is are was were am do does did can could would should will shall may might "
+    "must has have had".split()
+)
+NEGATIVE_AUX_WORDS = frozenset(
+    "isn't aren't wasn't weren't don't doesn't didn't can't couldn't wouldn't "
+    "shouldn't won't hasn't haven't".split()
+)
+# Words that start a subordinate clause or an exclamation after a wh-word:
+# "when I was a kid", "how we got here", "what a day".
+CLAUSE_SUBJECTS = frozenset(
+    "i we you he she they a an i'm you're he's she's they're i'll we'll "
+    "you'll".split()
+)
+# Verbs after which a wh-word introduces a reported question.
+REPORTING_WORDS = frozenset(
+    "asked asks asking wondered wonders know remember said says told decide "
+    "sure".split()
+)
+# Indirect requests for information that are meant to be answered.
+REQUEST_PREFIXES = (
+    "tell me",
+    "remind me",
+    "explain how",
+    "explain what",
+    "explain why",
+    "name the",
+    "give me the",
+    "i wonder",
+    "i'd like to know",
+    "i would like to know",
+    "i want to know",
+    "i'm curious",
+    "any idea",
+    "quick question",
+    "out of curiosity",
+    "what about",
+)
+# Words dropped from the start of a sentence before looking at its first word.
+FILLERS = frozenset(
+    "so and okay ok oh um uh hmm well right hey but also then now".split()
+)
+TAG = re.compile(
+    r"(?:\b(?:" + "|".join(sorted(NEGATIVE_AUX_WORDS)) + r") "
+    r"(?:it|he|she|they|you|we|i|there|that)|, (?:right|correct|yeah))\W*$"
+)
+QUOTED = re.compile(r"[\"“”][^\"“”]*[\"“”]")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+FEATURES = (
+    "ends_qmark",
+    "has_qmark",
+    "quoted_qmark",
+    "ends_period",
+    "wh_first",
+    "wh_subordinate",
+    "aux_first",
+    "aux_be_have",
+    "negative_aux_first",
+    "wh_later",
+    "reported",
+    "request",
+    "tag",
+    "short",
+)
+
+# Fitted on benchmarks/data/questions_train.tsv with
+# `python benchmarks/bench_question.py --fit`.
+DEFAULT_WEIGHTS: Dict[str, float] = {
+    "ends_qmark": 1.79,
+    "has_qmark": 1.79,
+    "quoted_qmark": -1.38,
+    "ends_period": -3.83,
+    "wh_first": 2.66,
+    "wh_subordinate": -3.51,
+    "aux_first": 2.27,
+    "aux_be_have": -0.83,
+    "negative_aux_first": -0.04,
+    "wh_later": 0.42,
+    "reported": -0.55,
+    "request": 6.09,
+    "tag": 0.46,
+    "short": -0.59,
+    "bias": -0.65,
+}
+
+
+def _words(sentence: str) -> List[str]:
+    return re.findall(r"[\w']+", sentence.lower().replace("’", "'"))
+
+
+def features(text: str) -> np.ndarray:
+    """
+    Feature vector of a transcript, in the order of FEATURES.
+    Only the last sentence is inspected, since that is where a question would
+    follow the context leading up to it. Quoted speech is removed first.
+    """
+    quoted_qmark = any("?" in q for q in QUOTED.findall(text))
+    unquoted = QUOTED.sub(" ", text).strip()
+    sentences = [s for s in SENTENCE_END.split(unquoted) if _words(s)]
+    last = sentences[-1] if sentences else unquoted
+    words = _words(last)
+    while len(words) > 1 and words[0] in FILLERS:
+        words.pop(0)
+    lowered = " ".join(words)
+    first = words[0] if words else ""
+    second = words[1] if len(words) > 1 else ""
+    wh_first = first in WH_WORDS
+    request = lowered.startswith(REQUEST_PREFIXES)
+    wh_positions = [i for i, w in enumerate(words) if i and w in WH_WORDS]
+    reported = not request and any(
+        w in REPORTING_WORDS for i in wh_positions for w in words[max(0, i - 3) : i]
+    )
+    values = (
+        unquoted.endswith("?"),
+        "?" in unquoted,
+        quoted_qmark,
+        unquoted.endswith((".", "!")),
+        wh_first,
+        wh_first and second in CLAUSE_SUBJECTS,
+        first in AUX_WORDS,
+        first in AUX_WORDS and second in ("be", "been", "have", "not"),
+        first in NEGATIVE_AUX_WORDS,
+        bool(wh_positions) and not wh_first,
+        reported,
+        request,
+        bool(TAG.search(last.lower())),
+        len(words) <= 3,
+    )
+    return np.array(values, dtype=np.float64)
+
+
+def fit(
+    texts: Sequence[str],
+    labels: Sequence[int],
+    epochs: int = 5000,
+    learning_rate: float = 1.0,
+    l2: float = 0.001,
+) -> Dict[str, float]:
+    """
+    Fit logistic regression weights by gradient descent.
+    """
+    x = np.array([features(t) for t in texts])
+    x = np.hstack((x, np.ones((len(x), 1))))
+    y = np.asarray(labels, dtype=np.float64)
+    weights = np.zeros(x.shape[1])
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-x @ weights))
+        gradient = x.T @ (p - y) / len(y)
+        gradient[:-1] += l2 * weights[:-1]
+        weights -= learning_rate * gradient
+    return dict(zip(FEATURES + ("bias",), weights.round(2).tolist()))
+
+
+class QuestionDetector:
+    """
+    Logistic model over the features above.
+    Probabilities inside `ambiguous` are considered uncertain and may be
+    resolved by a fallback model.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        threshold: float = 0.5,
+        ambiguous: Tuple[float, float] = (0.25, 0.75),
+    ) -> None:
+        weights = DEFAULT_WEIGHTS if weights is None else weights
+        self.weights = np.array([weights[name] for name in FEATURES])
+        self.bias = weights["bias"]
+        self.threshold = threshold
+        self.ambiguous = ambiguous
+
+    def probability(self, text: str) -> float:
+        z = float(features(text) @ self.weights) + self.bias
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def is_ambiguous(self, text: str) -> bool:
+        low, high = self.ambiguous
+        return low < self.probability(text) < high
+
+    def __call__(self, text: str) -> bool:
+        return self.probability(text) >= self.threshold
+
+
+class PunctuationDetector:
+    """
+    The original rule: a question mark after the first ten characters.
+    """
+
+    def probability(self, text: str) -> float:
+        return 1.0 if "?" in text[10:] else 0.0
+
+    def is_ambiguous(self, text: str) -> bool:
+        return False
+
+    def __call__(self, text: str) -> bool:
+        return self.probability(text) >= 0.5
+
+
+DETECTORS = {"model": QuestionDetector, "punctuation": PunctuationDetector}
+
+# Prompt for the optional fallback model, which answers with a single word.
+FALLBACK_PROMPT = (
+    "You decide whether the last sentence of a conversation transcript is a "
+    "question the speaker wants answered. Quoted or reported questions, titles "
+    "and rhetorical remarks do not count. The transcript may lack punctuation. "
+    "Answer 'yes' or 'no' only."
+)
+
+
+def fallback_messages(text: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": FALLBACK_PROMPT},
+        {"role": "user", "content": text},
+    ]
+
+
+def parse_fallback(reply: Optional[str]) -> bool:
+    return bool(reply) and reply.strip().lower().startswith("yes")
+
+
+def load_dataset(path: str) -> Tuple[List[str], List[int]]:
+    """
+    Read a `label<TAB>text` file; lines starting with # are comments.
+    """
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            label, text = line.rstrip("\n").split("\t", 1)
+            labels.append(int(label))
+            texts.append(text)
+    return texts, labels
@@ -0,0 +1,110 @@
+"""
+Session recording for offline replay.
+A recording is three append-only files sharing a base name:
+  - <base>.pcm: the client's audio frames, concatenated as received;
+  - <base>.idx: one fixed-size record per frame (time, offset, length), so the
+    frames can be sliced out of a memory-mapped .pcm file;
+  - <base>.jsonl: timestamped events: the session path, format handshakes,
+    Deepgram transcripts and the replies sent to the client.
+Times are seconds since the session started. benchmarks/replay.py plays a
+recording back against a server.
+"""
+
+import itertools
+import json
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+INDEX_DTYPE = np.dtype([("time", "<f8"), ("offset", "<u8"), ("length", "<u4")])
+_INDEX_RECORD = struct.Struct("<dQI")
+_sequence = itertools.count(1)
+
+
+class SessionRecorder:
+    """
+    Writes one session. Thread-safe, since transcripts arrive on the Deepgram
+    receive thread while audio and replies are written on the event loop.
+    """
+
+    def __init__(self, base: str, path: str) -> None:
+        self.base = base
+        self._start = time.perf_counter()
+        self._offset = 0
+        self._lock = threading.Lock()
+        self._pcm = open(base + ".pcm", "ab")
+        self._index = open(base + ".idx", "ab")
+        self._events = open(base + ".jsonl", "a", encoding="utf-8")
+        self.event("session", path=path, started=time.time())
+
+    @classmethod
+    def create(cls, directory: str, path: str) -> "SessionRecorder":
+        """
+        Start a recording with a new, unique base name in `directory`.
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_sequence)}"
+        return cls(os.path.join(directory, name), path)
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._start
+
+    def audio(self, frame: bytes) -> None:
+        with self._lock:
+            if self._pcm.closed:
+                return
+            self._pcm.write(frame)
+            self._index.write(_INDEX_RECORD.pack(self._now(), self._offset, len(frame)))
+            self._offset += len(frame)
+
+    def event(self, kind: str, **fields: Any) -> None:
+        line = json.dumps({"time": round(self._now(), 6), "kind": kind, **fields})
+        with self._lock:
+            if not self._events.closed:
+                self._events.write(line + "\n")
+
+    def close(self) -> None:
+        self.event("end")
+        with self._lock:
+            for f in (self._pcm, self._index, self._events):
+                f.close()
+
+
+class Recording:
+    """
+    Read-only view of a recording. The audio is memory-mapped, not loaded.
+    """
+
+    def __init__(self, base: str) -> None:
+        for suffix in (".pcm", ".idx", ".jsonl"):
+            if base.endswith(suffix):
+                base = base[: -len(suffix)]
+        self.base = base
+        self.index = np.fromfile(base + ".idx", dtype=INDEX_DTYPE)
+        self._pcm: Optional[np.memmap] = None
+        if os.path.getsize(base + ".pcm"):
+            self._pcm = np.memmap(base + ".pcm", dtype=np.uint8, mode="r")
+        with open(base + ".jsonl", encoding="utf-8") as f:
+            self.events: List[Dict[str, Any]] = [json.loads(line) for line in f]
+
+    @property
+    def path(self) -> str:
+        return self.events[0]["path"]
+
+    @property
+    def duration(self) -> float:
+        return self.events[-1]["time"] if self.events else 0.0
+
+    def frames(self) -> Iterator[Tuple[float, bytes]]:
+        """
+        (time, frame) of every audio frame, in order.
+        """
+        for t, offset, length in self.index:
+            yield float(t), self._pcm[offset : offset + length].tobytes()
+
+    def of_kind(self, kind: str) -> List[Dict[str, Any]]:
+        return [e for e in self.events if e["kind"] == kind]
@@ -0,0 +1,161 @@
+"""
+Resumable client sessions.
+A session opened with the "resume" path flag gets a token. When its
+WebSocket drops, the session is parked instead of closed: its Deepgram
+connection, conversation context and queued replies are kept, and a client
+that reconnects within the grace period with
+{"type": "config", ..., "resume": "<token>"} carries on where it left off.
+Replies queued during the gap are sent at once, and audio the client buffered
+meanwhile goes to the same Deepgram stream.
+The registry only hands connections over; server.py keeps the session itself
+in the handler of the connection that opened it.
+"""
+
+import asyncio
+import json
+import secrets
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from metrics import Counter, Histogram
+
+resumed_sessions = Counter(
+    "sessions_resumed_total", "Sessions resumed on a new connection."
+)
+expired_sessions = Counter(
+    "sessions_expired_total", "Parked sessions not resumed within the grace period."
+)
+evicted_sessions = Counter(
+    "sessions_evicted_total", "Parked sessions closed to make room for newer ones."
+)
+resume_gap = Histogram(
+    "session_resume_gap_seconds", "Time sessions were parked before being resumed."
+)
+
+
+def resume_token(message: str) -> Optional[str]:
+    """
+    The token of the session a handshake frame asks to resume, if any.
+    """
+    try:
+        token = json.loads(message).get("resume")
+    except (ValueError, AttributeError):
+        return None
+    return token if isinstance(token, str) else None
+
+
+class _Entry:
+    __slots__ = ("on_takeover", "future", "parked_at", "handover", "on_superseded")
+
+    def __init__(self, on_takeover: Callable[[], None]) -> None:
+        self.on_takeover = on_takeover
+        self.future: Optional[asyncio.Future] = None
+        self.parked_at = 0.0
+        self.handover: Any = None
+        self.on_superseded: Optional[Callable[[], None]] = None
+
+
+class SessionRegistry:
+    """
+    Tokens of open resumable sessions. A parked session waits up to
+    `grace_seconds` for a new connection; with more than `max_parked` parked,
+    the one parked longest is closed. Must be used from the event loop thread.
+    """
+
+    def __init__(self, grace_seconds: float = 30.0, max_parked: int = 64) -> None:
+        self.grace_seconds = grace_seconds
+        self.max_parked = max_parked
+        self._sessions: Dict[str, _Entry] = {}
+        self._parked: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._closed = False
+
+    def open(self, on_takeover: Callable[[], None]) -> str:
+        """
+        Register a session and return its token. `on_takeover` is called when
+        a client resumes the session while its old connection still looks open,
+        and should close that connection.
+        """
+        token = secrets.token_urlsafe(16)
+        self._sessions[token] = _Entry(on_takeover)
+        return token
+
+    def close(self, token: str) -> Any:
+        """
+        Forget a session that has ended. Returns a handover it did not pick
+        up, for the caller to close.
+        """
+        self._parked.pop(token, None)
+        entry = self._sessions.pop(token, None)
+        return entry.handover if entry else None
+
+    def parked(self) -> int:
+        return len(self._parked)
+
+    async def park(self, token: str) -> Any:
+        """
+        Wait for the session to be resumed. Returns what the resuming client
+        handed over, or None if the grace period ran out or the session was
+        evicted.
+        """
+        entry = self._sessions[token]
+        if entry.handover is not None:
+            handover, entry.handover = entry.handover, None
+            entry.on_superseded = None
+            return handover
+        if self._closed or self.grace_seconds <= 0:
+            return None
+        while len(self._parked) >= self.max_parked:
+            _, oldest = self._parked.popitem(last=False)
+            if not oldest.future.done():
+                oldest.future.set_result(None)
+                evicted_sessions.inc()
+        loop = asyncio.get_running_loop()
+        entry.future = loop.create_future()
+        entry.parked_at = loop.time()
+        self._parked[token] = entry
+        timer = loop.call_later(self.grace_seconds, self._expire, entry)
+        try:
+            return await entry.future
+        finally:
+            timer.cancel()
+            self._parked.pop(token, None)
+            entry.future = None
+
+    def resume(
+        self, token: str, handover: Any, on_superseded: Callable[[], None]
+    ) -> bool:
+        """
+        Hand `handover` to the session with this token. Returns False if there
+        is no such session. `on_superseded` is called if another client resumes
+        the session before it has picked up this handover, and should close
+        the connection that handed it in.
+        """
+        entry = self._sessions.get(token)
+        if entry is None or self._closed:
+            return False
+        if entry.future is not None and not entry.future.done():
+            resume_gap.observe(asyncio.get_running_loop().time() - entry.parked_at)
+            entry.future.set_result(handover)
+        else:
+            # The old connection may not have noticed that it is gone yet.
+            if entry.on_superseded:
+                entry.on_superseded()
+            entry.handover = handover
+            entry.on_superseded = on_superseded
+            entry.on_takeover()
+        resumed_sessions.inc()
+        return True
+
+    def close_all(self) -> None:
+        """
+        Stop parking sessions and end the parked ones, e.g. when draining.
+        """
+        self._closed = True
+        for entry in self._parked.values():
+            if not entry.future.done():
+                entry.future.set_result(None)
+
+    def _expire(self, entry: _Entry) -> None:
+        if not entry.future.done():
+            entry.future.set_result(None)
+            expired_sessions.inc()
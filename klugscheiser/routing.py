@@ -0,0 +1,203 @@
+"""
+Tiered model routing.
+Short and simple utterances are sent to a small, fast model; long, complex or
+foreign-language ones go straight to the large model. A small-model reply that
+looks unsure (e.g. "I don't know", or a translation that is empty or still the
+source text) is discarded and the utterance is escalated to the large model.
+Rules are configured per task. Every route records its request latency and
+estimated spend, so thresholds can be tuned from /metrics.
+"""
+
+import json
+import re
+from typing import Callable, Dict, Iterable, Optional
+
+from metrics import Counter, Histogram
+from textnorm import normalize
+
+# USD per million (prompt, completion) tokens.
+PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+# Words that suggest an answer needs reasoning rather than recall.
+COMPLEX_WORDS = frozenset(
+    "why explain compare difference differences versus vs calculate prove "
+    "derive recommend should analyze analyse implications pros cons".split()
+)
+# Replies of the small model that mean it should not have been asked.
+UNSURE_REPLY = re.compile(
+    r"^(?:i don't know|i do not know|beats me|i'm not sure|i am not sure|"
+    r"not sure|i cannot|i can't|sorry|unknown)\b"
+)
+
+
+class UnsureReply(Exception):
+    """
+    Raised to abandon a small-model reply in favour of the large model.
+    """
+
+
+escalations = Counter(
+    "llm_escalations_total",
+    "Small-model replies discarded and retried on the large model.",
+)
+
+
+class Route:
+    """
+    A model and the metrics of the requests sent to it.
+    """
+
+    def __init__(self, name: str, model: str) -> None:
+        self.name = name
+        self.model = model
+        self.latency = Histogram(
+            f"llm_route_{name}_seconds", f"Completion latency on the {name} route."
+        )
+        self.requests = Counter(
+            f"llm_route_{name}_requests_total", f"Requests on the {name} route."
+        )
+        self.cost = Counter(
+            f"llm_route_{name}_cost_usd_total",
+            f"Estimated spend on the {name} route, in USD.",
+        )
+
+    def record(
+        self, seconds: float, prompt_tokens: int, completion_tokens: int
+    ) -> None:
+        prompt_price, completion_price = PRICES.get(self.model, (0.0, 0.0))
+        self.latency.observe(seconds)
+        self.requests.inc()
+        self.cost.inc(
+            (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+        )
+
+
+class RoutingRules:
+    """
+    When a task's utterances go to the small model instead of the large one.
+    `languages` are the source languages the small model handles well; None
+    allows any. Set max_words to 0 to always use the large model.
+    """
+
+    def __init__(
+        self,
+        max_words: int = 12,
+        languages: Optional[Iterable[str]] = None,
+        complex_words: Iterable[str] = COMPLEX_WORDS,
+        escalate_unsure: bool = True,
+    ) -> None:
+        self.max_words = max_words
+        self.languages = None if languages is None else frozenset(languages)
+        self.complex_words = frozenset(complex_words)
+        self.escalate_unsure = escalate_unsure
+
+    def use_small(self, text: str, language: str) -> bool:
+        words = normalize(text).split()
+        if not words or len(words) > self.max_words:
+            return False
+        if self.languages is not None and language not in self.languages:
+            return False
+        if any(w in self.complex_words for w in words):
+            return False
+        # Arithmetic and figures are where small models slip most.
+        return sum(w.isdigit() for w in words) < 2
+
+    def unsure(self, text: str, reply: Optional[str]) -> bool:
+        """
+        Whether a small-model reply should be replaced by the large model's.
+        Also called on the first characters of a streamed reply.
+        """
+        if not self.escalate_unsure:
+            return False
+        if not reply or not reply.strip():
+            return True
+        reply = reply.strip().lower().replace("’", "'")
+        return bool(UNSURE_REPLY.match(reply))
+
+
+class TranslationRules(RoutingRules):
+    """
+    Routing rules for translations. An empty reply, or one that is the
+    untranslated source text, counts as unsure.
+    """
+
+    def __init__(self, max_words: int = 20, **kwargs) -> None:
+        kwargs.setdefault("complex_words", ())
+        super().__init__(max_words, **kwargs)
+
+    def unsure(self, text: str, reply: Optional[str]) -> bool:
+        if not self.escalate_unsure:
+            return False
+        if not reply or not reply.strip():
+            return True
+        return normalize(reply) == normalize(text) and any(
+            not c.isascii() for c in text
+        )
+
+
+def default_rules() -> Dict[str, RoutingRules]:
+    return {"klugscheiser": RoutingRules(), "translation": TranslationRules()}
+
+
+def load_rules(path: str) -> Dict[str, RoutingRules]:
+    """
+    Read per-task rules from a JSON file such as
+    {"klugscheiser": {"max_words": 16}, "translation": {"languages": ["de", "fr"]}}.
+    Tasks that are not listed keep their defaults.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    rules = default_rules()
+    for task, options in config.items():
+        if task not in rules:
+            raise ValueError(f"Unknown task in routing config: {task}")
+        rules[task] = type(rules[task])(**options)
+    return rules
+
+
+class HoldBack:
+    """
+    Delta sink that holds back the first `chars` characters of a streamed
+    small-model reply until `check` has seen them, so an unsure reply can be
+    dropped before the client sees any of it. `check` raises to abort.
+    """
+
+    def __init__(
+        self, sink: Callable[[str], None], check: Callable[[str], None], chars: int
+    ) -> None:
+        self.sink = sink
+        self.check = check
+        self.chars = chars
+        self._held: Optional[list] = []
+
+    @property
+    def released(self) -> bool:
+        return self._held is None
+
+    def __call__(self, delta: str) -> None:
+        if self.released:
+            self.sink(delta)
+            return
+        self._held.append(delta)
+        text = "".join(self._held)
+        if len(text) >= self.chars:
+            self.release(text)
+
+    def release(self, text: Optional[str] = None) -> None:
+        """
+        Check the held text and pass it on. Called again at the end of the
+        stream for replies shorter than `chars`.
+        """
+        if self.released:
+            return
+        text = "".join(self._held) if text is None else text
+        self.check(text)
+        self._held = None
+        if text:
+            self.sink(text)
@@ -1,11 +1,12 @@
 import argparse  # New import
 import logging
 import os
-import queue
 import threading
 import time
+from functools import partial
 
 import pyttsx3
+from context_store import ContextStore
 from deepgram import (
     DeepgramClient,
     LiveOptions,
@@ -13,7 +14,18 @@ from deepgram import (
     Microphone,
 )
 from dotenv import load_dotenv
+from local_pipeline import (
+    LocalPipeline,
+    SpeechQueue,
+    dropped_utterances,
+    merged_replies,
+    speech_wait,
+    stale_replies,
+    utterance_latency,
+)
 from openai import OpenAI
+from question import DETECTORS, QuestionDetector, fallback_messages, parse_fallback
+from routing import Route, default_rules, escalations, load_rules
 
 load_dotenv()
 
@@ -22,25 +34,39 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
 )
 
-previous_text = ""
+# Recent conversation, bounded by a token budget.
+context_store = ContextStore(max_tokens=1500)
 
 
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# A hung request would otherwise hold its thread for the SDK's default of ten
+# minutes.
+openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=20.0, max_retries=2)
 
-audio_queue = queue.Queue()
+# Replies waiting to be spoken. While speech is behind, replies older than
+# --tts-max-age seconds are dropped and the rest are spoken together.
+speech_queue = SpeechQueue()
 
 MODEL = "gpt-4o"
+# Simple utterances go to SMALL_MODEL first and are escalated to MODEL when
+# its reply looks unsure (see routing.py). Empty to always use MODEL.
+SMALL_MODEL = "gpt-4o-mini"
+routing_rules = default_rules()
+routes = {"small": Route("small", SMALL_MODEL), "large": Route("large", MODEL)}
+
+# Decides which final transcripts are answered. Transcripts the detector is
+# unsure about are passed to QUESTION_FALLBACK_MODEL, if one is set.
+question_detector = QuestionDetector()
+QUESTION_FALLBACK_MODEL = None
 
 
 def audio_worker():
     engine = pyttsx3.init()
     while True:
-        text = audio_queue.get()
+        text = speech_queue.get()
         if text is None:
             break
         engine.say(text)
         engine.runAndWait()
-        audio_queue.task_done()
     engine.stop()
 
 
@@ -48,15 +74,46 @@ threading.Thread(target=audio_worker, daemon=True).start()
 
 
 def play_audio(text):
-    audio_queue.put(text)
+    speech_queue.put(text)
+
+
+def create_completion(route, messages):
+    start_time = time.perf_counter()
+    response = openai_client.chat.completions.create(
+        model=route.model, messages=messages, max_tokens=150
+    )
+    reply = response.choices[0].message.content.strip()
+    usage = response.usage
+    route.record(
+        time.perf_counter() - start_time,
+        usage.prompt_tokens if usage else 0,
+        usage.completion_tokens if usage else 0,
+    )
+    return reply
+
+
+def routed_completion(task, text, language, messages):
+    rules = routing_rules[task]
+    if SMALL_MODEL and rules.use_small(text, language):
+        try:
+            reply = create_completion(routes["small"], messages)
+            if not rules.unsure(text, reply):
+                return reply
+            logging.info("Escalating after small-model reply: %s", reply)
+        except Exception as e:
+            logging.warning("Small model failed, escalating: %s", e)
+        escalations.inc()
+    return create_completion(routes["large"], messages)
 
 
-def process_translation(text):
+def process_translation(text, language):
     try:
         start_time = time.time()
-        translation_response = openai_client.chat.completions.create(
-            model=MODEL,
-            messages=[
+        translation = routed_completion(
+            "translation",
+            text,
+            language,
+            [
                 {
                     "role": "system",
                     "content": (
@@ -67,20 +124,20 @@ def process_translation(text):
                 },
                 {"role": "user", "content": text},
             ],
-            max_tokens=150,
         )
-        translation = translation_response.choices[0].message.content.strip()
         logging.info("Translation Time: %s", time.time() - start_time)
         logging.info("Translation: %s", translation)
-        play_audio(translation)
+        return translation
     except Exception as e:
         logging.error("Error translating text: %s", e)
 
 
 def answer_question(context, question):
-    answer_response = openai_client.chat.completions.create(
-        model=MODEL,
-        messages=[
+    return routed_completion(
+        "klugscheiser",
+        question,
+        "en",
+        [
             {
                 "role": "system",
                 "content": (
@@ -91,37 +148,36 @@ def answer_question(context, question):
             },
             {"role": "user", "content": f"Context: {context}\nQuestion: {question}"},
         ],
-        max_tokens=150,
     )
 
-    answer = answer_response.choices[0].message.content.strip()
-    return answer
-
 
 def is_question(text):
-    if "?" in text[10:]:
-        return True
-    return False
+    if QUESTION_FALLBACK_MODEL and question_detector.is_ambiguous(text):
+        response = openai_client.chat.completions.create(
+            model=QUESTION_FALLBACK_MODEL,
+            messages=fallback_messages(text),
+            max_tokens=1,
+        )
+        return parse_fallback(response.choices[0].message.content)
+    return question_detector(text)
 
 
-def process_question(text):
-    global previous_text
+def process_question(text, context):
     try:
         _is_question = is_question(text)
         print(f"Is question: {_is_question}", "Text:", text)
 
         if _is_question:
-            answer = answer_question(previous_text, text)
+            answer = answer_question(context, text)
             print(f"Question detected! Answer: {answer}")
-            play_audio(answer)
-        else:
-            print("Not a question")
-            previous_text += text
+            return answer
+        print("Not a question")
     except Exception as e:
         print(f"Error checking/answering question: {e}")
 
 
 def main():
+    global question_detector, QUESTION_FALLBACK_MODEL, SMALL_MODEL, routing_rules
     parser = argparse.ArgumentParser(description="Run translation or klugscheiser.")
     parser.add_argument(
         "--task",
@@ -130,10 +186,60 @@ def main():
         help="Task type.",
     )
     parser.add_argument("--language", default="ru", help="Language code.")
+    parser.add_argument(
+        "--question-detector",
+        default="model",
+        choices=sorted(DETECTORS),
+        help="How to decide whether a transcript is a question.",
+    )
+    parser.add_argument(
+        "--question-fallback-model",
+        default=None,
+        help="Cheap model for transcripts the detector is unsure about.",
+    )
+    parser.add_argument(
+        "--small-model",
+        default=SMALL_MODEL,
+        help=f"Model tried first for simple utterances ('' to always use {MODEL}).",
+    )
+    parser.add_argument(
+        "--routing-config", default=None, help="JSON file with per-task routing rules."
+    )
+    parser.add_argument(
+        "--llm-workers",
+        type=int,
+        default=4,
+        help="Threads answering or translating final transcripts.",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=8,
+        help="Final transcripts waiting for a worker before the oldest is dropped.",
+    )
+    parser.add_argument(
+        "--tts-max-age",
+        type=float,
+        default=8.0,
+        help="Seconds a reply may wait for speech before it is dropped.",
+    )
     args = parser.parse_args()
 
+    question_detector = DETECTORS[args.question_detector]()
+    QUESTION_FALLBACK_MODEL = args.question_fallback_model
+    SMALL_MODEL = args.small_model
+    routes["small"].model = SMALL_MODEL
+    if args.routing_config:
+        routing_rules = load_rules(args.routing_config)
+    speech_queue.max_age = args.tts_max_age
+
     task = args.task
     language = args.language
+    # Replies are spoken in the order in which the sentences were said.
+    pipeline = LocalPipeline(
+        play_audio, workers=args.llm_workers, max_pending=args.max_pending, name="llm"
+    )
+    pipeline.start()
 
     try:
         deepgram: DeepgramClient = DeepgramClient()
@@ -151,11 +257,13 @@ def main():
             if result.is_final:
                 logging.info("Speech Final: %s", sentence)
                 if task == "klugscheiser":
-                    threading.Thread(target=process_question, args=(sentence,)).start()
+                    # Sentences enter the context in the order they were said,
+                    # however long the answers to earlier ones take.
+                    context = context_store.text()
+                    context_store.append(sentence)
+                    pipeline.submit(partial(process_question, sentence, context))
                 elif task == "translation":
-                    threading.Thread(
-                        target=process_translation, args=(sentence,)
-                    ).start()
+                    pipeline.submit(partial(process_translation, sentence, language))
                 else:
                     logging.error("Invalid task")
             else:
@@ -223,7 +331,21 @@ def main():
         microphone.finish()
 
         dg_connection.finish()
-
+        pipeline.close()
+
+        logging.info("%s", utterance_latency.summary())
+        logging.info("%s", speech_wait.summary())
+        logging.info(
+            "LLM queue peak depth %d, TTS queue peak depth %d",
+            pipeline.peak_depth,
+            speech_queue.peak_depth,
+        )
+        for counter in (dropped_utterances, stale_replies, merged_replies):
+            logging.info("%s", counter.summary())
+        for route in routes.values():
+            logging.info("%s", route.latency.summary())
+            logging.info("%s, %s", route.requests.summary(), route.cost.summary())
+        logging.info("%s", escalations.summary())
         logging.info("Finished")
 
     except Exception as e:
@@ -0,0 +1,288 @@
+"""
+Fair scheduling of LLM requests across sessions.
+LLMClient asks the scheduler for a slot before every upstream request. The
+scheduler keeps the number of requests in flight under a global cap and
+decides who goes next when requests queue up:
+  - interactive requests (answers to questions) always go before bulk ones
+    (translations, summaries);
+  - within a priority, sessions are served by weighted fair queuing on the
+    estimated tokens of their requests, so a session that sends many requests
+    cannot crowd out one that sends few;
+  - every session has a token bucket, and a request waits while its session
+    is over its rate, even if slots are free;
+  - a request still queued at its deadline is shed instead of being sent late.
+The session of a request is taken from `current_session`, which server.py
+sets for everything that runs on behalf of a client.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional
+
+from metrics import Counter, Histogram
+
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+queue_wait = {
+    priority: Histogram(
+        f"llm_queue_wait_{name}_seconds",
+        f"Time {name} LLM requests waited for the scheduler.",
+    )
+    for priority, name in PRIORITY_NAMES.items()
+}
+shed_requests = Counter(
+    "llm_shed_requests_total", "LLM requests dropped at their deadline while queued."
+)
+throttled_requests = Counter(
+    "llm_throttled_requests_total",
+    "LLM requests that waited for their session's rate limit.",
+)
+
+
+class TokenBucket:
+    """
+    Allows `rate` tokens per second on average and bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self, cost: float) -> float:
+        """
+        Seconds until `cost` tokens are available; 0 if they are now.
+        A cost above the burst size is allowed once the bucket is full.
+        """
+        self._refill(time.monotonic())
+        cost = min(cost, self.burst)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float) -> None:
+        self._refill(time.monotonic())
+        self.tokens -= min(cost, self.burst)
+
+
+class Session:
+    """
+    A client's share of the scheduler, with its wait statistics.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int = INTERACTIVE,
+        weight: float = 1.0,
+        bucket: Optional[TokenBucket] = None,
+    ) -> None:
+        self.name = name
+        self.priority = priority
+        self.weight = weight
+        self.bucket = bucket
+        self.finish = 0.0
+        self.requests = 0
+        self.shed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "priority": PRIORITY_NAMES[self.priority],
+            "requests": self.requests,
+            "shed": self.shed,
+            "wait_mean_s": (
+                round(self.wait_total / self.requests, 4) if self.requests else 0.0
+            ),
+            "wait_max_s": round(self.wait_max, 4),
+        }
+
+    def summary(self) -> str:
+        stats = self.stats()
+        return (
+            f"LLM scheduler, session {self.name}: {stats['requests']} requests, "
+            f"{stats['shed']} shed, wait mean {stats['wait_mean_s']}s "
+            f"max {stats['wait_max_s']}s"
+        )
+
+
+current_session: contextvars.ContextVar[Optional[Session]] = contextvars.ContextVar(
+    "current_session", default=None
+)
+
+
+class _Request:
+    __slots__ = (
+        "session",
+        "priority",
+        "cost",
+        "finish",
+        "future",
+        "queued_at",
+        "throttled",
+    )
+
+    def __init__(
+        self, session: Session, priority: int, cost: float, future: asyncio.Future
+    ) -> None:
+        self.session = session
+        self.priority = priority
+        self.cost = cost
+        self.finish = 0.0
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.throttled = False
+
+
+class FairScheduler:
+    """
+    Global concurrency cap with priorities, weighted fair queuing and
+    per-session token buckets. Must be used from the event loop thread.
+    `tokens_per_second` of None disables the per-session rate limits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        tokens_per_second: Optional[float] = None,
+        burst_seconds: float = 10.0,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.tokens_per_second = tokens_per_second
+        self.burst_seconds = burst_seconds
+        self.inflight = 0
+        self.sessions: Dict[str, Session] = {}
+        # Requests not associated with any client session.
+        self.default_session = Session("-")
+        self._virtual_time = 0.0
+        self._queue: List = []
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def open_session(
+        self, name: str, priority: int = INTERACTIVE, weight: float = 1.0
+    ) -> Session:
+        bucket = None
+        if self.tokens_per_second:
+            bucket = TokenBucket(
+                self.tokens_per_second, self.tokens_per_second * self.burst_seconds
+            )
+        session = Session(name, priority, weight, bucket)
+        self.sessions[name] = session
+        return session
+
+    def close_session(self, session: Session) -> None:
+        self.sessions.pop(session.name, None)
+
+    def saturated(self) -> bool:
+        return self.inflight >= self.max_concurrency
+
+    def queued(self) -> int:
+        return sum(not r.future.done() for *_, r in self._queue)
+
+    async def acquire(
+        self,
+        cost: float,
+        deadline: float,
+        priority: Optional[int] = None,
+        session: Optional[Session] = None,
+    ) -> None:
+        """
+        Wait for a slot for a request of an estimated `cost` tokens. Raises
+        asyncio.TimeoutError if none was granted before `deadline`, a
+        time.monotonic() value. Every successful acquire needs a release().
+        """
+        session = session or current_session.get() or self.default_session
+        if priority is None:
+            priority = session.priority
+        loop = asyncio.get_running_loop()
+        request = _Request(session, priority, cost, loop.create_future())
+        # Start-time fair queuing: a session's requests follow each other in
+        # virtual time, and an idle session restarts from the current time.
+        start = max(self._virtual_time, session.finish)
+        request.finish = start + cost / session.weight
+        session.finish = request.finish
+        heapq.heappush(
+            self._queue, (priority, request.finish, next(self._sequence), request)
+        )
+        self._dispatch()
+        if not request.future.done():
+            timer = loop.call_later(
+                max(0.0, deadline - time.monotonic()), self._shed, request
+            )
+            try:
+                await request.future
+            except asyncio.CancelledError:
+                if request.future.done() and not request.future.cancelled():
+                    # Granted just before the cancellation arrived.
+                    self.release()
+                raise
+            finally:
+                timer.cancel()
+        wait = time.monotonic() - request.queued_at
+        queue_wait[priority].observe(wait)
+        session.requests += 1
+        session.wait_total += wait
+        session.wait_max = max(session.wait_max, wait)
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._dispatch()
+
+    def _shed(self, request: _Request) -> None:
+        if request.future.done():
+            return
+        request.future.set_exception(asyncio.TimeoutError())
+        request.session.shed += 1
+        shed_requests.inc()
+        # Heap entries of finished requests are skipped when they come up, but
+        # are dropped here if they pile up while all slots are busy.
+        if len(self._queue) > 64 and 2 * self.queued() < len(self._queue):
+            self._queue = [e for e in self._queue if not e[-1].future.done()]
+            heapq.heapify(self._queue)
+
+    def _dispatch(self) -> None:
+        if self._wakeup:
+            self._wakeup.cancel()
+            self._wakeup = None
+        throttled = []
+        next_refill = None
+        while self._queue and self.inflight < self.max_concurrency:
+            entry = heapq.heappop(self._queue)
+            request = entry[-1]
+            if request.future.done():
+                continue
+            bucket = request.session.bucket
+            delay = bucket.delay(request.cost) if bucket else 0.0
+            if delay > 0:
+                if not request.throttled:
+                    request.throttled = True
+                    throttled_requests.inc()
+                throttled.append(entry)
+                next_refill = delay if next_refill is None else min(next_refill, delay)
+                continue
+            if bucket:
+                bucket.take(request.cost)
+            self._virtual_time = max(
+                self._virtual_time,
+                request.finish - request.cost / request.session.weight,
+            )
+            self.inflight += 1
+            request.future.set_result(None)
+        for entry in throttled:
+            heapq.heappush(self._queue, entry)
+        if next_refill is not None:
+            self._wakeup = asyncio.get_running_loop().call_later(
+                next_refill, self._dispatch
+            )
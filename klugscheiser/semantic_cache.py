@@ -0,0 +1,210 @@
+"""
+Semantic near-duplicate cache for questions.
+Questions are embedded locally and kept in a bounded, NumPy-backed
+nearest-neighbour index. A new question whose cosine similarity to a cached
+one is above the threshold is answered from the cache.
+Only questions in the same scope can match: the same pronouns and the same
+numbers. "What is her name?" is not "What is his name?", and "World War 1" is
+not "World War 2", however close their embeddings are. Questions with
+pronouns or deictic words ("it", "that", "there") refer to the conversation,
+so their scope also includes the context fingerprint, as in the exact-match
+cache. Since the context grows with every utterance, those only match within
+the same history; self-contained questions match across turns and sessions.
+"""
+
+import hashlib
+import re
+import threading
+import zlib
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cache import context_fingerprint
+from metrics import Counter
+from textnorm import normalize
+
+Embedder = Callable[[Sequence[str]], np.ndarray]
+
+# Words that carry little meaning on their own. Interrogative words are kept
+# on purpose: "why is the sky blue" and "is the sky blue" are different questions.
+STOP_WORDS = frozenset(
+    "a an the is are was were be been being am do does did doing of to in on at "
+    "for from by with about as into and or but if then so than that this these "
+    "those it its s t d ll re ve m can could would should will shall may might "
+    "must please tell know".split()
+)
+# Pronouns refer to the conversation, so they are part of the question's scope.
+PRONOUNS = frozenset(
+    "i me my mine you your yours he him his she her hers we us our ours they "
+    "them their theirs".split()
+)
+# Words that point at something said earlier.
+DEICTIC_WORDS = frozenset(
+    "this that these those it its here there then former latter".split()
+)
+NUMBER = re.compile(r"^\d+$")
+# Interrogative words decide what kind of answer is expected, and numbers
+# decide which thing is asked about, so they weigh more.
+QUESTION_WORDS = frozenset("what who whom whose where when why how which".split())
+
+
+def scope(question: str, context: str = "") -> str:
+    """
+    What a cached question must share with a new one to match it.
+    """
+    words = normalize(question).split()
+    pronouns = sorted({w for w in words if w in PRONOUNS})
+    numbers = sorted({w for w in words if NUMBER.match(w)})
+    refers_back = pronouns or any(w in DEICTIC_WORDS for w in words)
+    fingerprint = context_fingerprint(context) if refers_back else ""
+    return "|".join((fingerprint, " ".join(pronouns), " ".join(numbers)))
+
+
+def scope_id(scope: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(scope.encode(), digest_size=8).digest(), "little", signed=True
+    )
+
+
+class HashingEmbedder:
+    """
+    Dependency-free local embedder.
+    Content words and their character trigrams are hashed into a fixed-size,
+    L2-normalized vector, so questions that share their key terms land close
+    together regardless of word order and phrasing.
+    """
+
+    def __init__(self, dim: int = 512) -> None:
+        self.dim = dim
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = [w for w in normalize(text).split() if w not in STOP_WORDS]
+        features = [
+            (w, 2.0 if w in QUESTION_WORDS or NUMBER.match(w) else 1.0) for w in words
+        ]
+        for w in words:
+            padded = f"#{w}#"
+            features.extend((padded[i : i + 3], 0.25) for i in range(len(padded) - 2))
+        return features
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode())
+                sign = 1.0 if h & 0x80000000 else -1.0
+                vectors[row, h % self.dim] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class VectorIndex:
+    """
+    Bounded cosine-similarity index over unit vectors.
+    Rows live in one preallocated matrix; when full, the oldest row is
+    overwritten. Lookups are a single matrix product for a batch of queries.
+    Each row has a scope id, and a query only matches rows of its own scope.
+    """
+
+    def __init__(self, dim: int, capacity: int = 4096) -> None:
+        self.dim = dim
+        self.capacity = capacity
+        self.size = 0
+        self._next = 0
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        self._values: List[Optional[str]] = [None] * capacity
+
+    def add(self, vector: np.ndarray, value: str, scope: int = 0) -> None:
+        self._vectors[self._next] = vector
+        self._scopes[self._next] = scope
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def search(
+        self, queries: np.ndarray, scopes: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the best matching row and its cosine similarity for each query.
+        Rows of another scope score -1.
+        """
+        if self.size == 0:
+            n = len(queries)
+            return np.full(n, -1), np.full(n, -1.0, dtype=np.float32)
+        scores = queries @ self._vectors[: self.size].T
+        if scopes is None:
+            scopes = np.zeros(len(queries), dtype=np.int64)
+        scores[scopes[:, None] != self._scopes[None, : self.size]] = -1.0
+        best = np.argmax(scores, axis=1)
+        return best, scores[np.arange(len(queries)), best]
+
+    def value(self, row: int) -> Optional[str]:
+        return self._values[row]
+
+
+class SemanticCache:
+    """
+    Question -> answer cache that matches near-duplicate questions. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        capacity: int = 4096,
+        embedder: Optional[Embedder] = None,
+    ) -> None:
+        self.threshold = threshold
+        self.embedder = embedder or HashingEmbedder()
+        self.index: Optional[VectorIndex] = None
+        self.capacity = capacity
+        self.hits = Counter("semantic_cache_hits_total", "Semantic cache hits.")
+        self.misses = Counter("semantic_cache_misses_total", "Semantic cache misses.")
+        self._lock = threading.Lock()
+
+    def lookup_many(
+        self, questions: Sequence[str], contexts: Optional[Sequence[str]] = None
+    ) -> List[Optional[str]]:
+        """
+        Look up a batch of questions, each asked in the matching context, with
+        one embedding call and one search.
+        """
+        contexts = contexts or [""] * len(questions)
+        vectors = self.embedder(questions)
+        scopes = np.array(
+            [scope_id(scope(q, c)) for q, c in zip(questions, contexts)],
+            dtype=np.int64,
+        )
+        with self._lock:
+            if self.index is None:
+                results: List[Optional[str]] = [None] * len(questions)
+            else:
+                rows, scores = self.index.search(vectors, scopes)
+                results = [
+                    self.index.value(row) if score >= self.threshold else None
+                    for row, score in zip(rows, scores)
+                ]
+        for result in results:
+            (self.misses if result is None else self.hits).inc()
+        return results
+
+    def lookup(self, question: str, context: str = "") -> Optional[str]:
+        return self.lookup_many([question], [context])[0]
+
+    def add(self, question: str, answer: str, context: str = "") -> None:
+        vector = self.embedder([question])[0]
+        if not vector.any():
+            return
+        with self._lock:
+            if self.index is None:
+                self.index = VectorIndex(len(vector), self.capacity)
+            self.index.add(vector, answer, scope_id(scope(question, context)))
+
+    def summary(self) -> str:
+        size = self.index.size if self.index else 0
+        return "semantic_cache: entries=%d hits=%d misses=%d" % (
+            size,
+            self.hits.value,
+            self.misses.value,
+        )
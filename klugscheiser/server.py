@@ -8,37 +8,418 @@ Configuration (task and language) is provided in the connection URL path.
 
 import argparse
 import asyncio
+import contextvars
 import json
 import logging
 import os
+import shutil
+import signal
 import ssl  # Added for https support
+import tempfile
 import time
-from typing import Dict, Optional, Tuple
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 import websockets
 from aiohttp import web
-from deepgram import DeepgramClient, LiveOptions, LiveTranscriptionEvents
+from audio import (
+    DEFAULT_FORMAT,
+    PCM,
+    TARGET_SAMPLE_RATE,
+    AudioFormat,
+    AudioUplink,
+    parse_config,
+)
+from cache import ReplyCache, make_key
+from coalesce import Coalescer, coalesce_wait, fragments_per_request
+from context_store import ContextStore, estimate_tokens
+from deepgram import (
+    DeepgramClient,
+    DeepgramClientOptions,
+    LiveOptions,
+    LiveTranscriptionEvents,
+)
+from dg_pool import DeepgramPool, connect_latency
 from dotenv import load_dotenv
-from openai import OpenAI
+from llm_client import (
+    LLMClient,
+    deadline_exceeded,
+    hedge_wins,
+    hedged_requests,
+    limiter_wait,
+    retries,
+)
+from metrics import (
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    merge_snapshots,
+    read_snapshots,
+    render_prometheus,
+    snapshot_all,
+    write_snapshot,
+)
+from pipeline import UtterancePipeline
+from question import DETECTORS, QuestionDetector, fallback_messages, parse_fallback
+from recording import SessionRecorder
+from resume import SessionRegistry, resume_token
+from routing import (
+    HoldBack,
+    Route,
+    UnsureReply,
+    default_rules,
+    escalations,
+    load_rules,
+)
+from scheduler import (
+    BULK,
+    INTERACTIVE,
+    current_session,
+    queue_wait,
+    shed_requests,
+    throttled_requests,
+)
+from semantic_cache import SemanticCache
+from speculation import (
+    Speculation,
+    speculation_hits,
+    speculation_misses,
+    speculation_wasted_tokens,
+)
+from textnorm import split_sentences
+from tracing import (
+    STAGE_HISTOGRAMS,
+    UtteranceTrace,
+    current_trace,
+    enable_otel,
+    shutdown_otel,
+)
+from tts import (
+    ENGINES,
+    ClipCache,
+    Speech,
+    first_audio,
+    make_engine,
+    skipped_speech,
+)
+from workers import current_worker, run_workers, snapshot_path
 
 load_dotenv()
 logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO
 )
 
-# Initialize OpenAI client.
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OpenAI client shared by all sessions of this process, with a connection
+# pool, a concurrency limit, per-call deadlines, retries and optional hedging.
+# Configured with --llm-concurrency, --llm-timeout, --llm-retries, --hedge and
+# --http2. The concurrency is shared out fairly between sessions, answers go
+# before translations, and each session may send about
+# SESSION_TOKENS_PER_MINUTE estimated tokens (--session-tokens-per-minute, 0
+# for no limit).
+SESSION_TOKENS_PER_MINUTE = 60000
+llm_client = LLMClient(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    session_tokens_per_second=SESSION_TOKENS_PER_MINUTE / 60,
+)
 MODEL = "gpt-4o"
+# Tiered routing: utterances that the task's rules consider simple are sent to
+# SMALL_MODEL first and escalated to MODEL only when its reply looks unsure.
+# Set with --small-model (empty to disable) and --routing-config.
+SMALL_MODEL = "gpt-4o-mini"
+routing_rules = default_rules()
+large_route = Route("large", MODEL)
+small_route: Optional[Route] = Route("small", SMALL_MODEL)
+# Characters of a streamed small-model reply checked before any is sent.
+HOLD_BACK_CHARS = 16
+
+# Per-session LLM pipeline configuration.
+LLM_WORKERS = 4
+LLM_MAX_PENDING = 8
+# Maximum number of replies waiting to be written to a client's WebSocket.
+# When a client reads slowly, the pipeline blocks instead of buffering more.
+MAX_OUTBOUND_REPLIES = 16
+# Maximum number of final replies waiting to be spoken per session. Synthesis
+# is shared by all sessions and may fall behind; text replies never wait for
+# it, and the oldest reply is not spoken when a new one does not fit.
+MAX_QUEUED_SPEECH = 4
+# Sessions with the "resume" path flag are parked when their WebSocket drops
+# and can be resumed for RESUME_GRACE_SECONDS (--resume-grace); at most
+# MAX_PARKED_SESSIONS (--max-parked-sessions) are parked at a time.
+# Parked sessions live in one process, and with --workers a reconnect may
+# reach another one, so resuming is disabled in multi-worker mode.
+RESUME_GRACE_SECONDS = 30.0
+MAX_PARKED_SESSIONS = 64
+session_registry = SessionRegistry(RESUME_GRACE_SECONDS, MAX_PARKED_SESSIONS)
+# Close code for a connection whose session was resumed on a newer one.
+CLOSE_RESUMED_ELSEWHERE = 4000
+# Close codes of a client that hung up on purpose: normal, going away (page
+# closed) and a close frame without a code.
+CLEAN_CLOSE_CODES = {1000, 1001, 1005}
+# Token budget for the recent conversation context of a Q&A session.
+CONTEXT_MAX_TOKENS = 1500
+# Fold utterances that fall out of the budget into a rolling summary.
+# Enabled with --summarize-context.
+CONTEXT_SUMMARIZE = False
+# Process-wide cache of answers and translations.
+# Persisted to SQLite when started with --cache-db.
+CACHE_MAX_BYTES = 8 * 1024 * 1024
+CACHE_TTL_SECONDS = 24 * 3600
+reply_cache = ReplyCache(max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS)
+# Opened in each worker process, since SQLite connections must not be forked.
+CACHE_DB_PATH: Optional[str] = None
+# Optional near-duplicate question cache, enabled with --semantic-cache.
+question_cache: Optional[SemanticCache] = None
+
+# Sessions with the "tts" path flag also get final replies as speech, sent as
+# an {"audio": {...}} header followed by binary WAV frames. Clips are
+# synthesized by TTS_ENGINE (--tts-engine, --tts-voice, --tts-rate) and cached
+# by content up to TTS_CACHE_BYTES (--tts-cache-mb, 0 to disable).
+TTS_ENGINE = "pyttsx3"
+TTS_VOICE: Optional[str] = None
+TTS_RATE: Optional[int] = None
+TTS_CACHE_BYTES = 32 * 1024 * 1024
+TTS_CHUNK_BYTES = 16 * 1024
+speech: Optional[Speech] = None
+
+# Warm Deepgram connections per (model, language, sample_rate), shared by all
+# sessions. Set the size with --dg-pool-size; 0 opens connections on demand.
+DEEPGRAM_POOL_SIZE = 1
+DEEPGRAM_ADDONS = {"no_delay": "true"}
+# Alternative Deepgram endpoint, e.g. the local stand-in used by the load tests.
+DEEPGRAM_HOST = os.getenv("DEEPGRAM_HOST", "")
+dg_pool: Optional[DeepgramPool] = None
+# Drop silence before it is sent to Deepgram (disable with --no-vad). During
+# silence a KeepAlive is sent so Deepgram does not close the stream.
+VAD_ENABLED = True
+DEEPGRAM_KEEPALIVE_SECONDS = 5.0
+
+# Server processes sharing the ports through SO_REUSEPORT (--workers).
+WORKERS = 1
+# On SIGTERM, new connections are refused and open sessions get this long to
+# finish before they are closed with code 1001 (going away).
+DRAIN_TIMEOUT_SECONDS = 30.0
+# With several workers, each one writes its metrics to this directory for the
+# supervisor to aggregate.
+METRICS_DIR: Optional[str] = None
+METRICS_FLUSH_SECONDS = 10.0
+# OTLP/HTTP endpoint for utterance traces (--otlp-endpoint), e.g.
+# http://localhost:4318/v1/traces. Needs the OpenTelemetry SDK.
+OTLP_ENDPOINT: Optional[str] = None
+
+# Translation fragments are coalesced into one request once the first one has
+# waited COALESCE_SECONDS or they reach COALESCE_MAX_CHARS characters
+# (--coalesce-ms, 0 to disable, and --coalesce-max-chars). With
+# BATCH_TRANSLATIONS (--batch-translations), such a request returns a
+# separate translation per fragment instead of translating the merged text.
+COALESCE_SECONDS = 0.3
+COALESCE_MAX_CHARS = 400
+BATCH_TRANSLATIONS = False
+
+# Decides which final transcripts are answered (--question-detector).
+# Transcripts the detector is unsure about are passed to
+# QUESTION_FALLBACK_MODEL, if one is set (--question-fallback-model).
+question_detector = QuestionDetector()
+QUESTION_FALLBACK_MODEL: Optional[str] = None
+QUESTION_FALLBACK_TIMEOUT_SECONDS = 1.0
+
+# Sessions are recorded to this directory for replay (--record-dir): client
+# audio, handshakes, Deepgram transcripts and replies, with timestamps.
+RECORD_DIR: Optional[str] = None
+
+# Pipeline and outbound queue of every open session, for the gauges below.
+open_sessions: Set[Tuple[UtterancePipeline, asyncio.Queue]] = set()
+
+reply_latency = Histogram(
+    "reply_send_latency_seconds",
+    "Time from a reply being enqueued to it being written to the WebSocket.",
+)
+prompt_tokens = Histogram(
+    "llm_prompt_tokens",
+    "Prompt tokens per completion request.",
+    buckets=(50, 100, 200, 400, 800, 1600, 3200, 6400),
+    unit=" tokens",
+)
+question_fallback_calls = Counter(
+    "question_fallback_calls_total",
+    "Transcripts classified by the fallback model instead of the local detector.",
+)
+Gauge("active_sessions", "Open client sessions.", lambda: len(open_sessions))
+Gauge(
+    "llm_pending_jobs",
+    "Final transcripts waiting for an LLM worker, over all sessions.",
+    lambda: sum(pipeline.depth() for pipeline, _ in open_sessions),
+)
+Gauge(
+    "outbound_replies",
+    "Replies waiting to be written to client WebSockets.",
+    lambda: sum(replies.qsize() for _, replies in open_sessions),
+)
+Gauge("reply_cache_entries", "Entries in the reply cache.", lambda: len(reply_cache))
+Gauge("reply_cache_bytes", "Size of the reply cache.", lambda: reply_cache.size)
+Gauge(
+    "semantic_cache_entries",
+    "Questions in the semantic cache.",
+    lambda: question_cache.index.size if question_cache and question_cache.index else 0,
+)
+Gauge(
+    "parked_sessions",
+    "Sessions waiting for their client to reconnect.",
+    lambda: session_registry.parked(),
+)
+Gauge(
+    "tts_cache_bytes",
+    "Size of the speech clip cache.",
+    lambda: speech.cache.size if speech and speech.cache else 0,
+)
+Gauge(
+    "deepgram_idle_connections",
+    "Warm Deepgram connections waiting in the pool.",
+    lambda: dg_pool.idle_count() if dg_pool else 0,
+)
+
+
+async def complete(
+    messages: List[Dict[str, str]],
+    on_delta: Optional[Callable[[str], None]] = None,
+    route: Optional[Route] = None,
+    max_tokens: int = 150,
+    priority: Optional[int] = None,
+) -> str:
+    """
+    Run a chat completion and return the stripped text.
+    If on_delta is given, the completion is streamed and every content delta
+    is passed to it as soon as it arrives.
+    The request goes to the route's model (the large model by default) and is
+    timed in the route's metrics and in the current utterance trace, if any.
+    `priority` overrides the scheduling priority of the current session.
+    """
+    route = route or large_route
+    trace = current_trace.get()
+    if trace:
+        trace.mark("llm_start")
+    start = time.perf_counter()
+    if on_delta is None:
+        response = await llm_client.create(
+            priority=priority,
+            model=route.model,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+        if trace:
+            trace.mark("first_token")
+            trace.mark("llm_done")
+        answer = response.choices[0].message.content.strip()
+        usage = response.usage
+        if usage:
+            prompt_tokens.observe(usage.prompt_tokens)
+        route.record(
+            time.perf_counter() - start,
+            usage.prompt_tokens if usage else estimate_messages(messages),
+            usage.completion_tokens if usage else estimate_tokens(answer),
+        )
+        return answer
+
+    stream = await llm_client.create(
+        priority=priority,
+        model=route.model,
+        messages=messages,
+        max_tokens=max_tokens,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    parts = []
+    usage = None
+    try:
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+                prompt_tokens.observe(usage.prompt_tokens)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if trace:
+                    trace.mark("first_token")
+                parts.append(delta)
+                on_delta(delta)
+    finally:
+        # Also reached when the stream is abandoned (cancelled or escalated).
+        await stream.close()
+        route.record(
+            time.perf_counter() - start,
+            usage.prompt_tokens if usage else estimate_messages(messages),
+            usage.completion_tokens if usage else len(parts),
+        )
+    if trace:
+        trace.mark("llm_done")
+    return "".join(parts).strip()
+
 
+def estimate_messages(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
 
-def answer_question(context: str, question: str) -> str:
+
+async def routed_complete(
+    task: str,
+    text: str,
+    language: str,
+    messages: List[Dict[str, str]],
+    on_delta: Optional[Callable[[str], None]] = None,
+    max_tokens: int = 150,
+) -> str:
+    """
+    Complete on the small model when the task's routing rules allow it, and
+    on the large model otherwise or when the small model's reply looks unsure.
+    Streamed small-model replies are held back until their beginning has been
+    checked, so an escalated reply never reaches the client twice.
+    """
+    rules = routing_rules.get(task)
+    if small_route is None or rules is None or not rules.use_small(text, language):
+        return await complete(messages, on_delta, large_route, max_tokens)
+
+    def check(reply: str) -> None:
+        if rules.unsure(text, reply):
+            raise UnsureReply(reply)
+
+    sink = HoldBack(on_delta, check, HOLD_BACK_CHARS) if on_delta else None
+    try:
+        reply = await complete(messages, sink, small_route, max_tokens)
+        if sink:
+            sink.release()
+        else:
+            check(reply)
+        return reply
+    except UnsureReply as e:
+        logging.info("Escalating %r after small-model reply %r", text, str(e))
+    except Exception as e:
+        if sink and sink.released:
+            raise
+        logging.warning("Small model failed, escalating: %s", e)
+    escalations.inc()
+    return await complete(messages, on_delta, large_route, max_tokens)
+
+
+async def answer_question(
+    context: str, question: str, on_delta: Optional[Callable[[str], None]] = None
+) -> str:
     """
     Generate a short, concise answer for the given question using the provided context.
     """
     logging.info("Context: %s", context)
-    response = openai_client.chat.completions.create(
-        model=MODEL,
-        messages=[
+    key = make_key("klugscheiser", "en", question, context)
+    cached = reply_cache.get(key)
+    if cached is None and question_cache:
+        cached = question_cache.lookup(question, context)
+    if cached is not None:
+        if on_delta:
+            on_delta(cached)
+        return cached
+    answer = await routed_complete(
+        "klugscheiser",
+        question,
+        "en",
+        [
             {
                 "role": "system",
                 "content": (
@@ -51,27 +432,87 @@ def answer_question(context: str, question: str) -> str:
             },
             {"role": "user", "content": f"Context: {context}\nQuestion: {question}"},
         ],
-        max_tokens=150,
+        on_delta,
+    )
+    if answer:
+        reply_cache.put(key, answer)
+        if question_cache:
+            question_cache.add(question, answer, context)
+    return answer
+
+
+async def summarize_context(summary: str, text: str) -> str:
+    """
+    Fold older conversation text into the running summary.
+    """
+    return await complete(
+        [
+            {
+                "role": "system",
+                "content": (
+                    "You maintain a running summary of a conversation transcript. "
+                    "Merge the new transcript text into the existing summary. "
+                    "Keep names, topics and facts that later questions may refer to. "
+                    "Respond with the updated summary only, in at most a few sentences."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Existing summary: {summary}\nNew text: {text}",
+            },
+        ],
+        priority=BULK,
     )
-    return response.choices[0].message.content.strip()
 
 
 def is_question(text: str) -> bool:
     """
     Determine if the provided text appears to be a question.
     """
-    return "?" in text[10:]
+    return question_detector(text)
+
+
+async def detect_question(text: str) -> bool:
+    """
+    Like is_question, but ask the fallback model when the detector is unsure.
+    """
+    if not QUESTION_FALLBACK_MODEL or not question_detector.is_ambiguous(text):
+        return is_question(text)
+    question_fallback_calls.inc()
+    try:
+        # Better to fall back to the local guess than to hold up the answer.
+        response = await llm_client.create(
+            deadline=time.monotonic() + QUESTION_FALLBACK_TIMEOUT_SECONDS,
+            model=QUESTION_FALLBACK_MODEL,
+            messages=fallback_messages(text),
+            max_tokens=1,
+        )
+    except Exception as e:
+        logging.error("Question fallback failed: %s", e)
+        return is_question(text)
+    return parse_fallback(response.choices[0].message.content)
 
 
-def process_translation(text: str) -> Optional[str]:
+async def process_translation(
+    text: str, language: str, on_delta: Optional[Callable[[str], None]] = None
+) -> Optional[str]:
     """
     Process the translation of the provided text using OpenAI.
+    Repeated utterances are served from the reply cache.
     """
     try:
+        key = make_key("translation", language, text)
+        cached = reply_cache.get(key)
+        if cached is not None:
+            if on_delta:
+                on_delta(cached)
+            return cached
         start_time = time.time()
-        response = openai_client.chat.completions.create(
-            model=MODEL,
-            messages=[
+        translation = await routed_complete(
+            "translation",
+            text,
+            language,
+            [
                 {
                     "role": "system",
                     "content": (
@@ -82,26 +523,91 @@ def process_translation(text: str) -> Optional[str]:
                 },
                 {"role": "user", "content": text},
             ],
-            max_tokens=150,
+            on_delta,
         )
-        translation = response.choices[0].message.content.strip()
         logging.info("Translation Time: %.2f seconds", time.time() - start_time)
         logging.info("Translation: %s", translation)
+        if translation:
+            reply_cache.put(key, translation)
         return translation
     except Exception as e:
         logging.error("Error translating text: %s", e)
         return None
 
 
-def process_question(text: str, context_container: Dict[str, str]) -> Optional[str]:
+async def translate_batch(
+    fragments: List[str],
+    language: str,
+    on_delta: Optional[Callable[[str], None]] = None,
+) -> Optional[str]:
     """
-    Process a question from the given text and update the context.
-    If a question is detected, generate an answer and clear the context.
-    Otherwise, accumulate the text as context.
+    Translate several transcript fragments with one request that returns a
+    translation per fragment, and join them into one reply. Fragments are
+    cached one by one, and cached ones are not sent again. If the reply is
+    not a list of the expected length, the fragments are translated as one
+    merged text instead.
+    """
+    keys = [make_key("translation", language, f) for f in fragments]
+    translations = [reply_cache.get(key) for key in keys]
+    missing = [i for i, t in enumerate(translations) if t is None]
+    if missing:
+        pending = [fragments[i] for i in missing]
+        try:
+            reply = await routed_complete(
+                "translation",
+                " ".join(pending),
+                language,
+                [
+                    {
+                        "role": "system",
+                        "content": (
+                            "You are a translation assistant. You get a JSON list of "
+                            "consecutive transcript fragments. Translate each fragment "
+                            "to English, using the other fragments to understand the "
+                            "meaning. The transcription might not be perfect. Respond "
+                            "with a JSON list of the translations only, one string per "
+                            "fragment, in the same order."
+                        ),
+                    },
+                    {
+                        "role": "user",
+                        "content": json.dumps(pending, ensure_ascii=False),
+                    },
+                ],
+                max_tokens=150 * len(pending),
+            )
+            # Models sometimes wrap JSON in a Markdown code block.
+            parsed = json.loads(reply.strip().strip("`").removeprefix("json"))
+        except json.JSONDecodeError:
+            parsed = None
+        except Exception as e:
+            logging.error("Error translating batch: %s", e)
+            return None
+        if not isinstance(parsed, list) or len(parsed) != len(pending):
+            logging.warning("Batch translation did not match the fragments: %r", reply)
+            return await process_translation(" ".join(fragments), language, on_delta)
+        for i, translation in zip(missing, parsed):
+            translations[i] = str(translation).strip()
+            if translations[i]:
+                reply_cache.put(keys[i], translations[i])
+    translation = " ".join(t for t in translations if t)
+    logging.info("Translation of %d fragments: %s", len(fragments), translation)
+    if on_delta and translation:
+        on_delta(translation)
+    return translation
+
+
+async def process_question(
+    text: str, context: str, on_delta: Optional[Callable[[str], None]] = None
+) -> Optional[str]:
+    """
+    Process a question from the given text.
+    If a question is detected, generate an answer using the context
+    that preceded it. Otherwise, return None.
     """
     try:
-        if is_question(text):
-            answer = answer_question(context_container.get("text", ""), text)
+        if await detect_question(text):
+            answer = await answer_question(context, text, on_delta)
             return answer
         else:
             return None
@@ -110,40 +616,354 @@ def process_question(text: str, context_container: Dict[str, str]) -> Optional[s
         return None
 
 
-def parse_path(path: str) -> Tuple[str, str]:
+# Optional mode flags that may trail the task and language in the URL path.
+PATH_FLAGS = {"stream", "speculate", "tts", "resume"}
+
+
+def parse_path(path: str) -> Tuple[str, str, Set[str]]:
     """
-    Parse the URL path to extract the task and language.
+    Parse the URL path to extract the task, language and mode flags.
     Expected path formats:
       - /klugscheiser
       - /translation/ru
+      - /klugscheiser/stream
+      - /klugscheiser/stream/speculate
+      - /translation/ru/stream
+      - /translation/ru/stream/tts
+      - /klugscheiser/stream/resume
     If language is not provided, a default is used.
     """
     parts = path.strip("/").split("/")
+    flags: Set[str] = set()
+    while len(parts) > 1 and parts[-1] in PATH_FLAGS:
+        flags.add(parts.pop())
     task = parts[0] if parts and parts[0] else "klugscheiser"
     language = parts[1] if len(parts) > 1 else "ru"
-    return task, language
+    return task, language, flags
+
+
+def deepgram_pool() -> DeepgramPool:
+    """
+    Return the shared Deepgram connection pool, creating it on first use.
+    """
+    global dg_pool
+    if dg_pool is None:
+        dg_pool = DeepgramPool(
+            DeepgramClient(config=DeepgramClientOptions(url=DEEPGRAM_HOST)),
+            size=DEEPGRAM_POOL_SIZE,
+            addons=DEEPGRAM_ADDONS,
+        )
+        dg_pool.start()
+    return dg_pool
+
+
+def speech_service() -> Optional[Speech]:
+    """
+    Return the shared speech synthesizer, creating it on first use, or None
+    if the engine is not available.
+    """
+    global speech
+    if speech is None:
+        engine = make_engine(TTS_ENGINE, TTS_VOICE, TTS_RATE)
+        if engine is None:
+            return None
+        cache = ClipCache(TTS_CACHE_BYTES) if TTS_CACHE_BYTES else None
+        speech = Speech(engine, cache)
+    return speech
+
+
+def live_options(task: str, language: str, codec: str = PCM) -> Optional[LiveOptions]:
+    """
+    Build the Deepgram options for a task, or None if the task is unknown.
+    """
+    options = LiveOptions(
+        smart_format=True,
+        interim_results=True,
+        utterance_end_ms="1000",
+        vad_events=True,
+        endpointing=100,
+    )
+    if codec == PCM:
+        # Client audio is resampled to 16 kHz mono before it is forwarded.
+        options.encoding = "linear16"
+        options.channels = 1
+        options.sample_rate = TARGET_SAMPLE_RATE
+    # Containerized Opus carries its own format; Deepgram reads the header.
+    if task == "klugscheiser":
+        options.model = "nova-3"
+        options.language = "en-US"
+    elif task == "translation":
+        options.model = "nova-2"
+        options.language = language
+    else:
+        return None
+    return options
+
+
+async def send_replies(
+    webskt: websockets.WebSocketServerProtocol,
+    answer_queue: asyncio.Queue,
+    recorder: Optional[SessionRecorder] = None,
+    unsent: Optional[List] = None,
+) -> None:
+    """
+    Write replies to the client as soon as they are enqueued.
+    Final replies carry the trace of their utterance. A reply that could not
+    be written is kept in `unsent` and sent first by the next sender.
+    """
+    while True:
+        item = unsent.pop(0) if unsent else await answer_queue.get()
+        enqueued_at, reply, trace = item
+        try:
+            await webskt.send(reply)
+        except BaseException:
+            if unsent is not None:
+                unsent.insert(0, item)
+            raise
+        reply_latency.observe(time.perf_counter() - enqueued_at)
+        if recorder:
+            recorder.event("reply", data=reply)
+        if trace:
+            trace.mark("ws_send")
+            trace.finish()
+
+
+async def send_speech(
+    webskt: websockets.WebSocketServerProtocol,
+    speech_queue: asyncio.Queue,
+    speech: Speech,
+    unspoken: Optional[List] = None,
+) -> None:
+    """
+    Speak final replies sentence by sentence: each clip is sent as a JSON
+    header with its size, followed by binary frames. The sentences of a reply
+    that could not be fully sent, starting with the interrupted clip, are kept
+    in `unspoken` and sent first by the next speaker.
+    """
+    while True:
+        if unspoken:
+            enqueued_at, sentences = unspoken.pop(0)
+            first = False
+        else:
+            enqueued_at, text = await speech_queue.get()
+            sentences = split_sentences(text)
+            first = True
+        for index, sentence in enumerate(sentences):
+            try:
+                try:
+                    clip = await speech.clip(sentence)
+                except Exception as e:
+                    logging.error("Error synthesizing %r: %s", sentence, e)
+                    continue
+                header = {"format": "wav", "bytes": len(clip), "text": sentence}
+                await webskt.send(json.dumps({"audio": header}))
+                for offset in range(0, len(clip), TTS_CHUNK_BYTES):
+                    await webskt.send(clip[offset : offset + TTS_CHUNK_BYTES])
+                    if first:
+                        first_audio.observe(time.perf_counter() - enqueued_at)
+                        first = False
+            except BaseException:
+                if unspoken is not None:
+                    unspoken.insert(0, (enqueued_at, sentences[index:]))
+                raise
+
+
+async def park_session(token: str, dg_connection) -> Any:
+    """
+    Wait for a session to be resumed, keeping its Deepgram stream alive.
+    Returns the (connection, audio format) handed over, or None.
+    """
+    parked = asyncio.ensure_future(session_registry.park(token))
+    try:
+        while True:
+            done, _ = await asyncio.wait({parked}, timeout=DEEPGRAM_KEEPALIVE_SECONDS)
+            if done:
+                return parked.result()
+            await asyncio.to_thread(dg_connection.keep_alive)
+    finally:
+        parked.cancel()
 
 
 async def handle_client(webskt: websockets.WebSocketServerProtocol) -> None:
     """
     Handle an individual client connection:
       - Extracts configuration from the URL path.
-      - Receives audio chunks (raw bytes) over the WebSocket.
-      - Feeds audio to Deepgram for transcription.
-      - When a final transcription is received, processes it and sends the result back.
+      - In streaming mode, forwards completion deltas as they arrive and then
+        sends the full text as a final frame.
+      - In speculative mode, starts answering interim transcripts that look
+        like questions and reuses the result if the final transcript matches.
+      - Receives audio chunks (raw bytes) over the WebSocket. An optional first
+        handshake frame states the codec, sample rate and channel count.
+      - Resamples PCM to 16 kHz mono and feeds it to Deepgram for transcription.
+        Silence is dropped by voice activity detection and replaced by KeepAlive
+        messages; a Finalize message flushes the transcript when speech ends.
+        Containerized Opus is passed through for Deepgram to decode.
+      - When a final transcription is received, processes it and queues the result.
+      - A separate sender task writes queued results back to the client.
+      - In TTS mode, another task synthesizes final replies and sends the
+        audio as binary frames.
+      - With RECORD_DIR set, records the session for benchmarks/replay.py.
+      - In resume mode, the client gets a session token. If the connection
+        drops, the session is parked until a client hands in the token on a
+        new connection, which then continues the same session.
     """
     client_addr = webskt.remote_address
-    task, language = parse_path(webskt.request.path)
+    task, language, flags = parse_path(webskt.request.path)
+    logging.info(
+        "Client %s connected with task=%s, language=%s, flags=%s",
+        client_addr,
+        task,
+        language,
+        sorted(flags),
+    )
+
+    # The first frame is either a handshake or already audio.
+    try:
+        first_msg = await webskt.recv()
+    except websockets.exceptions.ConnectionClosed:
+        logging.info("Client %s disconnected", client_addr)
+        return
+    previous = resume_token(first_msg) if isinstance(first_msg, str) else None
+    if previous:
+        if session_registry.resume(
+            previous,
+            (webskt, parse_config(first_msg)),
+            lambda: asyncio.ensure_future(webskt.close(CLOSE_RESUMED_ELSEWHERE)),
+        ):
+            logging.info("Client %s resumed a session", client_addr)
+            # The session carries on in the handler of its first connection.
+            await webskt.wait_closed()
+            return
+        logging.info("Client %s asked for an unknown session", client_addr)
+    recorder = (
+        SessionRecorder.create(RECORD_DIR, webskt.request.path) if RECORD_DIR else None
+    )
+    audio_format: Optional[AudioFormat] = None
+    if isinstance(first_msg, str):
+        audio_format = parse_config(first_msg)
+        if recorder:
+            recorder.event("config", data=first_msg)
+    elif recorder:
+        recorder.audio(first_msg)
     logging.info(
-        "Client %s connected with task=%s, language=%s", client_addr, task, language
+        "Client %s audio format: %s", client_addr, audio_format or DEFAULT_FORMAT
+    )
+    audio_format = audio_format or DEFAULT_FORMAT
+
+    # Configure Deepgram options based on client configuration.
+    options = live_options(task, language, audio_format.codec)
+    if options is None:
+        logging.error("Invalid task specified: %s", task)
+        if recorder:
+            recorder.close()
+        return
+    if task == "klugscheiser":
+        logging.info("Operating in Klugscheiser mode for client %s", client_addr)
+    else:
+        logging.info(
+            "Operating in Translation mode from %s for client %s", language, client_addr
+        )
+
+    # Everything run for this client draws from its share of the LLM scheduler.
+    session_name = (
+        ":".join(map(str, client_addr[:2])) if client_addr else str(id(webskt))
+    )
+    scheduler_session = llm_client.scheduler.open_session(
+        session_name, INTERACTIVE if task == "klugscheiser" else BULK
     )
+    current_session.set(scheduler_session)
+    # For callbacks scheduled from the Deepgram receive thread.
+    session_context = contextvars.copy_context()
 
-    # Create a Deepgram connection for this client.
-    dg_client = DeepgramClient()
-    dg_connection = dg_client.listen.websocket.v("1")
-    context_container: Dict[str, str] = {"text": ""}
-    answer_queue: asyncio.Queue = asyncio.Queue()
+    # Take a warm Deepgram connection for this client.
+    dg_connection = await deepgram_pool().acquire(options)
+    if dg_connection is None:
+        logging.error("Failed to start Deepgram connection for client %s", client_addr)
+        llm_client.scheduler.close_session(scheduler_session)
+        if recorder:
+            recorder.close()
+        return
+    context_store = ContextStore(
+        max_tokens=CONTEXT_MAX_TOKENS,
+        summarizer=summarize_context if CONTEXT_SUMMARIZE else None,
+    )
+    answer_queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_OUTBOUND_REPLIES)
     loop = asyncio.get_running_loop()
+    tts = speech_service() if "tts" in flags else None
+    if "tts" in flags and tts is None:
+        logging.warning("Speech synthesis unavailable, sending text only")
+    speech_queue: asyncio.Queue = asyncio.Queue(maxsize=MAX_QUEUED_SPEECH)
+
+    def enqueue(key: str, final: bool = True) -> Callable[[str], Awaitable[None]]:
+        async def put(text: str) -> None:
+            # The pipeline makes the utterance's trace current while delivering.
+            trace = current_trace.get() if final else None
+            enqueued_at = time.perf_counter()
+            await answer_queue.put((enqueued_at, json.dumps({key: text}), trace))
+            if final and tts:
+                if speech_queue.full():
+                    speech_queue.get_nowait()
+                    skipped_speech.inc()
+                speech_queue.put_nowait((enqueued_at, text))
+
+        return put
+
+    result_key = "answer" if task == "klugscheiser" else "translation"
+    # LLM calls run on the event loop, never on the Deepgram receive thread.
+    pipeline = UtterancePipeline(
+        enqueue(result_key),
+        workers=LLM_WORKERS,
+        max_pending=LLM_MAX_PENDING,
+        name=f"llm-{client_addr}",
+        on_delta=(
+            enqueue(f"{result_key}_delta", final=False) if "stream" in flags else None
+        ),
+    )
+    speculative = task == "klugscheiser" and "speculate" in flags
+    speculation: Dict[str, Speculation] = {}
+
+    def submit_final(sentence: str) -> None:
+        # Runs on the event loop; the context snapshot keeps answers consistent
+        # with the order in which sentences were spoken.
+        trace = UtteranceTrace(task, uplink.take_utterance_start())
+        if task == "klugscheiser":
+            context = context_store.text()
+            context_store.append(sentence)
+            current = speculation.pop("current", None)
+            if current and current.matches(sentence, context):
+                pipeline.submit(current.adopt, trace)
+                return
+            if current:
+                current.discard()
+            pipeline.submit(partial(process_question, sentence, context), trace)
+        else:
+            coalescer.add(sentence, trace)
+
+    def submit_translation(
+        fragments: List[str], traces: List[Optional[UtteranceTrace]]
+    ) -> None:
+        # The reply is traced from the first fragment, so waiting for the
+        # others shows up as queueing time.
+        for trace in traces[1:]:
+            if trace:
+                trace.finish()
+        if BATCH_TRANSLATIONS and len(fragments) > 1:
+            job = partial(translate_batch, fragments, language)
+        else:
+            job = partial(process_translation, " ".join(fragments), language)
+        pipeline.submit(job, traces[0])
+
+    coalescer = Coalescer(submit_translation, COALESCE_SECONDS, COALESCE_MAX_CHARS)
+
+    def speculate(sentence: str) -> None:
+        # Runs on the event loop for interim transcripts that look like questions.
+        context = context_store.text()
+        current = speculation.get("current")
+        if current and current.matches(sentence, context):
+            return
+        if current:
+            current.discard()
+        speculation["current"] = Speculation(sentence, context, process_question)
 
     def on_open(self, open, **kwargs):
         logging.info("Connection Open")
@@ -152,28 +972,22 @@ async def handle_client(webskt: websockets.WebSocketServerProtocol) -> None:
         sentence = result.channel.alternatives[0].transcript
         if not sentence:
             return
+        if recorder:
+            recorder.event(
+                "transcript",
+                text=sentence,
+                is_final=bool(result.is_final),
+                speech_final=bool(result.speech_final),
+                start=result.start,
+                duration=result.duration,
+            )
         if result.is_final:
             logging.info("Final transcript from %s: %s", client_addr, sentence)
-            if task == "klugscheiser":
-                answer = process_question(sentence, context_container)
-                context_container["text"] = (
-                    context_container.get("text", "") + sentence + " "
-                )
-                if answer:
-                    loop.call_soon_threadsafe(
-                        answer_queue.put_nowait, json.dumps({"answer": answer})
-                    )
-            elif task == "translation":
-                translation = process_translation(sentence)
-                if translation:
-                    loop.call_soon_threadsafe(
-                        answer_queue.put_nowait,
-                        json.dumps({"translation": translation}),
-                    )
-            else:
-                logging.error("Invalid task specified: %s", task)
+            loop.call_soon_threadsafe(submit_final, sentence, context=session_context)
         else:
             logging.info("Interim transcript from %s: %s", client_addr, sentence)
+            if speculative and is_question(sentence):
+                loop.call_soon_threadsafe(speculate, sentence, context=session_context)
 
     def on_metadata(self, metadata, **kwargs):
         logging.info("Metadata: %s", metadata)
@@ -199,87 +1013,298 @@ async def handle_client(webskt: websockets.WebSocketServerProtocol) -> None:
     dg_connection.on(LiveTranscriptionEvents.Error, on_error)
     dg_connection.on(LiveTranscriptionEvents.Unhandled, on_unhandled)
 
-    # Configure Deepgram options based on client configuration.
-    options = LiveOptions(
-        smart_format=True,
-        encoding="linear16",
-        channels=1,
-        # sample_rate=16000,
-        sample_rate=48000,
-        interim_results=True,
-        utterance_end_ms="1000",
-        vad_events=True,
-        endpointing=100,
+    uplink = AudioUplink(
+        dg_connection,
+        audio_format,
+        vad_enabled=VAD_ENABLED,
+        keepalive_seconds=DEEPGRAM_KEEPALIVE_SECONDS,
     )
-    if task == "klugscheiser":
-        options.model = "nova-3"
-        options.language = "en-US"
-        logging.info("Operating in Klugscheiser mode for client %s", client_addr)
-    elif task == "translation":
-        options.model = "nova-2"
-        options.language = language
-        logging.info(
-            "Operating in Translation mode from %s for client %s", language, client_addr
+    if isinstance(first_msg, bytes):
+        uplink.send(first_msg)
+    pipeline.start()
+    session = (pipeline, answer_queue)
+    open_sessions.add(session)
+    # The connection currently serving this session, and replies and speech
+    # that were taken from their queues but not written before it dropped.
+    connection = webskt
+    unsent: List = []
+    unspoken: List = []
+    resumed = False
+    token = None
+    if "resume" in flags and session_registry.grace_seconds > 0:
+        token = session_registry.open(
+            lambda: asyncio.ensure_future(connection.close(CLOSE_RESUMED_ELSEWHERE))
         )
-    else:
-        logging.error("Invalid task specified: %s", task)
-        return
-
-    addons = {"no_delay": "true"}
-    if not dg_connection.start(options, addons=addons):
-        logging.error("Failed to start Deepgram connection for client %s", client_addr)
-        return
-
     try:
-        async for msg in webskt:
-            # If message is binary, treat it as an audio chunk.
-            if isinstance(msg, bytes):
-                dg_connection.send(msg)
-            else:
-                logging.info("Received non-binary message from %s", client_addr)
-
-            # Send any available results from Deepgram to the client.
-            while not answer_queue.empty():
-                reply = await answer_queue.get()
-                await webskt.send(reply)
-    except websockets.exceptions.ConnectionClosed:
-        logging.info("Client %s disconnected", client_addr)
+        while True:
+            sender = speaker = None
+            try:
+                if token:
+                    await connection.send(
+                        json.dumps({"session": {"token": token, "resumed": resumed}})
+                    )
+                sender = asyncio.create_task(
+                    send_replies(connection, answer_queue, recorder, unsent)
+                )
+                if tts:
+                    speaker = asyncio.create_task(
+                        send_speech(connection, speech_queue, tts, unspoken)
+                    )
+                async for msg in connection:
+                    # If message is binary, treat it as an audio chunk.
+                    if isinstance(msg, bytes):
+                        if recorder:
+                            recorder.audio(msg)
+                        uplink.send(msg)
+                    else:
+                        if recorder:
+                            recorder.event("config", data=msg)
+                        config = parse_config(msg)
+                        # The PCM format may change mid-stream; the codec may not.
+                        if config and config.codec == PCM == audio_format.codec:
+                            uplink.configure(config)
+                            logging.info(
+                                "Client %s audio format: %s", client_addr, config
+                            )
+                        else:
+                            logging.info(
+                                "Received non-binary message from %s", client_addr
+                            )
+            except websockets.exceptions.ConnectionClosed:
+                logging.info("Client %s disconnected", client_addr)
+            finally:
+                tasks = [t for t in (sender, speaker) if t]
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            # A client that hangs up cleanly does not come back.
+            if not token or connection.close_code in CLEAN_CLOSE_CODES:
+                break
+            logging.info("Parked session of client %s", client_addr)
+            handover = await park_session(token, dg_connection)
+            if handover is None:
+                logging.info("Session of client %s was not resumed", client_addr)
+                break
+            connection, config = handover
+            resumed = True
+            if config and config.codec == PCM == audio_format.codec:
+                uplink.configure(config)
+            if recorder:
+                recorder.event("resume")
+            logging.info(
+                "Client %s resumed its session from %s",
+                client_addr,
+                connection.remote_address,
+            )
     finally:
-        dg_connection.finish()
+        if token:
+            leftover = session_registry.close(token)
+            if leftover:
+                await leftover[0].close()
+        # A connection handed over by a resuming client has a handler waiting
+        # for it to close.
+        if connection is not webskt:
+            await connection.close()
+        open_sessions.discard(session)
+        await deepgram_pool().release(dg_connection)
+        coalescer.close()
+        await pipeline.close()
+        await context_store.close()
+        if "current" in speculation:
+            speculation.pop("current").discard()
+        llm_client.scheduler.close_session(scheduler_session)
+        logging.info(scheduler_session.summary())
+        if recorder:
+            recorder.close()
+            logging.info("Recorded session of %s to %s", client_addr, recorder.base)
+        logging.info("Client %s %s", client_addr, uplink.summary())
         logging.info("Cleaned up Deepgram connection for client: %s", client_addr)
 
 
+def log_summaries() -> None:
+    """
+    Log the process-wide metrics once, at shutdown. While the server runs,
+    they are served by /metrics.
+    """
+    logging.info(reply_latency.summary())
+    logging.info(connect_latency.summary())
+    logging.info(prompt_tokens.summary())
+    logging.info(limiter_wait.summary())
+    for histogram in queue_wait.values():
+        logging.info(histogram.summary())
+    for counter in (
+        retries,
+        hedged_requests,
+        hedge_wins,
+        deadline_exceeded,
+        shed_requests,
+        throttled_requests,
+    ):
+        logging.info(counter.summary())
+    if fragments_per_request.count:
+        logging.info(fragments_per_request.summary())
+        logging.info(coalesce_wait.summary())
+    for histogram in STAGE_HISTOGRAMS.values():
+        logging.info(histogram.summary())
+    logging.info(reply_cache.summary())
+    if question_cache:
+        logging.info(question_cache.summary())
+    if speculation_hits.value or speculation_misses.value:
+        for counter in (
+            speculation_hits,
+            speculation_misses,
+            speculation_wasted_tokens,
+        ):
+            logging.info(counter.summary())
+    if speech:
+        logging.info(first_audio.summary())
+        logging.info(skipped_speech.summary())
+        logging.info(speech.cache.summary() if speech.cache else "tts_cache: disabled")
+
+
 async def handle_client_html(request):
     html_path = os.path.join(os.path.dirname(__file__), "client.html")
     return web.FileResponse(html_path)
 
 
+def metrics_path() -> Optional[str]:
+    """
+    This worker's snapshot file, if metrics are shared between workers.
+    """
+    index = current_worker()
+    if not METRICS_DIR or index is None:
+        return None
+    return snapshot_path(METRICS_DIR, index)
+
+
+async def handle_metrics(request):
+    """
+    Serve all metrics in the Prometheus text format. With several workers,
+    the latest snapshots of the other workers are added to this one's.
+    """
+    metrics = REGISTRY
+    own_path = metrics_path()
+    if own_path:
+        metrics = read_snapshots(METRICS_DIR, exclude=own_path)
+        merge_snapshots(metrics, snapshot_all())
+    return web.Response(
+        body=render_prometheus(metrics.values()).encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+    )
+
+
+async def handle_scheduler(request):
+    """
+    Serve the LLM scheduler's wait statistics per open session of this
+    process, as JSON, to check fairness under load.
+    """
+    scheduler = llm_client.scheduler
+    return web.json_response(
+        {
+            "inflight": scheduler.inflight,
+            "queued": scheduler.queued(),
+            "sessions": {
+                name: session.stats() for name, session in scheduler.sessions.items()
+            },
+        }
+    )
+
+
 async def start_http_server(
-    http_port: int, ssl_context: Optional[ssl.SSLContext] = None
-):
+    http_port: int,
+    ssl_context: Optional[ssl.SSLContext] = None,
+    reuse_port: bool = False,
+) -> web.AppRunner:
     app = web.Application()
     app.router.add_get("/", handle_client_html)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/scheduler", handle_scheduler)
     runner = web.AppRunner(app)
     await runner.setup()
     # Pass ssl_context to the TCPSite for https.
-    site = web.TCPSite(runner, "0.0.0.0", http_port, ssl_context=ssl_context)
+    site = web.TCPSite(
+        runner, "0.0.0.0", http_port, ssl_context=ssl_context, reuse_port=reuse_port
+    )
     await site.start()
     logging.info(
         "HTTP Server started at %s://localhost:%s",
         "https" if ssl_context else "http",
         http_port,
     )
+    return runner
+
+
+async def flush_metrics(path: str) -> None:
+    """
+    Periodically write this worker's metrics for the supervisor to aggregate.
+    """
     while True:
-        await asyncio.sleep(3600)
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+        write_snapshot(path)
+
+
+async def drain(ws_server) -> None:
+    """
+    Stop accepting connections and wait for open sessions to end, closing
+    the ones still open after DRAIN_TIMEOUT_SECONDS.
+    """
+    logging.info("Draining %d sessions", len(ws_server.connections))
+    session_registry.close_all()
+    ws_server.close(close_connections=False)
+    try:
+        await asyncio.wait_for(ws_server.wait_closed(), DRAIN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logging.warning(
+            "Closing %d sessions still open after draining",
+            len(ws_server.connections),
+        )
+        await asyncio.gather(*(c.close(1001) for c in ws_server.connections))
+        await ws_server.wait_closed()
 
 
 async def main(
-    ws_port: int, http_port: int, ssl_context: Optional[ssl.SSLContext] = None
+    ws_port: int,
+    http_port: int,
+    ssl_context: Optional[ssl.SSLContext] = None,
+    reuse_port: bool = False,
 ) -> None:
-    # Start both WebSocket and HTTP servers concurrently,
+    global reply_cache
+    if CACHE_DB_PATH:
+        reply_cache = ReplyCache(
+            max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL_SECONDS, path=CACHE_DB_PATH
+        )
+    if OTLP_ENDPOINT:
+        enable_otel(OTLP_ENDPOINT)
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    # Open warm Deepgram connections for the default Q&A mode. Other
+    # configurations are kept warm once a client has asked for them.
+    if DEEPGRAM_POOL_SIZE > 0:
+        deepgram_pool().prewarm(live_options("klugscheiser", "en-US"))
+    # Start both WebSocket and HTTP servers,
     # pass ssl_context to enable https and secure websockets (wss) on both.
-    ws_server = websockets.serve(handle_client, "0.0.0.0", ws_port, ssl=ssl_context)
-    await asyncio.gather(ws_server, start_http_server(http_port, ssl_context))
+    ws_server = await websockets.serve(
+        handle_client, "0.0.0.0", ws_port, ssl=ssl_context, reuse_port=reuse_port
+    )
+    runner = await start_http_server(http_port, ssl_context, reuse_port)
+    metrics_file = metrics_path()
+    flusher = None
+    if metrics_file:
+        flusher = asyncio.create_task(flush_metrics(metrics_file))
+    try:
+        await stop.wait()
+        await drain(ws_server)
+    finally:
+        if flusher:
+            flusher.cancel()
+        await runner.cleanup()
+        if dg_pool:
+            await dg_pool.close()
+        if metrics_file:
+            write_snapshot(metrics_file)
+        shutdown_otel()
+        log_summaries()
+    logging.info("Server stopped")
 
 
 if __name__ == "__main__":
@@ -293,7 +1318,216 @@ if __name__ == "__main__":
     parser.add_argument(
         "--ssl-key", type=str, help="Path to SSL key file", default=None
     )
+    parser.add_argument(
+        "--summarize-context",
+        action="store_true",
+        help="Summarize conversation context that no longer fits the token budget",
+    )
+    parser.add_argument(
+        "--cache-db",
+        type=str,
+        help="Path to a SQLite file for persisting the reply cache",
+        default=None,
+    )
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Answer near-duplicate questions from a local embedding index",
+    )
+    parser.add_argument(
+        "--semantic-threshold",
+        type=float,
+        default=0.92,
+        help="Minimum cosine similarity for a semantic cache hit "
+        "(see benchmarks/bench_semantic_cache.py)",
+    )
+    parser.add_argument(
+        "--dg-pool-size",
+        type=int,
+        default=DEEPGRAM_POOL_SIZE,
+        help="Warm Deepgram connections kept per model/language (0 to disable)",
+    )
+    parser.add_argument(
+        "--no-vad",
+        action="store_true",
+        help="Forward all audio to Deepgram, including silence",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="Number of server processes sharing the ports (SO_REUSEPORT)",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=DRAIN_TIMEOUT_SECONDS,
+        help="Seconds open sessions may continue after SIGTERM",
+    )
+    parser.add_argument(
+        "--otlp-endpoint",
+        type=str,
+        default=None,
+        help="Export utterance traces to this OTLP/HTTP endpoint, e.g. "
+        "http://localhost:4318/v1/traces (needs opentelemetry-sdk)",
+    )
+    parser.add_argument(
+        "--question-detector",
+        choices=sorted(DETECTORS),
+        default="model",
+        help="How to decide whether a transcript is a question",
+    )
+    parser.add_argument(
+        "--question-fallback-model",
+        type=str,
+        default=None,
+        help="Cheap model that classifies transcripts the detector is unsure "
+        "about, e.g. gpt-4o-mini",
+    )
+    parser.add_argument(
+        "--small-model",
+        type=str,
+        default=SMALL_MODEL,
+        help=f"Model tried first for simple utterances ('' to always use {MODEL})",
+    )
+    parser.add_argument(
+        "--routing-config",
+        type=str,
+        default=None,
+        help="JSON file with per-task routing rules, e.g. "
+        '{"translation": {"max_words": 30, "languages": ["de"]}}',
+    )
+    parser.add_argument(
+        "--coalesce-ms",
+        type=float,
+        default=COALESCE_SECONDS * 1000,
+        help="Longest wait for more translation fragments before sending a request "
+        "(0 to translate every fragment on its own)",
+    )
+    parser.add_argument(
+        "--coalesce-max-chars",
+        type=int,
+        default=COALESCE_MAX_CHARS,
+        help="Send coalesced translation fragments once they reach this length",
+    )
+    parser.add_argument(
+        "--batch-translations",
+        action="store_true",
+        help="Translate coalesced fragments one by one in a single structured request",
+    )
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=32,
+        help="Maximum concurrent OpenAI requests per server process",
+    )
+    parser.add_argument(
+        "--llm-timeout",
+        type=float,
+        default=20.0,
+        help="Seconds an OpenAI call may take, including retries and streaming",
+    )
+    parser.add_argument(
+        "--llm-retries",
+        type=int,
+        default=2,
+        help="Retries of OpenAI requests that failed with a transient error",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Send a duplicate OpenAI request when the first is slower than the "
+        "recent p95 and use whichever answers first",
+    )
+    parser.add_argument(
+        "--resume-grace",
+        type=float,
+        default=RESUME_GRACE_SECONDS,
+        help="Seconds a dropped session with the resume path flag can be resumed "
+        "(0 to disable; not available with --workers)",
+    )
+    parser.add_argument(
+        "--max-parked-sessions",
+        type=int,
+        default=MAX_PARKED_SESSIONS,
+        help="Dropped sessions kept for resuming; the oldest is closed first",
+    )
+    parser.add_argument(
+        "--tts-engine",
+        default=TTS_ENGINE,
+        choices=sorted(ENGINES),
+        help="Speech engine for sessions with the tts path flag",
+    )
+    parser.add_argument("--tts-voice", default=None, help="Voice of the speech engine")
+    parser.add_argument(
+        "--tts-rate", type=int, default=None, help="Speaking rate in words per minute"
+    )
+    parser.add_argument(
+        "--tts-cache-mb",
+        type=float,
+        default=TTS_CACHE_BYTES / (1024 * 1024),
+        help="Size of the synthesized speech cache in MiB (0 to disable)",
+    )
+    parser.add_argument(
+        "--session-tokens-per-minute",
+        type=float,
+        default=SESSION_TOKENS_PER_MINUTE,
+        help="Estimated LLM tokens each session may use per minute (0 for no limit)",
+    )
+    parser.add_argument(
+        "--record-dir",
+        help="Record every session to this directory for benchmarks/replay.py",
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Talk HTTP/2 to the OpenAI API (needs the h2 package)",
+    )
     args = parser.parse_args()
+    llm_client = LLMClient(
+        max_concurrency=args.llm_concurrency,
+        max_connections=2 * args.llm_concurrency,
+        timeout=args.llm_timeout,
+        max_retries=args.llm_retries,
+        hedge=args.hedge,
+        http2=args.http2,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        session_tokens_per_second=args.session_tokens_per_minute / 60 or None,
+    )
+    COALESCE_SECONDS = args.coalesce_ms / 1000
+    COALESCE_MAX_CHARS = args.coalesce_max_chars
+    BATCH_TRANSLATIONS = args.batch_translations
+    RECORD_DIR = args.record_dir
+    resume_grace = args.resume_grace
+    if args.workers > 1 and resume_grace > 0:
+        logging.warning(
+            "Resumable sessions are disabled with --workers: a reconnect may "
+            "reach another worker than the one holding the session"
+        )
+        resume_grace = 0
+    session_registry = SessionRegistry(resume_grace, args.max_parked_sessions)
+    TTS_ENGINE = args.tts_engine
+    TTS_VOICE = args.tts_voice
+    TTS_RATE = args.tts_rate
+    TTS_CACHE_BYTES = int(args.tts_cache_mb * 1024 * 1024)
+    SMALL_MODEL = args.small_model
+    if SMALL_MODEL:
+        small_route.model = SMALL_MODEL
+    else:
+        small_route = None
+    if args.routing_config:
+        routing_rules = load_rules(args.routing_config)
+    question_detector = DETECTORS[args.question_detector]()
+    QUESTION_FALLBACK_MODEL = args.question_fallback_model
+    OTLP_ENDPOINT = args.otlp_endpoint
+    CONTEXT_SUMMARIZE = args.summarize_context
+    VAD_ENABLED = not args.no_vad
+    DEEPGRAM_POOL_SIZE = args.dg_pool_size
+    if args.semantic_cache:
+        question_cache = SemanticCache(threshold=args.semantic_threshold)
+    CACHE_DB_PATH = args.cache_db
+    WORKERS = args.workers
+    DRAIN_TIMEOUT_SECONDS = args.drain_timeout
 
     # Create SSL context if both certificate and key are provided.
     ssl_context = None
@@ -307,7 +1541,21 @@ if __name__ == "__main__":
 
             sys.exit(1)
 
-    try:
-        asyncio.run(main(args.ws_port, args.http_port, ssl_context))
-    except KeyboardInterrupt:
-        logging.info("Server shutdown via KeyboardInterrupt")
+    if WORKERS > 1:
+
+        def serve() -> None:
+            asyncio.run(
+                main(args.ws_port, args.http_port, ssl_context, reuse_port=True)
+            )
+
+        METRICS_DIR = tempfile.mkdtemp(prefix="klugscheiser-metrics-")
+        try:
+            run_workers(WORKERS, serve, METRICS_DIR, DRAIN_TIMEOUT_SECONDS)
+        finally:
+            shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        logging.info("Server shutdown")
+    else:
+        try:
+            asyncio.run(main(args.ws_port, args.http_port, ssl_context))
+        except KeyboardInterrupt:
+            logging.info("Server shutdown via KeyboardInterrupt")
@@ -0,0 +1,84 @@
+"""
+Speculative answering on interim transcripts.
+When an interim transcript already looks like a question, the completion is
+started early. When the final transcript arrives, the in-flight request is
+either adopted (the text still matches) or cancelled and replaced.
+"""
+
+import asyncio
+from difflib import SequenceMatcher
+from typing import Awaitable, Callable, List, Optional
+
+from metrics import Counter
+from textnorm import normalize
+
+# Minimum similarity between interim and final text to keep a speculation.
+SIMILARITY_THRESHOLD = 0.9
+
+speculation_hits = Counter(
+    "speculation_hits_total", "Speculative completions adopted by a final transcript."
+)
+speculation_misses = Counter(
+    "speculation_misses_total", "Speculative completions cancelled or discarded."
+)
+speculation_wasted_tokens = Counter(
+    "speculation_wasted_tokens_total",
+    "Completion tokens streamed for discarded speculations.",
+)
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Similarity ratio between two transcripts, ignoring case and punctuation.
+    """
+    return SequenceMatcher(None, normalize(a), normalize(b)).ratio()
+
+
+class Speculation:
+    """
+    An early completion for an interim transcript.
+    Deltas are buffered until the speculation is adopted, then replayed and
+    forwarded to the adopter's sink.
+    """
+
+    def __init__(
+        self,
+        text: str,
+        context: str,
+        run: Callable[[str, str, Callable[[str], None]], Awaitable[Optional[str]]],
+    ) -> None:
+        self.text = text
+        self.context = context
+        self.deltas: List[str] = []
+        self._sink: Optional[Callable[[str], None]] = None
+        self.task = asyncio.create_task(run(text, context, self._on_delta))
+
+    def _on_delta(self, delta: str) -> None:
+        self.deltas.append(delta)
+        if self._sink:
+            self._sink(delta)
+
+    def matches(self, text: str, context: str) -> bool:
+        return (
+            context == self.context
+            and similarity(text, self.text) >= SIMILARITY_THRESHOLD
+        )
+
+    async def adopt(self, sink: Optional[Callable[[str], None]]) -> Optional[str]:
+        """
+        Take over the speculation and wait for its result.
+        """
+        speculation_hits.inc()
+        if sink:
+            for delta in self.deltas:
+                sink(delta)
+            self._sink = sink
+        return await self.task
+
+    def discard(self) -> None:
+        """
+        Cancel the speculation and account for the tokens it already used.
+        """
+        self.task.cancel()
+        speculation_misses.inc()
+        speculation_wasted_tokens.inc(len(self.deltas))
@@ -0,0 +1,35 @@
+"""
+Text normalization shared by caching and transcript matching, and the
+sentence splitter shared by server-side speech and the client.
+"""
+
+import re
+from typing import List, Tuple
+
+_NON_WORD = re.compile(r"[^\w\s]")
+# A sentence ends with terminal punctuation followed by whitespace.
+SENTENCE_END = re.compile(r"(?<=[.!?…。！？])\s+")
+
+
+def normalize(text: str) -> str:
+    """
+    Lowercase the text and drop punctuation and redundant whitespace.
+    """
+    return " ".join(_NON_WORD.sub(" ", text.lower()).split())
+
+
+def split_complete_sentences(buffer: str) -> Tuple[List[str], str]:
+    """
+    Split text that is still streaming in into complete sentences and the
+    unfinished remainder.
+    """
+    parts = SENTENCE_END.split(buffer)
+    return [p.strip() for p in parts[:-1] if p.strip()], parts[-1]
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    Split finished text into sentences.
+    """
+    sentences, rest = split_complete_sentences(text)
+    return sentences + [rest.strip()] if rest.strip() else sentences
@@ -0,0 +1,149 @@
+"""
+Per-utterance stage timestamps.
+A trace is created when Deepgram returns a final transcript and follows the
+utterance through the LLM call to the WebSocket send. Code running a job finds
+the trace through the `current_trace` context variable. Every stage interval
+is recorded in a histogram as soon as both of its ends are known, so a slow
+reply can be attributed to ASR, the LLM, or queuing in the server.
+Traces can also be exported as OpenTelemetry spans (see enable_otel).
+"""
+
+import logging
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from metrics import Histogram
+
+# (start stage, end stage) -> histogram of the time between them.
+STAGE_HISTOGRAMS = {
+    ("first_audio", "dg_final"): Histogram(
+        "utterance_asr_seconds",
+        "From the first forwarded audio of an utterance to its final transcript.",
+    ),
+    ("dg_final", "llm_start"): Histogram(
+        "utterance_queue_seconds",
+        "From the final transcript to the start of the LLM request.",
+    ),
+    ("llm_start", "first_token"): Histogram(
+        "llm_first_token_seconds", "From the LLM request to its first token."
+    ),
+    ("llm_start", "llm_done"): Histogram(
+        "llm_completion_seconds", "From the LLM request to its last token."
+    ),
+    ("llm_done", "ws_send"): Histogram(
+        "utterance_outbound_seconds",
+        "From the end of the completion to the reply being written to the WebSocket.",
+    ),
+    ("dg_final", "ws_send"): Histogram(
+        "utterance_reply_seconds",
+        "From the final transcript to the reply being written to the WebSocket.",
+    ),
+}
+
+current_trace: ContextVar[Optional["UtteranceTrace"]] = ContextVar(
+    "current_trace", default=None
+)
+
+# Set by enable_otel().
+_tracer = None
+_provider = None
+
+
+class UtteranceTrace:
+    """
+    perf_counter() timestamps of the stages one utterance went through:
+    first_audio, dg_final, llm_start, first_token, llm_done and ws_send.
+    """
+
+    def __init__(self, task: str, first_audio: Optional[float] = None) -> None:
+        self.task = task
+        self.times: Dict[str, float] = {}
+        self.finished = False
+        # Converts perf_counter() values to wall-clock nanoseconds for export.
+        self._epoch_offset = time.time_ns() - time.perf_counter_ns()
+        if first_audio is not None:
+            self.mark("first_audio", first_audio)
+        self.mark("dg_final")
+
+    def mark(self, stage: str, at: Optional[float] = None) -> None:
+        """
+        Record a stage. Only the first mark of each stage counts.
+        """
+        if stage in self.times:
+            return
+        self.times[stage] = time.perf_counter() if at is None else at
+        for (start, end), histogram in STAGE_HISTOGRAMS.items():
+            if stage in (start, end) and start in self.times and end in self.times:
+                histogram.observe(self.times[end] - self.times[start])
+
+    def finish(self) -> None:
+        """
+        End the trace and export it, once.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        if _tracer is not None:
+            self._export()
+
+    def _ns(self, stage: str) -> int:
+        return int(self.times[stage] * 1e9) + self._epoch_offset
+
+    def _export(self) -> None:
+        from opentelemetry import trace
+
+        first = "first_audio" if "first_audio" in self.times else "dg_final"
+        last = max(self.times, key=self.times.get)
+        root = _tracer.start_span(
+            "utterance", start_time=self._ns(first), attributes={"task": self.task}
+        )
+        context = trace.set_span_in_context(root)
+        for name, start, end in (
+            ("asr", "first_audio", "dg_final"),
+            ("queue", "dg_final", "llm_start"),
+            ("llm", "llm_start", "llm_done"),
+            ("send", "llm_done", "ws_send"),
+        ):
+            if start in self.times and end in self.times:
+                span = _tracer.start_span(
+                    name, context=context, start_time=self._ns(start)
+                )
+                if name == "llm" and "first_token" in self.times:
+                    span.add_event("first_token", timestamp=self._ns("first_token"))
+                span.end(end_time=self._ns(end))
+        root.end(end_time=self._ns(last))
+
+
+def enable_otel(endpoint: str, service_name: str = "klugscheiser") -> bool:
+    """
+    Export finished traces to an OTLP/HTTP collector, e.g.
+    http://localhost:4318/v1/traces. Needs the opentelemetry-sdk and
+    opentelemetry-exporter-otlp-proto-http packages.
+    """
+    global _tracer, _provider
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        logging.error("OpenTelemetry export is not available: %s", e)
+        return False
+    _provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    _provider.add_span_processor(
+        BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint))
+    )
+    _tracer = _provider.get_tracer("klugscheiser")
+    logging.info("Exporting utterance traces to %s", endpoint)
+    return True
+
+
+def shutdown_otel() -> None:
+    """
+    Flush traces that have not been exported yet.
+    """
+    if _provider is not None:
+        _provider.shutdown()
@@ -0,0 +1,231 @@
+"""
+Server-side speech synthesis.
+Replies are split into sentences and each sentence is synthesized into a WAV
+clip by a local engine:
+  - pyttsx3: the platform's speech engine (SAPI5, NSSpeechSynthesizer or
+    eSpeak), saved to a temporary file;
+  - espeak: the espeak-ng command line tool, writing WAV to stdout.
+Clips are cached by content: the key is a hash of the engine settings and the
+text, so phrases that come up again ("I don't know.", "Beats me.") are served
+from memory without any synthesis work. The cache is LRU with a byte budget,
+and concurrent requests for the same clip share one synthesis.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional
+
+from metrics import Counter, Histogram
+
+synthesis_seconds = Histogram(
+    "tts_synthesis_seconds", "Time to synthesize a clip that was not cached."
+)
+first_audio = Histogram(
+    "tts_first_audio_seconds",
+    "Time from a final reply to the first byte of its audio being sent.",
+)
+skipped_speech = Counter(
+    "tts_skipped_replies_total",
+    "Replies not spoken because their session's speech queue was full.",
+)
+
+
+class Pyttsx3Engine:
+    """
+    pyttsx3 is not thread-safe, so one engine runs on a dedicated thread.
+    """
+
+    name = "pyttsx3"
+
+    def __init__(self, voice: Optional[str] = None, rate: Optional[int] = None):
+        import pyttsx3
+
+        self._pyttsx3 = pyttsx3
+        self.voice = voice
+        self.rate = rate
+        self._engine = None
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="pyttsx3")
+
+    @property
+    def settings(self) -> str:
+        return f"{self.name}|{self.voice}|{self.rate}"
+
+    async def synthesize(self, text: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._synthesize, text)
+
+    def _synthesize(self, text: str) -> bytes:
+        if self._engine is None:
+            self._engine = self._pyttsx3.init()
+            if self.voice:
+                self._engine.setProperty("voice", self.voice)
+            if self.rate:
+                self._engine.setProperty("rate", self.rate)
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            self._engine.save_to_file(text, path)
+            self._engine.runAndWait()
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.unlink(path)
+
+
+class EspeakEngine:
+    """
+    Runs espeak-ng once per clip. The text is passed on stdin.
+    """
+
+    name = "espeak"
+
+    def __init__(self, voice: Optional[str] = None, rate: Optional[int] = None):
+        self.command = shutil.which("espeak-ng") or shutil.which("espeak")
+        if self.command is None:
+            raise ImportError("espeak-ng is not installed")
+        self.voice = voice
+        self.rate = rate
+
+    @property
+    def settings(self) -> str:
+        return f"{self.name}|{self.voice}|{self.rate}"
+
+    async def synthesize(self, text: str) -> bytes:
+        args = [self.command, "--stdout", "--stdin"]
+        if self.voice:
+            args += ["-v", self.voice]
+        if self.rate:
+            args += ["-s", str(self.rate)]
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        audio, error = await process.communicate(text.encode())
+        if process.returncode:
+            raise RuntimeError(f"espeak-ng failed: {error.decode().strip()}")
+        return audio
+
+
+ENGINES = {"pyttsx3": Pyttsx3Engine, "espeak": EspeakEngine}
+
+
+def make_engine(name: str, voice: Optional[str] = None, rate: Optional[int] = None):
+    """
+    Create a synthesis engine, or return None if it is not available.
+    """
+    try:
+        return ENGINES[name](voice=voice, rate=rate)
+    except ImportError as e:
+        logging.error("Speech synthesis with %s is not available: %s", name, e)
+        return None
+
+
+class ClipCache:
+    """
+    Content-addressed LRU cache of audio clips with a byte budget. Thread-safe.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = Counter("tts_cache_hits_total", "Speech clips served from cache.")
+        self.misses = Counter("tts_cache_misses_total", "Speech clips synthesized.")
+        self.evictions = Counter(
+            "tts_cache_evictions_total", "Speech clips evicted for size."
+        )
+        self._clips: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(settings: str, text: str) -> str:
+        # Whitespace does not change the speech; punctuation and case may.
+        text = " ".join(text.split())
+        return hashlib.sha256(f"{settings}\n{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is None:
+                self.misses.inc()
+                return None
+            self._clips.move_to_end(key)
+            self.hits.inc()
+            return clip
+
+    def put(self, key: str, clip: bytes) -> None:
+        if len(clip) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._clips.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._clips[key] = clip
+            self.size += len(clip)
+            while self.size > self.max_bytes:
+                _, evicted = self._clips.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions.inc()
+
+    def __len__(self) -> int:
+        return len(self._clips)
+
+    def summary(self) -> str:
+        return "tts_cache: entries=%d bytes=%d hits=%d misses=%d evictions=%d" % (
+            len(self._clips),
+            self.size,
+            self.hits.value,
+            self.misses.value,
+            self.evictions.value,
+        )
+
+
+class Speech:
+    """
+    Clips for sentences, from the cache or the engine. Shared by all sessions;
+    must be used from the event loop thread.
+    """
+
+    def __init__(self, engine, cache: Optional[ClipCache] = None) -> None:
+        self.engine = engine
+        self.cache = cache
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def clip(self, text: str) -> bytes:
+        key = ClipCache.key(self.engine.settings, text)
+        if self.cache is not None:
+            clip = self.cache.get(key)
+            if clip is not None:
+                return clip
+        # Another session may be synthesizing the same sentence right now. The
+        # synthesis is not cancelled with the session that started it, so its
+        # clip still ends up in the cache.
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._synthesize(key, text))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._done, key))
+        return await asyncio.shield(task)
+
+    async def _synthesize(self, key: str, text: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        clip = await self.engine.synthesize(text)
+        synthesis_seconds.observe(loop.time() - start)
+        if self.cache is not None:
+            self.cache.put(key, clip)
+        return clip
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        del self._inflight[key]
+        if not task.cancelled() and task.exception():
+            logging.error("Speech synthesis failed: %s", task.exception())
@@ -0,0 +1,88 @@
+"""
+Lightweight voice activity detection on 16-bit mono PCM.
+Frames are classified by energy (relative to an adaptive noise floor) and
+zero-crossing rate. A hangover keeps forwarding audio briefly after speech
+stops, and a pre-roll buffer sends the audio just before speech onset, so
+word beginnings and endings are not clipped.
+"""
+
+from collections import deque
+from typing import Deque, Tuple
+
+import numpy as np
+
+
+class VoiceActivityDetector:
+    """
+    Streaming gate that passes speech and drops silence.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        margin_db: float = 10.0,
+        min_energy_db: float = -55.0,
+        hangover_ms: int = 400,
+        preroll_ms: int = 300,
+    ) -> None:
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.margin_db = margin_db
+        self.min_energy_db = min_energy_db
+        self.hangover_frames = hangover_ms // frame_ms
+        self.noise_floor_db = -60.0
+        self.in_speech = False
+        self._hangover = 0
+        self._preroll: Deque[np.ndarray] = deque(maxlen=preroll_ms // frame_ms)
+        self._leftover = np.zeros(0, dtype=np.int16)
+
+    def _features(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        x = frames.astype(np.float32) / 32768.0
+        energy_db = 10 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        return energy_db, zcr
+
+    def process(self, pcm: bytes) -> Tuple[bytes, bool]:
+        """
+        Return the audio that should be forwarded, and whether a stretch of
+        speech ended within this chunk.
+        """
+        samples = np.concatenate((self._leftover, np.frombuffer(pcm, dtype=np.int16)))
+        count = len(samples) // self.frame_size
+        self._leftover = samples[count * self.frame_size :]
+        if count == 0:
+            return b"", False
+        frames = samples[: count * self.frame_size].reshape(count, self.frame_size)
+        energy_db, zcr = self._features(frames)
+
+        out = []
+        ended = False
+        for frame, energy, crossings in zip(frames, energy_db, zcr):
+            threshold = max(self.min_energy_db, self.noise_floor_db + self.margin_db)
+            # Noise-like frames (many zero crossings) need extra energy to count.
+            voiced = energy > threshold and (crossings < 0.5 or energy > threshold + 10)
+            if voiced:
+                # Adapt slowly even during speech, so a sudden permanent
+                # rise in background noise is eventually treated as silence.
+                self.noise_floor_db += 0.002 * (energy - self.noise_floor_db)
+                if not self.in_speech:
+                    out.extend(self._preroll)
+                    self._preroll.clear()
+                    self.in_speech = True
+                self._hangover = self.hangover_frames
+                out.append(frame)
+                continue
+            # Track the background level on frames that are not speech.
+            self.noise_floor_db += 0.05 * (energy - self.noise_floor_db)
+            if self.in_speech and self._hangover > 0:
+                self._hangover -= 1
+                out.append(frame)
+                continue
+            if self.in_speech:
+                self.in_speech = False
+                ended = True
+            self._preroll.append(frame)
+        if not out:
+            return b"", ended
+        return np.concatenate(out).tobytes(), ended
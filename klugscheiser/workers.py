@@ -0,0 +1,119 @@
+"""
+Pre-fork supervisor for running the server in several processes.
+Every worker binds the same ports with SO_REUSEPORT, so the kernel spreads
+incoming connections across processes and therefore across cores. On SIGTERM
+or Ctrl+C the supervisor asks each worker to drain, waits for it to exit, and
+logs the metrics aggregated over all workers.
+"""
+
+import contextlib
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing.connection import wait
+from typing import Callable, Dict, Optional
+
+from metrics import read_snapshots
+
+# A worker that exits sooner than this after starting is not restarted,
+# because it would most likely fail again (e.g. the port is taken).
+MIN_UPTIME_SECONDS = 5.0
+
+# The slot of this process among the workers. A restarted worker takes over
+# the slot of the process it replaces.
+_worker_index: Optional[int] = None
+
+
+def current_worker() -> Optional[int]:
+    """
+    The slot of this worker, or None in the supervisor or a single process.
+    """
+    return _worker_index
+
+
+def snapshot_path(metrics_dir: str, index: int) -> str:
+    """
+    The metrics snapshot file of a worker slot. A restarted worker overwrites
+    the snapshot of the process it replaces.
+    """
+    return os.path.join(metrics_dir, f"worker-{index}.json")
+
+
+def _worker_main(target: Callable[[], None], index: int) -> None:
+    global _worker_index
+    _worker_index = index
+    # Ctrl+C reaches the whole process group; the supervisor handles it and
+    # sends SIGTERM, which the worker's event loop turns into a drain.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    target()
+
+
+def run_workers(
+    count: int, target: Callable[[], None], metrics_dir: str, drain_timeout: float
+) -> None:
+    """
+    Fork `count` processes that each run `target`, restart workers that die,
+    and stop them all on SIGTERM or SIGINT. Blocks until every worker exited.
+    """
+    context = multiprocessing.get_context("fork")
+    workers: Dict[int, multiprocessing.Process] = {}
+    started: Dict[int, float] = {}
+    stopping = False
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    def spawn(index: int) -> None:
+        process = context.Process(
+            target=_worker_main, args=(target, index), name=f"worker-{index}"
+        )
+        process.start()
+        workers[index] = process
+        started[index] = time.monotonic()
+        logging.info("Started %s (pid %d)", process.name, process.pid)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(count):
+        spawn(index)
+
+    while not stopping:
+        wait([p.sentinel for p in workers.values()], timeout=1.0)
+        for index, process in list(workers.items()):
+            if stopping or process.is_alive():
+                continue
+            if time.monotonic() - started[index] < MIN_UPTIME_SECONDS:
+                logging.error(
+                    "%s exited with code %s right after starting, shutting down",
+                    process.name,
+                    process.exitcode,
+                )
+                stopping = True
+                break
+            logging.warning(
+                "%s exited with code %s, restarting", process.name, process.exitcode
+            )
+            # Its gauges (sessions, requests in flight) no longer hold.
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(snapshot_path(metrics_dir, index))
+            spawn(index)
+
+    logging.info("Stopping %d workers", len(workers))
+    for process in workers.values():
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+    # Leave the workers time to drain, then a little more to shut down.
+    deadline = time.monotonic() + drain_timeout + 5.0
+    for process in workers.values():
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            logging.warning("%s did not stop in time, killing it", process.name)
+            process.kill()
+            process.join()
+
+    for metric in read_snapshots(metrics_dir).values():
+        logging.info("all workers: %s", metric.summary())
@@ -0,0 +1,39 @@
+import numpy as np
+
+from audio import Resampler
+
+
+def split(data: bytes, sizes):
+    chunks, offset = [], 0
+    for size in sizes:
+        chunks.append(data[offset : offset + size])
+        offset += size
+    chunks.append(data[offset:])
+    return chunks
+
+
+def test_odd_length_chunks():
+    pcm = (np.arange(4800, dtype=np.int16) * 7).tobytes()
+    whole = Resampler(48000).process(pcm)
+    resampler = Resampler(48000)
+    parts = [resampler.process(c) for c in split(pcm, [1001, 3, 2047, 1])]
+    assert b"".join(parts) == whole
+
+
+def test_chunks_that_split_stereo_frames():
+    rng = np.random.default_rng(0)
+    left = rng.integers(-1000, 1000, 4410, dtype=np.int16)
+    right = -left
+    pcm = np.column_stack((left, right)).ravel().tobytes()
+    whole = Resampler(44100, channels=2).process(pcm)
+    # Left and right cancel out unless the channels shift at a boundary.
+    assert not np.frombuffer(whole, dtype=np.int16).any()
+    resampler = Resampler(44100, channels=2)
+    parts = [resampler.process(c) for c in split(pcm, [6, 1, 997, 2, 4001])]
+    assert b"".join(parts) == whole
+
+
+def test_partial_frame_is_not_output_until_complete():
+    resampler = Resampler(16000, channels=2)
+    assert resampler.process(b"\x01\x00\x03") == b""
+    assert resampler.process(b"\x00") == np.int16([2]).tobytes()
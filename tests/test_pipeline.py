@@ -0,0 +1,90 @@
+import asyncio
+
+from pipeline import UtterancePipeline
+
+
+def test_stalled_consumer_bounds_calls_and_backlog():
+    async def run():
+        calls = 0
+        stalled = asyncio.Event()
+
+        async def on_result(text):
+            # The client never reads.
+            await stalled.wait()
+
+        async def job(sink):
+            nonlocal calls
+            calls += 1
+            return "answer"
+
+        pipeline = UtterancePipeline(on_result, workers=4, max_pending=8)
+        pipeline.start()
+        for _ in range(200):
+            pipeline.submit(job)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+        result = (calls, pipeline.undelivered(), pipeline.depth(), pipeline.dropped)
+        await pipeline.close()
+        return result
+
+    calls, undelivered, depth, dropped = asyncio.run(run())
+    # 2 * workers started jobs, of which one is stuck in delivery.
+    assert calls <= 8
+    assert undelivered <= 8 + 8
+    assert depth == 8
+    assert dropped == 200 - calls - depth
+
+
+def test_results_are_delivered_in_order():
+    async def run():
+        delivered = []
+
+        async def on_result(text):
+            delivered.append(text)
+
+        def job(number, delay):
+            async def run_job(sink):
+                await asyncio.sleep(delay)
+                return str(number)
+
+            return run_job
+
+        pipeline = UtterancePipeline(on_result, workers=4, max_pending=16)
+        pipeline.start()
+        for number in range(10):
+            pipeline.submit(job(number, 0.01 * (10 - number)))
+        await asyncio.sleep(0.3)
+        await pipeline.close()
+        return delivered
+
+    assert asyncio.run(run()) == [str(n) for n in range(10)]
+
+
+def test_dropping_the_job_the_emitter_waits_for():
+    async def run():
+        delivered = []
+        release = asyncio.Event()
+
+        async def on_result(text):
+            delivered.append(text)
+
+        async def slow(sink):
+            await release.wait()
+            return "slow"
+
+        async def fast(sink):
+            return "fast"
+
+        # One worker, busy with the first job, so the rest stay pending.
+        pipeline = UtterancePipeline(on_result, workers=1, max_pending=1)
+        pipeline.start()
+        pipeline.submit(slow)
+        await asyncio.sleep(0)
+        pipeline.submit(fast)
+        pipeline.submit(fast)
+        release.set()
+        await asyncio.sleep(0.05)
+        await pipeline.close()
+        return delivered, pipeline.dropped
+
+    assert asyncio.run(run()) == (["slow", "fast"], 1)
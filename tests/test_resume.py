@@ -0,0 +1,44 @@
+import asyncio
+
+from resume import SessionRegistry
+
+
+def test_later_resume_supersedes_unclaimed_handover():
+    async def run():
+        registry = SessionRegistry(grace_seconds=1.0)
+        takeovers, superseded = [], []
+        token = registry.open(lambda: takeovers.append(True))
+        # Two clients resume before the session noticed its connection drop.
+        registry.resume(token, "first", lambda: superseded.append("first"))
+        registry.resume(token, "second", lambda: superseded.append("second"))
+        handover = await registry.park(token)
+        return handover, superseded, len(takeovers), registry.close(token)
+
+    handover, superseded, takeovers, leftover = asyncio.run(run())
+    assert handover == "second"
+    assert superseded == ["first"]
+    assert takeovers == 2
+    assert leftover is None
+
+
+def test_parked_session_is_handed_over():
+    async def run():
+        registry = SessionRegistry(grace_seconds=1.0)
+        token = registry.open(lambda: None)
+        parked = asyncio.ensure_future(registry.park(token))
+        await asyncio.sleep(0)
+        resumed = registry.resume(token, "new", lambda: None)
+        return resumed, await parked, registry.parked()
+
+    assert asyncio.run(run()) == (True, "new", 0)
+
+
+def test_unknown_or_expired_session_is_not_resumed():
+    async def run():
+        registry = SessionRegistry(grace_seconds=0.01)
+        token = registry.open(lambda: None)
+        expired = await registry.park(token)
+        registry.close(token)
+        return expired, registry.resume(token, "late", lambda: None)
+
+    assert asyncio.run(run()) == (None, False)
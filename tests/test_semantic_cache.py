@@ -0,0 +1,26 @@
+from semantic_cache import SemanticCache
+
+CONTEXT = "Q: Tell me about France.\nA: It is a country in Europe."
+LATER = CONTEXT + "\nQ: Nice.\nA: Indeed."
+
+
+def test_paraphrase_hits_after_the_context_has_grown():
+    cache = SemanticCache()
+    cache.add("What is the capital of France?", "Paris", CONTEXT)
+    assert cache.lookup("What's the capital of France?", LATER) == "Paris"
+
+
+def test_question_that_refers_back_needs_the_same_context():
+    cache = SemanticCache()
+    cache.add("How big is it?", "551,695 km²", CONTEXT)
+    assert cache.lookup("How big is it?", CONTEXT) == "551,695 km²"
+    assert cache.lookup("How big is it?", LATER) is None
+    assert cache.lookup("How big is it?", "Q: Tell me about Monaco.") is None
+
+
+def test_pronouns_and_numbers_must_match():
+    cache = SemanticCache()
+    cache.add("When did World War 1 end?", "1918", CONTEXT)
+    cache.add("What is his name?", "Tom", CONTEXT)
+    assert cache.lookup("When did World War 2 end?", LATER) is None
+    assert cache.lookup("What is her name?", CONTEXT) is None
@@ -0,0 +1,13 @@
+from textnorm import split_complete_sentences, split_sentences
+
+
+def test_split_complete_sentences_keeps_remainder():
+    assert split_complete_sentences("Hi there. How are") == (["Hi there."], "How are")
+    assert split_complete_sentences("Yes! ") == (["Yes!"], "")
+    assert split_complete_sentences("No end") == ([], "No end")
+
+
+def test_split_sentences_includes_last_sentence():
+    assert split_sentences(" One.  Two? Three") == ["One.", "Two?", "Three"]
+    assert split_sentences("你好。 再见！ ") == ["你好。", "再见！"]
+    assert split_sentences("  ") == []